@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+"""Benchmarks skipchunk() against the vectorized skipchunkArrays() chunker.
+
+Each chunker runs in a fresh process, which parses the documents up front, so only the chunking is timed,
+and the peak RSS of one chunker does not leak into the other.  Both chunkers must give the same concepts and predicates.
+The figures are printed and written to chunker-<model>.json.
+
+    python benchmark-chunker.py [spacy_model] [source]
+"""
+import os
+import sys
+import json
+import time
+import hashlib
+import resource
+import multiprocessing
+import spacy
+from skipchunk import skipchunk as sc
+
+def signature(labels):
+    return {key:[(l.idiom,l.label,l.start,l.end,l.sentenceid,l.objectOf,l.subjectOf) for l in labels[key]] for key in labels}
+
+def maxRSS():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024 #kilobytes on linux
+
+def run(spacy_model,source,vectorized,queue):
+    nlp = spacy.load(spacy_model)
+
+    with open(source) as fd:
+        posts = json.load(fd)
+
+    texts = [sc.textFromFields(post,['title','content'],offsets=True) for post in posts]
+    docs = list(nlp.pipe([text for text,fields in texts],batch_size=40))
+    tokens = sum(len(doc) for doc in docs)
+    parsed = maxRSS()
+
+    chunker = sc.Chunker(maxslop=4,minconceptlength=1,maxconceptlength=3,minpredicatelength=1,vectorized=vectorized)
+    started = time.perf_counter()
+    output = [chunker.chunk(doc,i,fields=texts[i][1]) for i,doc in enumerate(docs)]
+    elapsed = time.perf_counter() - started
+
+    queue.put({
+        "chunker": "skipchunkArrays" if vectorized else "skipchunk",
+        "docs": len(docs),
+        "tokens": tokens,
+        "seconds": elapsed,
+        "docs_per_sec": len(docs)/elapsed,
+        "tokens_per_sec": tokens/elapsed,
+        "max_rss_mb": maxRSS(),
+        "chunking_rss_mb": maxRSS()-parsed,
+        "output": hashlib.sha1(repr([(fields,signature(concepts),signature(predicates)) for fields,concepts,predicates in output]).encode('utf-8')).hexdigest()
+    })
+
+if __name__ == "__main__":
+
+    spacy_model = sys.argv[1] if len(sys.argv)>1 else "en_core_web_lg"
+    source = sys.argv[2] if len(sys.argv)>2 else "blog-posts.json"
+
+    results = []
+    for vectorized in [False,True]:
+        queue = multiprocessing.Queue()
+        proc = multiprocessing.Process(target=run,args=(spacy_model,source,vectorized,queue))
+        proc.start()
+        proc.join()
+        if proc.exitcode != 0:
+            raise RuntimeError('The vectorized=' + str(vectorized) + ' chunker failed')
+        results.append(queue.get())
+
+    assert results[0].pop("output")==results[1].pop("output")
+    print("Output is identical")
+
+    print("%-16s %10s %12s %12s %14s" % ("chunker","docs/sec","tokens/sec","max RSS MB","chunking RSS MB"))
+    for r in results:
+        print("%-16s %10.1f %12.0f %12.0f %14.1f" % (r["chunker"],r["docs_per_sec"],r["tokens_per_sec"],r["max_rss_mb"],r["chunking_rss_mb"]))
+
+    filename = "chunker-" + os.path.basename(spacy_model.rstrip('/')) + ".json"
+    with open(filename,"w") as fd:
+        json.dump({"model":spacy_model,"source":source,"python":sys.version.split()[0],"spacy":spacy.__version__,"results":results},fd,indent=2)
+    print("Recorded in",filename)
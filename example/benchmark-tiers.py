@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+"""Records enrichment throughput and memory for each spacy pipeline tier.
+
+Every tier runs in a fresh process, so the peak RSS of one tier does not leak into the next.
+The figures are printed and written to tiers-<model>.json, to help pick a tier per corpus.
+
+    python benchmark-tiers.py [spacy_model] [source]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import resource
+import tempfile
+import multiprocessing
+import spacy
+from skipchunk import skipchunk as sc
+
+def run(spacy_model,source,tier,queue):
+    path = tempfile.mkdtemp()
+    try:
+        s = sc.Skipchunk({"name":"benchmark","path":path},
+            spacy_model=spacy_model,
+            spacy_tier=tier,
+            spacy_processes=1,
+            minlabels=1)
+
+        tuples = s.tuplize(filename=source,fields=['title','content'])
+
+        started = time.perf_counter()
+        enriched,concepts,predicates,conceptgroups,predicategroups = s.enrich(tuples)
+        elapsed = time.perf_counter() - started
+
+        queue.put({
+            "tier": tier,
+            "components": list(s.nlp.pipe_names),
+            "label_fields": s.label_fields,
+            "docs": len(enriched),
+            "docs_per_sec": len(enriched)/elapsed,
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss/1024, #kilobytes on linux
+            "concepts": len(conceptgroups),
+            "predicates": len(predicategroups)
+        })
+    finally:
+        shutil.rmtree(path)
+
+if __name__ == "__main__":
+
+    spacy_model = sys.argv[1] if len(sys.argv)>1 else "en_core_web_lg"
+    source = sys.argv[2] if len(sys.argv)>2 else "blog-posts.json"
+
+    results = []
+    for tier in sc._TIERS_.keys():
+        queue = multiprocessing.Queue()
+        proc = multiprocessing.Process(target=run,args=(spacy_model,source,tier,queue))
+        proc.start()
+        proc.join()
+        if proc.exitcode != 0:
+            raise RuntimeError('The ' + tier + ' tier failed')
+        results.append(queue.get())
+
+    print("%-12s %10s %12s %10s %10s" % ("tier","docs/sec","max RSS MB","concepts","predicates"))
+    for r in results:
+        print("%-12s %10.1f %12.0f %10d %10d" % (r["tier"],r["docs_per_sec"],r["max_rss_mb"],r["concepts"],r["predicates"]))
+
+    filename = "tiers-" + os.path.basename(spacy_model.rstrip('/')) + ".json"
+    with open(filename,"w") as fd:
+        json.dump({"model":spacy_model,"source":source,"python":sys.version.split()[0],"spacy":spacy.__version__,"results":results},fd,indent=2)
+    print("Recorded in",filename)
@@ -0,0 +1,39 @@
+"""
+Writes files and directories through a temporary path that replaces the old one once it is complete,
+so a crash never leaves half a file behind, and readers only ever see the old or the new version.
+Shared by every on-disk store.
+"""
+
+import os
+import shutil
+import contextlib
+
+@contextlib.contextmanager
+def atomicWrite(path,mode='w',opener=open):
+    #Yields the open temporary file, which replaces path when the block ends
+    #When the block raises (or a generator writing it is closed early), the temporary file is removed instead
+    temp = path + '.tmp'
+    try:
+        with opener(temp,mode) as fd:
+            yield fd
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    os.replace(temp,path)
+
+@contextlib.contextmanager
+def atomicDirectory(path):
+    #Yields an empty temporary directory, which replaces the one at path when the block ends
+    temp = path + '.tmp'
+    if os.path.isdir(temp):
+        shutil.rmtree(temp)
+    os.makedirs(temp)
+    try:
+        yield temp
+    except BaseException:
+        shutil.rmtree(temp)
+        raise
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    os.replace(temp,path)
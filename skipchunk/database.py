@@ -1,26 +1,112 @@
 """
 Manages a simple database to store concepts for existing preflabel lookup.
 Should be kept in skipchunk_data for easy backup
+Several processes can enrich into the same database: the first one to add a key decides its preflabel.
+Databases built separately (by shards, or on other machines) are combined with Database.merge,
+or with:  python -m skipchunk.database <database> <shard database> ...
 """
 
+import math
 import sqlite3
+import hashlib
+import collections
 
+from .lru import LRUCache
+
+_BATCH_ = 300 #Concepts per statement, keeping under the oldest sqlite limit of 999 variables
+
+#RETURNING needs sqlite 3.35, older versions select the preflabels after the upsert
+_RETURNING_ = sqlite3.sqlite_version_info >= (3,35,0)
+
+##==========================================================
+## Preflabels never change once a key is inserted, so they can be cached for as long as the database is open
+
+class BloomFilter:
+    #Answers "definitely not there" for keys that were never added, and "maybe there" with an error_rate chance for the rest
+
+    def positions(self,key):
+        digest = hashlib.blake2b(key.encode('utf-8'),digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8],'little')
+        h2 = int.from_bytes(digest[8:],'little') | 1
+        return [(h1 + i*h2) % self.bits for i in range(self.hashes)]
+
+    def add(self,key):
+        for position in self.positions(key):
+            self.array[position>>3] |= 1<<(position&7)
+        self.count += 1
+
+    def __contains__(self,key):
+        return all(self.array[position>>3] & (1<<(position&7)) for position in self.positions(key))
+
+    def full(self):
+        return self.count > self.capacity
+
+    def __init__(self,capacity,error_rate=0.01):
+        self.capacity = max(capacity,1)
+        self.error_rate = error_rate
+        self.bits = int(math.ceil(-self.capacity*math.log(error_rate)/(math.log(2)**2)))
+        self.hashes = max(1,int(round(self.bits/self.capacity*math.log(2))))
+        self.array = bytearray((self.bits+7)//8)
+        self.count = 0
+
+class PreflabelCache(LRUCache):
+    #Least recently used key->preflabel, with a Bloom filter of every key in the table
+    #A key that misses the cache is either a Bloom filter negative, or is looked up in the table
+
+    def add(self,key,preflabel):
+        #A key that was just inserted
+        self.put(key,preflabel)
+        self.bloom.add(key)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits":self.hits,
+            "negatives":self.negatives,
+            "misses":self.misses-self.negatives,
+            "hit_rate":(self.hits+self.negatives)/total if total else 0.0,
+            "size":len(self.entries),
+            "keys":self.bloom.count
+        }
+
+    def __init__(self,maxsize,capacity,error_rate=0.01):
+        super().__init__(maxsize)
+        self.bloom = BloomFilter(capacity,error_rate)
+        self.negatives = 0 #Keys the Bloom filter knew were not in the table
+
+##==========================================================
 
 class Database:
 
     def get_concept(self,key):
         # Gets the preflabel for the key
+        if self.cache is not None:
+            preflabel = self.cache.get(key)
+            if preflabel is not None:
+                return preflabel
+            if key not in self.cache.bloom:
+                #Another writer may have added it since the Bloom filter was filled
+                self.refresh()
+            if key not in self.cache.bloom:
+                #Brand new key, no need to look
+                self.cache.negatives += 1
+                return None
+
         self.c.execute('''SELECT preflabel FROM concepts WHERE key=?''', (key,))
         preflabel = self.c.fetchone()
         if preflabel and len(preflabel):
             #result is a tuple, just grab the value
             preflabel = preflabel[0]
+            if self.cache is not None:
+                self.cache.put(key,preflabel)
         return preflabel
 
     def add_concept(self,concept):
         # Insert a new concept
         self.c.execute('''INSERT INTO concepts VALUES (?,?,?,datetime('now'))''', (concept.key, concept.preflabel, concept.total,))
         self.conn.commit()
+        if self.cache is not None:
+            self.cache.add(concept.key,concept.preflabel)
         return concept
 
     def update_concept(self,concept):
@@ -34,9 +120,8 @@ class Database:
         preflabel = self.get_concept(concept.key)
 
         if not preflabel:
-            #Add to the table
-            self.add_concept(concept)
-            preflabel = concept.preflabel
+            #Add to the table, unless another writer added it since, in which case its preflabel wins
+            preflabel = self.upsert_concepts([concept])[0]
 
         else:
             #Update the total
@@ -44,11 +129,167 @@ class Database:
 
         return preflabel
 
+    def upsert_concepts(self,concepts,commit=True):
+        # Creates the concepts that dont exist and updates the totals of those that do, all in one transaction
+        # Returns the preflabel of each concept in the same order: the existing preflabel, or its own when it is new
+        concepts = list(concepts)
+        preflabels = {}
+
+        if self.cache is not None:
+            #The write lock is taken first, and the Bloom filter catches up with the other writers, so that no
+            #  other writer can insert a key between the filter saying it is new and the insert
+            if not self.conn.in_transaction:
+                self.c.execute('''BEGIN IMMEDIATE''')
+            self.refresh()
+
+            #Cached keys are known to exist, so only their totals are updated
+            #Keys the Bloom filter has never seen are inserted as they are, without the conflict check
+            #Only the rest are looked up in the table
+            known = []
+            new = []
+            upserts = []
+            for concept in concepts:
+                preflabel = preflabels.get(concept.key) or self.cache.get(concept.key)
+                if preflabel is not None:
+                    preflabels[concept.key] = preflabel
+                    known.append((concept.total,concept.key))
+                elif concept.key not in self.cache.bloom:
+                    preflabels[concept.key] = concept.preflabel
+                    self.cache.add(concept.key,concept.preflabel)
+                    new.append((concept.key,concept.preflabel,concept.total))
+                else:
+                    upserts.append(concept)
+
+            self.c.executemany('''INSERT INTO concepts VALUES (?,?,?,datetime('now'))''', new)
+            self.c.executemany('''UPDATE concepts SET total=total+? WHERE key=?''', known)
+            self.cache.negatives += len(new)
+        else:
+            upserts = concepts
+
+        for i in range(0,len(upserts),_BATCH_):
+            batch = upserts[i:i+_BATCH_]
+            rows = [(concept.key,concept.preflabel,concept.total) for concept in batch]
+
+            if _RETURNING_:
+                values = ','.join(['''(?,?,?,datetime('now'))''']*len(rows))
+                self.c.execute('''INSERT INTO concepts VALUES ''' + values + ''' ON CONFLICT(key) DO UPDATE SET total=total+excluded.total RETURNING key,preflabel''', [value for row in rows for value in row])
+                preflabels.update(self.c.fetchall())
+
+            else:
+                self.c.executemany('''INSERT INTO concepts VALUES (?,?,?,datetime('now')) ON CONFLICT(key) DO UPDATE SET total=total+excluded.total''', rows)
+                keys = [row[0] for row in rows]
+                self.c.execute('''SELECT key,preflabel FROM concepts WHERE key IN (''' + ','.join('?'*len(keys)) + ''')''', keys)
+                preflabels.update(self.c.fetchall())
+
+        if self.cache is not None:
+            for concept in upserts:
+                self.cache.put(concept.key,preflabels[concept.key])
+            #Nobody else can write while the lock is held, so every row up to here is in the filter
+            self.rowid = self.maxRowid()
+            if self.cache.bloom.full():
+                self.warm()
+
+        if commit:
+            self.conn.commit()
+
+        return [preflabels[concept.key] for concept in concepts]
+
+    def commit(self):
+        self.conn.commit()
+
+    def merge(self,databases):
+        # Merges the concepts of other preflabel databases, such as the ones built by separate shards, into this one
+        # The totals are added up.  A key that is already here keeps its preflabel.  Otherwise the preflabel that was
+        #  added first wins, then the one with the largest total, then the first alphabetically, so the result does
+        #  not depend on the order of the databases
+        self.c.execute('''DROP TABLE IF EXISTS temp.merged''')
+        self.c.execute('''CREATE TEMP TABLE merged (key text NOT NULL, preflabel text NOT NULL, total int, date text NOT NULL)''')
+
+        #Databases can't be attached inside a transaction, so each one is copied in its own
+        for path in databases:
+            self.c.execute('''ATTACH DATABASE ? AS shard''', (path,))
+            self.c.execute('''INSERT INTO temp.merged SELECT key,preflabel,total,date FROM shard.concepts''')
+            self.conn.commit()
+            self.c.execute('''DETACH DATABASE shard''')
+
+        self.c.execute('''
+                INSERT INTO concepts
+                SELECT key,preflabel,alltotal,date FROM (
+                    SELECT key,preflabel,date,
+                        SUM(total) OVER (PARTITION BY key) AS alltotal,
+                        ROW_NUMBER() OVER (PARTITION BY key ORDER BY date,total DESC,preflabel) AS rank
+                    FROM temp.merged
+                ) WHERE rank=1
+                ON CONFLICT(key) DO UPDATE SET total=total+excluded.total
+            ''')
+        merged = self.c.rowcount
+        self.conn.commit()
+
+        self.c.execute('''DROP TABLE temp.merged''')
+
+        if self.cache is not None:
+            self.warm()
+
+        return merged
+
+    def maxRowid(self):
+        self.c.execute('''SELECT max(rowid) FROM concepts''')
+        return self.c.fetchone()[0] or 0
+
+    def refresh(self):
+        #Adds the keys that other writers inserted since the Bloom filter was filled, so its negatives hold
+        #data_version only changes when another connection commits, and new rows come after the last rowid seen
+        self.c.execute('''PRAGMA data_version''')
+        version = self.c.fetchone()[0]
+        if version==self.version:
+            return
+        self.version = version
+
+        self.c.execute('''SELECT rowid,key FROM concepts WHERE rowid>?''', (self.rowid,))
+        for rowid,key in self.c.fetchall():
+            if key not in self.cache.bloom:
+                self.cache.bloom.add(key)
+            self.rowid = max(self.rowid,rowid)
+
+        if self.cache.bloom.full():
+            self.warm()
+
+    def warm(self):
+        #Fills the Bloom filter with every key in the table, and the cache with the preflabels of the largest concepts
+        #The filter is sized for twice the keys there are, and is warmed again when it fills up
+        self.c.execute('''SELECT count(*) FROM concepts''')
+        count = self.c.fetchone()[0]
+        hits,negatives,misses = (self.cache.hits,self.cache.negatives,self.cache.misses) if self.cache else (0,0,0)
+        self.cache = PreflabelCache(self.cache_size,max(2*count,self.cache_size),self.bloom_error)
+        self.cache.hits,self.cache.negatives,self.cache.misses = hits,negatives,misses
+
+        #Where refresh picks up the keys of other writers from
+        self.c.execute('''PRAGMA data_version''')
+        self.version = self.c.fetchone()[0]
+        self.rowid = self.maxRowid()
+
+        self.c.execute('''SELECT key,preflabel FROM concepts ORDER BY total DESC''')
+        cached = 0
+        for key,preflabel in self.c:
+            self.cache.bloom.add(key)
+            if cached<self.cache_size:
+                self.cache.entries[key] = preflabel
+                cached += 1
+
+        #Least recently used first, so the smallest concepts are evicted first
+        self.cache.entries = collections.OrderedDict(reversed(self.cache.entries.items()))
+
+    def stats(self):
+        #Hits, misses and Bloom filter negatives of the preflabel cache
+        if self.cache is None:
+            return None
+        return self.cache.stats()
+
     def create(self):
 
-        # Create table
+        # Create table.  Another writer may have just created it
         self.c.execute('''
-                CREATE TABLE concepts (
+                CREATE TABLE IF NOT EXISTS concepts (
                     key text NOT NULL PRIMARY KEY,
                     preflabel text NOT NULL, 
                     total int DEFAULT 0,
@@ -72,7 +313,7 @@ class Database:
 
     def delete(self):
         #Delete the concepts table.  USE AT YOUR OWN RISK!
-        conn = sqlite3.connect(self.database)
+        conn = sqlite3.connect(self.database,timeout=self.timeout)
         c = conn.cursor()
         c.execute('''DROP TABLE IF EXISTS concepts''')
         conn.commit()
@@ -80,20 +321,41 @@ class Database:
 
     def open(self):
         #Opens a connection, and creates the table if it doesn't exit
-        self.conn = sqlite3.connect(self.database)
+        #Writes start with BEGIN IMMEDIATE, so a transaction takes the write lock up front instead of failing halfway
+        #  when another process writes.  Waits up to timeout seconds for the lock
+        self.conn = sqlite3.connect(self.database,timeout=self.timeout,isolation_level='IMMEDIATE')
         self.c = self.conn.cursor()
+
+        #Readers don't block the writer (and the other way around), and commits don't rewrite the whole journal
+        self.c.execute('''PRAGMA journal_mode=WAL''')
+
         if not self.exists():
             self.create()
 
+        self.cache = None
+        if self.cache_size>0:
+            self.warm()
+
     def close(self):
         #Bye bye
         self.conn.close()
 
-    def __init__(self,database,delete=False):
+    def __init__(self,database,delete=False,cache_size=0,bloom_error=0.01,timeout=60):
         #Database is the full path of the sqlite database file
+        #When cache_size>0, the preflabels of that many keys are cached, and a Bloom filter of all the keys
+        #  (with a bloom_error rate of false positives) skips the lookup of keys that are not in the table
         self.database = database
+        self.cache_size = cache_size
+        self.bloom_error = bloom_error
+        self.timeout = timeout
 
         if delete: 
             self.delete()
 
         self.open()
+
+if __name__ == "__main__":
+    import sys
+    db = Database(sys.argv[1])
+    print('Merged',db.merge(sys.argv[2:]),'concepts into',sys.argv[1])
+    db.close()
@@ -0,0 +1,170 @@
+"""
+Memoizes the WordNet derivationally related forms used by the chunker.
+A table of every WordNet adjective->noun and noun->adjective form can be built once,
+saved to disk, and loaded at startup.  Words that are not in the loaded table go through
+an LRU-bounded cache, and WordNet itself is only imported when a word is missing from both.
+"""
+
+import os
+import json
+import uuid
+
+from .lru import LRUCache
+from .atomic import atomicWrite
+
+_VERSION_ = 1
+
+#Uses wordnet to get de-adjectival nouns
+def wordnet_adj_to_noun(lem):
+    from nltk.corpus import wordnet as wn
+    for i in wn.synsets(lem, wn.ADJ):
+        for j in i.lemmas():
+            drf = j.derivationally_related_forms()
+            drf.sort(key = lambda x: len(x.name()))
+            for k in drf:
+                if k.name()[:2] == lem[:2]:
+                    #Found it!
+                    return k.name()
+
+#Uses wordnet to get de-nounal adjective
+def wordnet_noun_to_adj(lem):
+    from nltk.corpus import wordnet as wn
+    for i in wn.synsets(lem, wn.NOUN):
+        for j in i.lemmas():
+            for k in j.derivationally_related_forms():
+                if k.name()[:2] == lem[:2]:
+                    #Found it!
+                    return k.name()
+
+## -------------------------------------------
+## A lookup table for one direction (adjective->noun or noun->adjective)
+## Missing forms are memoized as None, so WordNet is never asked twice about the same word
+
+class Derivations(LRUCache):
+
+    def get(self,lem):
+        if lem in self.table:
+            self.hits += 1
+            return self.table[lem]
+
+        #Words without a derived form are cached as None too
+        if lem in self:
+            return super().get(lem)
+
+        self.misses += 1
+        form = self.derive(lem)
+        self.put(lem,form)
+        self.dirty = True
+        return form
+
+    def clear(self):
+        #Forgets the loaded table and the cached words
+        self.table = {}
+        self.entries.clear()
+        self.dirty = False
+
+    def items(self):
+        items = dict(self.table)
+        items.update(self.entries)
+        return items
+
+    def __init__(self,derive,maxsize=100000):
+        #maxsize bounds the words cached at runtime, the loaded table is not bounded
+        super().__init__(maxsize)
+        self.derive = derive #The WordNet lookup for words that are not known yet
+        self.table = {}
+        self.dirty = False
+
+## -------------------------------------------
+
+class DerivationTable:
+
+    def adj_to_noun(self,lem):
+        return self.adjectives.get(lem)
+
+    def noun_to_adj(self,lem):
+        return self.nouns.get(lem)
+
+    def stats(self):
+        return {
+            "adj_to_noun": {"hits":self.adjectives.hits,"misses":self.adjectives.misses},
+            "noun_to_adj": {"hits":self.nouns.hits,"misses":self.nouns.misses}
+        }
+
+    def dirty(self):
+        return self.adjectives.dirty or self.nouns.dirty
+
+    def identity(self):
+        #Tells tables apart, for caches of chunker output that depends on the forms
+        #A built table has an id of its own, that is saved with it.  Otherwise the forms are WordNet's, memoized in the file at path
+        return self.id or self.path
+
+    def build(self):
+        #Precomputes the forms of every adjective and noun in WordNet.  This takes a while!
+        from nltk.corpus import wordnet as wn
+        for lem in wn.all_lemma_names(wn.ADJ):
+            self.adjectives.table[lem] = wordnet_adj_to_noun(lem)
+        for lem in wn.all_lemma_names(wn.NOUN):
+            self.nouns.table[lem] = wordnet_noun_to_adj(lem)
+        self.adjectives.dirty = True
+        self.nouns.dirty = True
+        self.id = uuid.uuid4().hex
+
+    def load(self,path):
+        #Replaces whatever was loaded or looked up before, also when there is no table to load
+        self.path = path
+        self.id = None
+        self.adjectives.clear()
+        self.nouns.clear()
+        if not os.path.isfile(path):
+            return False
+
+        with open(path) as fd:
+            data = json.load(fd)
+
+        if data.get("version") != _VERSION_:
+            return False
+
+        self.adjectives.table = data["adj_to_noun"]
+        self.nouns.table = data["noun_to_adj"]
+        self.id = data.get("id")
+        return True
+
+    def save(self,path):
+        data = {
+            "version": _VERSION_,
+            "id": self.id,
+            "adj_to_noun": self.adjectives.items(),
+            "noun_to_adj": self.nouns.items()
+        }
+
+        with atomicWrite(path) as fd:
+            json.dump(data,fd)
+
+        self.adjectives.dirty = False
+        self.nouns.dirty = False
+
+    def __init__(self,maxsize=100000):
+        self.adjectives = Derivations(wordnet_adj_to_noun,maxsize=maxsize)
+        self.nouns = Derivations(wordnet_noun_to_adj,maxsize=maxsize)
+        self.path = None #The file the table was last loaded from
+        self.id = None
+
+## -------------------------------------------
+## The process-wide table used by the chunker
+
+table = DerivationTable()
+
+def adj_to_noun(lem):
+    return table.adj_to_noun(lem)
+
+def noun_to_adj(lem):
+    return table.noun_to_adj(lem)
+
+##==========================================================
+# Builds the full table from WordNet:  python -m skipchunk.derivations skipchunk_data/derivations.json
+
+if __name__ == "__main__":
+    import sys
+    table.build()
+    table.save(sys.argv[1])
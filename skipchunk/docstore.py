@@ -0,0 +1,209 @@
+"""
+Keeps the cached documents in append-only segment files, instead of one json file per document.
+Each record is a header, the document id, and the json of the document (compressed with zlib when compress=True).
+The segment being written is a .active file.  Once it reaches segment_bytes it is synced, its id->offset index
+is written, and only then is it renamed to a sealed .seg, so a sealed segment is always complete.
+A document saved again replaces the older record in the index, and only the latest record is read back.
+"""
+
+import os
+import glob
+import json
+import zlib
+import struct
+import multiprocessing
+
+from .atomic import atomicWrite
+
+_HEADER_ = struct.Struct('<IHB') #Length of the json, length of the id, flags
+_COMPRESSED_ = 1
+
+def readRecords(path):
+    #Streams the (offset,docid,json bytes) of a segment, and stops at a record that was cut short by a crash
+    with open(path,'rb') as fd:
+        offset = 0
+        while True:
+            header = fd.read(_HEADER_.size)
+            if len(header)<_HEADER_.size:
+                return
+            length,idlength,flags = _HEADER_.unpack(header)
+            docid = fd.read(idlength)
+            data = fd.read(length)
+            if len(docid)<idlength or len(data)<length:
+                return
+            if flags & _COMPRESSED_:
+                data = zlib.decompress(data)
+            yield offset,docid.decode('utf-8'),data
+            offset += _HEADER_.size + idlength + length
+
+def liveDocuments(task):
+    #The documents of a segment whose records are still the latest for their id
+    #Takes a single (path,offsets) so it can be mapped over a process pool
+    path,offsets = task
+    return [json.loads(data) for offset,docid,data in readRecords(path) if offset in offsets]
+
+##==========================================================
+
+class DocumentStore:
+
+    def segmentPath(self,number,sealed=True):
+        return os.path.join(self.path,'docs-%06d.seg' % number) + ('' if sealed else '.active')
+
+    def indexPath(self,number):
+        return os.path.join(self.path,'docs-%06d.idx' % number)
+
+    def add(self,docid,doc):
+        #Appends the document, and rolls the segment over once it is full
+        docid = str(docid).encode('utf-8')
+        data = json.dumps(doc).encode('utf-8')
+        flags = 0
+        if self.compress:
+            data = zlib.compress(data)
+            flags |= _COMPRESSED_
+
+        if self.fd is None:
+            self.fd = open(self.segmentPath(self.active,sealed=False),'ab')
+
+        self.fd.write(_HEADER_.pack(len(data),len(docid),flags))
+        self.fd.write(docid)
+        self.fd.write(data)
+        self.index[docid.decode('utf-8')] = (self.active,self.offset)
+        self.entries.append([docid.decode('utf-8'),self.offset])
+        self.offset += _HEADER_.size + len(docid) + len(data)
+
+        if self.offset>=self.segment_bytes:
+            self.rollover()
+
+    def rollover(self):
+        #Seals the active segment: synced to disk, its index written, then renamed to .seg
+        if self.fd is None:
+            return
+        self.fd.flush()
+        os.fsync(self.fd.fileno())
+        self.fd.close()
+        self.fd = None
+
+        with atomicWrite(self.indexPath(self.active)) as fd:
+            json.dump(self.entries,fd)
+        os.replace(self.segmentPath(self.active,sealed=False),self.segmentPath(self.active))
+
+        self.active += 1
+        self.offset = 0
+        self.entries = []
+
+    def flush(self):
+        #Makes the documents added so far readable by other processes
+        if self.fd is not None:
+            self.fd.flush()
+
+    def close(self):
+        self.flush()
+        if self.fd is not None:
+            self.fd.close()
+            self.fd = None
+
+    def numberPath(self,number):
+        sealed = self.segmentPath(number)
+        return sealed if os.path.isfile(sealed) else self.segmentPath(number,sealed=False)
+
+    def get(self,docid):
+        #Reads one document by its id, or None if it is not in the store
+        docid = str(docid)
+        if docid not in self.index:
+            return None
+        self.flush()
+        number,offset = self.index[docid]
+        with open(self.numberPath(number),'rb') as fd:
+            fd.seek(offset)
+            length,idlength,flags = _HEADER_.unpack(fd.read(_HEADER_.size))
+            fd.seek(idlength,1)
+            data = fd.read(length)
+        if flags & _COMPRESSED_:
+            data = zlib.decompress(data)
+        return json.loads(data)
+
+    def __contains__(self,docid):
+        return str(docid) in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def tasks(self):
+        #The (path,offsets) of every segment, in the order they were written
+        offsets = {}
+        for number,offset in self.index.values():
+            offsets.setdefault(number,set()).add(offset)
+        return [(self.numberPath(number),offsets[number]) for number in sorted(offsets.keys())]
+
+    def docs(self,processes=0):
+        #Streams every document, one segment at a time
+        #With processes>1, the segments are read and parsed in a process pool, still in order
+        self.flush()
+        tasks = self.tasks()
+        if processes>1 and len(tasks)>1:
+            with multiprocessing.Pool(processes) as pool:
+                for documents in pool.imap(liveDocuments,tasks):
+                    yield from documents
+        else:
+            for path,offsets in tasks:
+                for offset,docid,data in readRecords(path):
+                    if offset in offsets:
+                        yield json.loads(data)
+
+    def open(self):
+        #Reads the indexes of the sealed segments, and scans the active one
+        self.index = {}
+        numbers = sorted(int(os.path.basename(path)[5:11]) for path in glob.glob(os.path.join(self.path,'docs-*.seg')))
+        for number in numbers:
+            if os.path.isfile(self.indexPath(number)):
+                with open(self.indexPath(number)) as fd:
+                    for docid,offset in json.load(fd):
+                        self.index[docid] = (number,offset)
+            else:
+                for offset,docid,data in readRecords(self.segmentPath(number)):
+                    self.index[docid] = (number,offset)
+
+        self.active = numbers[-1]+1 if len(numbers) else 0
+        self.offset = 0
+        self.entries = [] #The (docid,offset) of the active segment, in the order they were added
+
+        active = self.segmentPath(self.active,sealed=False)
+        if os.path.isfile(active):
+            for offset,docid,data in readRecords(active):
+                self.index[docid] = (self.active,offset)
+                self.entries.append([docid,offset])
+            self.offset = self.scannedEnd(active)
+            if not self.readonly and os.path.getsize(active)>self.offset:
+                #Drop the record that was cut short, so appending carries on from a complete one
+                with open(active,'r+b') as fd:
+                    fd.truncate(self.offset)
+
+    def scannedEnd(self,path):
+        #Where the last complete record of a segment ends
+        end = 0
+        with open(path,'rb') as fd:
+            while True:
+                header = fd.read(_HEADER_.size)
+                if len(header)<_HEADER_.size:
+                    return end
+                length,idlength,flags = _HEADER_.unpack(header)
+                if len(fd.read(idlength+length))<idlength+length:
+                    return end
+                end += _HEADER_.size + idlength + length
+
+    def __init__(self,path,segment_bytes=64*1024*1024,compress=True,readonly=False):
+        #Path is the directory holding the segment files
+        #A readonly store is for reading while another process writes, it never changes the files
+        self.path = path
+        self.segment_bytes = segment_bytes
+        self.compress = compress
+        self.readonly = readonly
+        self.fd = None
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        self.open()
+
+def exists(path):
+    return len(glob.glob(os.path.join(path,'docs-*.seg*')))>0
@@ -169,8 +169,9 @@ class Elastic(SearchEngineInterface):
 
     ## -------------------------------------------
     ## Content Update
-    def index(self, documents, timeout=10000) -> str:
+    def index(self, documents, timeout=10000, commit=True) -> str:
         #Accepts a skipchunk object to index the required data
+        #With commit=False the index is not refreshed, so the documents are not searchable until commit is called
 
         def bulkDocs(doc_src,name):
             for doc in doc_src:
@@ -185,12 +186,18 @@ class Elastic(SearchEngineInterface):
 
         if isIndex:
             res = elasticsearch.helpers.bulk(self.es, bulkDocs(documents,self.name), chunk_size=100)
-            self.es.indices.refresh(index=self.name)
+            if commit:
+                self.es.indices.refresh(index=self.name)
             r = BulkResp(res)
             if r.status_code<400:
                 return True
 
         return False
+
+    def commit(self, timeout=10000) -> bool:
+        #Refreshes the index, so the documents indexed with commit=False are searchable
+        self.es.indices.refresh(index=self.name)
+        return True
     ## -------------------------------------------
     ## Querying
     def search(self,querystring, handler: str) -> str:
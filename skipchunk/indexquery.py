@@ -3,15 +3,25 @@ import os
 
 from . import solr
 from . import elastic
+from . import docstore
 
 ## -------------------------------------------
 ## Indexing!
 
-def indexableDocuments(path):
-    #This is probably inefficient and can be improved with a bulk process or threads
+def indexableDocuments(path,processes=0):
+    #Reads the documents cached in segment files in bulk, one segment at a time
+    #With processes>1, the segments are read in a process pool
+    store = None
+    if docstore.exists(path):
+        store = docstore.DocumentStore(path,readonly=True)
+        yield from store.docs(processes=processes)
+
+    #Documents cached by older versions, as one json file each
     for f in os.listdir(path):
         filename = os.path.join(path, f) 
-        if os.path.isfile(filename) and '.json' in filename:
+        if os.path.isfile(filename) and f.endswith('.json'):
+            if store is not None and f[:-5] in store:
+                continue
             with open(filename) as doc:
                 yield json.load(doc)
 
@@ -22,14 +32,17 @@ class IndexQuery():
 
     ## -------------------------------------------
     # Indexes content into the engine from the configured data directory
-    def index(self,timeout=10000):
-        return self.engine.index(indexableDocuments(self.engine.document_data),timeout=timeout)
+    def index(self,timeout=10000,processes=0):
+        return self.engine.index(indexableDocuments(self.engine.document_data,processes=processes),timeout=timeout)
 
     def indexDocument(self,document,timeout=10000):
         return self.engine.index([document],timeout=timeout)
 
-    def indexGenerator(self,generator,timeout=10000):
-        return self.engine.index(generator,timeout=timeout)
+    def indexGenerator(self,generator,timeout=10000,commit=True):
+        return self.engine.index(generator,timeout=timeout,commit=commit)
+
+    def commit(self,timeout=10000):
+        return self.engine.commit(timeout=timeout)
 
     def indexes(self):
         return self.engine.indexes()
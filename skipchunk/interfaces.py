@@ -23,10 +23,14 @@ class SearchEngineInterface:
 
     ## -------------------------------------------
     ## Content Update
-    def index(self, documents:list, path: str, timeout=10000) -> str:
+    def index(self, documents:list, path: str, timeout=10000, commit=True) -> str:
         #Accepts a skipchunk object to index the required data
         pass
 
+    def commit(self, timeout=10000) -> bool:
+        #Makes the documents indexed with commit=False searchable
+        pass
+
     ## -------------------------------------------
     ## Querying
 
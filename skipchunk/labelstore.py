@@ -0,0 +1,221 @@
+"""
+Keeps the labels of the concepts and predicates in columns: a table of the distinct strings, and a
+numpy structured array with a row of string ids and ints per label.  The rows of a key are
+together, and the keys are in the order they were first collected, not sorted.
+The files are memory-mapped when loaded, so reloading copies nothing, and the labels of a key are a
+view of its rows instead of a list of Label objects.  Should be kept in the skipchunk data path.
+"""
+
+import os
+import json
+import numpy
+
+from .lru import LRUCache
+from .atomic import atomicDirectory
+
+_VERSION_ = 1 #Bump when the columns change
+
+#One row per label.  Strings are ids in the string table, and -1 is None
+_LABEL_ = numpy.dtype([
+    ('key','<i4'),
+    ('idiom','<i4'),
+    ('label','<i4'),
+    ('length','<i4'),
+    ('start','<i4'),
+    ('end','<i4'),
+    ('docid','<i4'),
+    ('sentenceid','<i4'),
+    ('objectOf','<i4'),
+    ('subjectOf','<i4')
+])
+
+#The rows of each key, begin and end as in a slice
+_KEY_ = numpy.dtype([('key','<i4'),('begin','<i8'),('end','<i8')])
+
+_FLUSH_ = 100000 #Rows converted to the array at a time when writing
+
+## -------------------------------------------
+## String table: the utf-8 strings end to end, and the offset where each one starts
+
+class StringTable:
+
+    def intern(self,string):
+        if string is None:
+            return -1
+        id = self.ids.get(string)
+        if id is None:
+            id = len(self.strings)
+            self.ids[string] = id
+            self.strings.append(string)
+        return id
+
+    def write(self,path):
+        encoded = [string.encode('utf-8') for string in self.strings]
+        offsets = numpy.zeros(len(encoded)+1,dtype=numpy.int64)
+        numpy.cumsum([len(data) for data in encoded],out=offsets[1:])
+        numpy.save(os.path.join(path,'offsets.npy'),offsets)
+        with open(os.path.join(path,'strings.bin'),'wb') as fd:
+            for data in encoded:
+                fd.write(data)
+
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+class MappedStrings:
+
+    def get(self,id):
+        if id<0:
+            return None
+        string = self.cache.get(id)
+        if string is None:
+            string = bytes(self.blob[self.offsets[id]:self.offsets[id+1]]).decode('utf-8')
+            self.cache.put(id,string)
+        return string
+
+    def __init__(self,path,cache_size=100000):
+        self.offsets = numpy.load(os.path.join(path,'offsets.npy'),mmap_mode='r')
+        blob = os.path.join(path,'strings.bin')
+        self.blob = numpy.memmap(blob,dtype=numpy.uint8,mode='r') if os.path.getsize(blob) else b''
+        self.cache = LRUCache(cache_size) #The most recently decoded strings, so the common ones are not decoded again
+
+## -------------------------------------------
+
+def labelRow(strings,label):
+    return (
+        strings.intern(label.key),
+        strings.intern(label.idiom),
+        strings.intern(label.label),
+        label.length,
+        label.start,
+        label.end,
+        strings.intern(str(label.docid)),
+        label.sentenceid,
+        strings.intern(label.objectOf),
+        strings.intern(label.subjectOf)
+    )
+
+def writeLabels(path,data):
+    #Writes the labels of every {name:{key:[Label,...]}} in data, such as {"concepts":concepts,"predicates":predicates}
+    #The columns are written to a temporary directory that replaces the old one, so a crash never leaves half a store behind
+    with atomicDirectory(path) as temp:
+        writeColumns(temp,data)
+
+def writeColumns(path,data):
+    #Writes the string table, and the rows and keys of every name, into the directory
+    strings = StringTable()
+    meta = {"version":_VERSION_,"names":list(data.keys()),"intdocids":True}
+
+    for name,labels in data.items():
+        count = sum(len(keylabels) for keylabels in labels.values())
+        rows = numpy.lib.format.open_memmap(os.path.join(path,name+'.npy'),mode='w+',dtype=_LABEL_,shape=(count,))
+        keys = numpy.zeros(len(labels),dtype=_KEY_)
+
+        position = 0
+        buffer = []
+        for k,(key,keylabels) in enumerate(labels.items()):
+            begin = position + len(buffer)
+            for label in keylabels:
+                if not isinstance(label.docid,int):
+                    meta["intdocids"] = False
+                buffer.append(labelRow(strings,label))
+            keys[k] = (strings.intern(key),begin,position+len(buffer))
+            if len(buffer)>=_FLUSH_:
+                rows[position:position+len(buffer)] = numpy.array(buffer,dtype=_LABEL_)
+                position += len(buffer)
+                buffer = []
+        if len(buffer):
+            rows[position:position+len(buffer)] = numpy.array(buffer,dtype=_LABEL_)
+
+        rows.flush()
+        del rows
+        numpy.save(os.path.join(path,name+'-keys.npy'),keys)
+
+    strings.write(path)
+    with open(os.path.join(path,'meta.json'),'w') as fd:
+        json.dump(meta,fd)
+
+##==========================================================
+
+class LabelStore:
+
+    def label(self,row):
+        #The Label of a row, as a tuple of its columns
+        strings = self.strings
+        label = self.labelclass.__new__(self.labelclass)
+        label.key = strings.get(row[0])
+        label.idiom = strings.get(row[1])
+        label.label = strings.get(row[2])
+        label.length = row[3]
+        label.start = row[4]
+        label.end = row[5]
+        label.docid = int(strings.get(row[6])) if self.intdocids else strings.get(row[6])
+        label.sentenceid = row[7]
+        label.objectOf = strings.get(row[8])
+        label.subjectOf = strings.get(row[9])
+        return label
+
+    def labels(self,name):
+        #The {key:LabelView} of the labels saved under name
+        rows = self.rows[name]
+        return {self.strings.get(key):LabelView(self,rows,begin,end) for key,begin,end in self.keys[name].tolist()}
+
+    def __init__(self,path,labelclass):
+        #Labelclass is the class that rows are read back as (skipchunk.Label)
+        with open(os.path.join(path,'meta.json')) as fd:
+            meta = json.load(fd)
+        if meta["version"]>_VERSION_:
+            raise ValueError('The labels in ' + path + ' were written by a newer version of skipchunk')
+
+        self.path = path
+        self.labelclass = labelclass
+        self.intdocids = meta["intdocids"]
+        self.strings = MappedStrings(path)
+        self.rows = {name:numpy.load(os.path.join(path,name+'.npy'),mmap_mode='r') for name in meta["names"]}
+        self.keys = {name:numpy.load(os.path.join(path,name+'-keys.npy')) for name in meta["names"]}
+
+## -------------------------------------------
+## The labels of one key: a slice of the mapped rows, followed by any labels added after it was loaded
+## Behaves like the list of Labels it replaces, and pickles as one
+
+class LabelView:
+
+    __slots__ = ('store','rows','begin','end','added')
+
+    def __iter__(self):
+        for row in self.rows[self.begin:self.end].tolist():
+            yield self.store.label(row)
+        if self.added:
+            yield from self.added
+
+    def __len__(self):
+        return self.end - self.begin + (len(self.added) if self.added else 0)
+
+    def __getitem__(self,index):
+        if isinstance(index,slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index<0:
+            index += len(self)
+        if index<0 or index>=len(self):
+            raise IndexError('label index out of range')
+        if index<self.end-self.begin:
+            return self.store.label(self.rows[self.begin+index].tolist())
+        return self.added[index-(self.end-self.begin)]
+
+    def append(self,label):
+        self.extend([label])
+
+    def extend(self,labels):
+        if self.added is None:
+            self.added = []
+        self.added.extend(labels)
+
+    def __reduce__(self):
+        return (list,(list(self),))
+
+    def __init__(self,store,rows,begin,end):
+        self.store = store
+        self.rows = rows
+        self.begin = begin
+        self.end = end
+        self.added = None #Labels enriched after loading, only made when there are some
@@ -0,0 +1,38 @@
+"""
+A least recently used cache bounded to maxsize entries, that counts its hits and misses.
+The sentence memo, the preflabel cache, the derivation cache and the mapped label strings build on it.
+"""
+
+import collections
+
+class LRUCache:
+
+    def get(self,key,default=None):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return default
+
+    def put(self,key,value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries)>self.maxsize:
+            self.entries.popitem(last=False)
+
+    def __contains__(self,key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits":self.hits,"misses":self.misses,"hit_rate":self.hits/total if total else 0.0,"size":len(self.entries)}
+
+    def __init__(self,maxsize):
+        self.maxsize = maxsize #Number of entries kept
+        self.entries = collections.OrderedDict() #Least recently used first
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,118 @@
+"""
+Caches the chunker output of every enriched document, so unchanged documents are never parsed again.
+Entries are keyed by a hash of the document text, its id and fields, and the model and chunking configuration.
+Should be kept in skipchunk_data, next to the preflabel database.
+"""
+
+import pickle
+import sqlite3
+import hashlib
+
+_VERSION_ = 1 #Bump when the cached chunker output changes shape
+
+class ParseCache:
+
+    def key(self,text,docid,fields):
+        # The docid is part of the key since it is stored in every Label
+        digest = hashlib.sha1()
+        for part in (str(_VERSION_),self.config,str(docid),repr(fields),text):
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self,keys):
+        # Gets the cached (fields,docconcepts,docpredicates) for the keys that are known
+        found = {}
+        for i in range(0,len(keys),500):
+            batch = keys[i:i+500]
+            self.c.execute('''SELECT key,chunks FROM parses WHERE key IN (''' + ','.join('?'*len(batch)) + ''')''', batch)
+            for key,chunks in self.c.fetchall():
+                found[key] = pickle.loads(chunks)
+
+        #Mark the hits as seen in this generation, so they are not evicted
+        self.c.executemany('''UPDATE parses SET generation=? WHERE key=?''', [(self.generation,key) for key in found])
+
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def put(self,key,docid,chunks):
+        # Adds the chunker output of a freshly parsed document
+        self.c.execute('''INSERT OR REPLACE INTO parses VALUES (?,?,?,?)''', (key, str(docid), pickle.dumps(chunks,protocol=pickle.HIGHEST_PROTOCOL), self.generation,))
+
+    def commit(self):
+        self.conn.commit()
+        if self.max_entries:
+            self.cap()
+
+    def cap(self):
+        # Evicts the entries of the oldest generations once there are more than max_entries
+        self.c.execute('''SELECT count(*) FROM parses''')
+        excess = self.c.fetchone()[0] - self.max_entries
+        if excess<=0:
+            return 0
+        self.c.execute('''DELETE FROM parses WHERE key IN (SELECT key FROM parses ORDER BY generation LIMIT ?)''', (excess,))
+        self.conn.commit()
+        return excess
+
+    def evict(self):
+        # Removes the documents that were not enriched since the cache was opened
+        # Only call this after the whole corpus went through, or the rest of it will be parsed again next time!
+        self.c.execute('''DELETE FROM parses WHERE generation<?''', (self.generation,))
+        evicted = self.c.rowcount
+        self.conn.commit()
+        return evicted
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits":self.hits,"misses":self.misses,"hit_rate":self.hits/total if total else 0.0}
+
+    def create(self):
+
+        # Create tables
+        self.c.execute('''
+                CREATE TABLE IF NOT EXISTS parses (
+                    key text NOT NULL PRIMARY KEY,
+                    docid text NOT NULL,
+                    chunks blob NOT NULL,
+                    generation int NOT NULL
+                )
+            ''')
+        self.c.execute('''CREATE INDEX IF NOT EXISTS parses_generation ON parses (generation)''')
+        self.c.execute('''
+                CREATE TABLE IF NOT EXISTS meta (
+                    name text NOT NULL PRIMARY KEY,
+                    value int NOT NULL
+                )
+            ''')
+
+        # Save (commit) the changes
+        self.conn.commit()
+
+    def open(self):
+        #Opens a connection, creates the tables if they don't exist, and starts a new generation
+        self.conn = sqlite3.connect(self.database)
+        self.c = self.conn.cursor()
+        self.create()
+
+        self.c.execute('''SELECT value FROM meta WHERE name='generation' ''')
+        generation = self.c.fetchone()
+        self.generation = generation[0]+1 if generation else 1
+        self.c.execute('''INSERT OR REPLACE INTO meta VALUES ('generation',?)''', (self.generation,))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __init__(self,database,config,max_entries=0):
+        #Database is the full path of the sqlite database file
+        #Config is a string describing everything, besides the text, that changes the chunker output
+        #When max_entries>0, the entries of the oldest generations are evicted once there are more than that
+        self.database = database
+        self.config = config
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        self.open()
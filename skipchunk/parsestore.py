@@ -0,0 +1,150 @@
+"""
+Keeps the spacy parse of every enriched document on disk, in shards of serialized DocBins.
+Parsing is most of the enrichment time, so the stored parses let the chunking parameters
+be tuned with Skipchunk.rechunk without running the model again.
+Each shard has an index of the document ids in it, and a document parsed more than once
+(such as again after resuming) only has its latest parse read back, with all of its windows.
+"""
+
+import os
+import glob
+import json
+from spacy.tokens import DocBin
+
+from .atomic import atomicWrite
+
+#Token attributes read by the chunker
+_ATTRS_ = ['ORTH','NORM','LEMMA','TAG','POS','MORPH','DEP','HEAD','SENT_START','ENT_IOB','ENT_TYPE']
+
+## -------------------------------------------
+## The document id and field offsets travel with each parse in its user_data
+## A long document parsed in windows is kept as one parse per window, window is (index,count,fields,stop) for each
+
+def storeContext(doc,docid,fields,window=None):
+    doc.user_data["skipchunk_id"] = docid
+    doc.user_data["skipchunk_fields"] = fields
+    doc.user_data["skipchunk_window"] = window
+
+def storedContext(doc):
+    return doc.user_data["skipchunk_id"],doc.user_data["skipchunk_fields"],doc.user_data.get("skipchunk_window")
+
+def docBin():
+    return DocBin(attrs=_ATTRS_,store_user_data=True)
+
+#The (docid,window index) of a parse, as kept in the shard index
+def parseId(docid,window=None):
+    return [docid,window[0] if window else None]
+
+def indexPath(path):
+    return path[:-len('.spacy')] + '.json'
+
+def saveShard(path,docbin,ids):
+    #Writes the shard and the (docid,window index) of each of its docs, the shard last so it is only read once its index is there
+    with atomicWrite(indexPath(path)) as fd:
+        json.dump(ids,fd)
+    with atomicWrite(path,'wb') as fd:
+        fd.write(docbin.to_bytes())
+
+##==========================================================
+
+class ParseStore:
+
+    def shards(self):
+        return sorted(glob.glob(os.path.join(self.path,'parses-*.spacy')))
+
+    def nextShard(self):
+        #Path of a new shard.  Shards are numbered in the order they were written
+        path = os.path.join(self.path,'parses-%06d.spacy' % self.count)
+        self.count += 1
+        return path
+
+    def add(self,doc,docid,fields,window=None):
+        #Buffers a parsed doc, and writes the buffer out once it is a full shard
+        #The DocBin keeps the doc as compact arrays, so the doc itself is not held on to
+        storeContext(doc,docid,fields,window)
+        self.buffer.add(doc)
+        self.ids.append(parseId(docid,window))
+        if len(self.buffer)>=self.shard_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.buffer):
+            saveShard(self.nextShard(),self.buffer,self.ids)
+            self.buffer = docBin()
+            self.ids = []
+
+    def latest(self,shards):
+        #The positions of the docs in each shard that belong to the latest parse of their docid
+        #The windows of a parse are added one after the other, so a parse starts at a whole doc or at window 0,
+        #  and replaces every window of the parses of that docid before it
+        #Shards written without an index are read whole
+        latest = {}
+        for path in shards:
+            if os.path.isfile(indexPath(path)):
+                with open(indexPath(path)) as fd:
+                    for position,(docid,window) in enumerate(json.load(fd)):
+                        if not window or docid not in latest:
+                            latest[docid] = []
+                        latest[docid].append((path,position))
+        positions = {}
+        for parse in latest.values():
+            for path,position in parse:
+                positions.setdefault(path,set()).add(position)
+        return positions
+
+    def docs(self,vocab):
+        #Streams the stored parses back one shard at a time, in the order they were written
+        self.flush()
+        shards = self.shards()
+        positions = self.latest(shards)
+        for path in shards:
+            with open(path,'rb') as fd:
+                docbin = DocBin().from_bytes(fd.read())
+            indexed = os.path.isfile(indexPath(path))
+            keep = positions.get(path,set())
+            for position,doc in enumerate(docbin.get_docs(vocab)):
+                if not indexed or position in keep:
+                    yield doc
+
+    def miss(self,count):
+        #Counts documents that were enriched without their parse, such as parse cache hits
+        #They can't be chunked again, so rechunking refuses to run on a store that misses any
+        if count:
+            self.missing += count
+            self.saveMeta()
+
+    def saveMeta(self):
+        with atomicWrite(self.metafile) as fd:
+            json.dump({"missing":self.missing},fd)
+
+    def clear(self):
+        #Deletes every stored parse
+        self.buffer = docBin()
+        self.ids = []
+        for path in self.shards():
+            os.remove(path)
+            if os.path.isfile(indexPath(path)):
+                os.remove(indexPath(path))
+        self.count = 0
+        self.missing = 0
+        self.saveMeta()
+
+    def __init__(self,path,shard_size=1000):
+        #Path is the directory holding the shard files
+        self.path = path
+        self.shard_size = shard_size
+        self.buffer = docBin()
+        self.ids = [] #The (docid,window index) of each doc in the buffer
+        self.metafile = os.path.join(self.path,'meta.json')
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        #Carry on numbering after the shards that are already there
+        shards = self.shards()
+        self.count = int(os.path.basename(shards[-1])[7:-6])+1 if len(shards) else 0
+
+        self.missing = 0
+        if os.path.isfile(self.metafile):
+            with open(self.metafile) as fd:
+                self.missing = json.load(fd)["missing"]
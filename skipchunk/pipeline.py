@@ -0,0 +1,120 @@
+"""
+Overlaps enrichment with indexing.
+Skipchunk parses and chunks on the calling thread, while enriched documents are
+batched onto a bounded queue and bulk loaded into the engine by a background thread.
+When the engine falls behind, the queue fills up and enrichment waits for it.
+"""
+
+import queue
+import threading
+
+_DONE_ = None #Queue sentinel that tells the indexing thread to finish
+
+## -------------------------------------------
+## The enriched labels are kept in the graph, so they are not sent with the document
+
+def indexableDocument(rich):
+    return {k:v for k,v in rich.items() if k not in ('skipchunk_concepts','skipchunk_predicates')}
+
+##==========================================================
+
+class IngestPipeline():
+
+    ## -------------------------------------------
+    # Indexing stage, runs on its own thread until it receives the sentinel
+
+    def consume(self):
+        while True:
+            batch = self.queue.get()
+            try:
+                if batch is _DONE_:
+                    break
+                if self.error is None:
+                    #Committing is slow on the engine side, so batches are only committed every commit_batches, and at the end
+                    ok = self.indexquery.indexGenerator(batch,timeout=self.timeout,commit=False)
+                    if not ok:
+                        raise ValueError('INDEX ERROR! A batch of ' + str(len(batch)) + ' documents could not be indexed')
+                    self.indexed += len(batch)
+                    self.batches += 1
+                    if self.commit_batches and self.batches % self.commit_batches == 0:
+                        self.indexquery.commit(timeout=self.timeout)
+            except Exception as e:
+                #Keep draining so the producer is never stuck on a full queue
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    ## -------------------------------------------
+    # Hands a batch to the indexing thread, blocking while the queue is full
+
+    def produce(self,batch):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(batch)
+
+    ## -------------------------------------------
+    # Enriches the tuples and indexes the documents at the same time,
+    #   then indexes the graph once the concept and predicate groups are known
+
+    def run(self,tuples):
+        self.error = None
+        self.indexed = 0
+        self.batches = 0
+        self.queue = queue.Queue(maxsize=self.queue_size)
+
+        ok = True
+
+        consumer = None
+        if self.indexquery:
+            consumer = threading.Thread(target=self.consume,name='skipchunk-indexer',daemon=True)
+            consumer.start()
+
+        try:
+            batch = []
+            for rich in self.skipchunk.enrichStream(tuples,keep_labels=self.graphquery is not None):
+                if consumer:
+                    batch.append(indexableDocument(rich))
+                    if len(batch)>=self.batch_size:
+                        self.produce(batch)
+                        batch = []
+
+            if consumer and len(batch):
+                self.produce(batch)
+
+        finally:
+            if consumer:
+                self.queue.put(_DONE_)
+                consumer.join()
+
+        if self.error is not None:
+            raise self.error
+
+        #Commit whatever came after the last interval commit
+        if consumer and self.batches and not (self.commit_batches and self.batches % self.commit_batches == 0):
+            self.indexquery.commit(timeout=self.timeout)
+
+        if self.graphquery:
+            ok = self.graphquery.index(self.skipchunk,timeout=self.timeout)
+
+        return ok
+
+    ## -------------------------------------------
+    # skipchunk:: the Skipchunk instance that enriches the documents
+    # indexquery:: optional IndexQuery that receives the enriched documents
+    # graphquery:: optional GraphQuery that receives the concept and predicate groups
+    # batch_size:: number of documents sent to the engine at a time
+    # queue_size:: number of batches that can wait for the engine before enrichment blocks
+    # commit_batches:: commit the index every this many batches, when 0 it is only committed once all the documents are in
+    def __init__(self,skipchunk,indexquery=None,graphquery=None,batch_size=500,queue_size=4,timeout=10000,commit_batches=0):
+        self.skipchunk = skipchunk
+        self.indexquery = indexquery
+        self.graphquery = graphquery
+        self.batch_size = batch_size
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.commit_batches = commit_batches
+
+        self.queue = None
+        self.error = None
+        self.indexed = 0
+        self.batches = 0
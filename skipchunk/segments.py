@@ -0,0 +1,146 @@
+"""
+Stores the enriched documents, concepts, predicates and groups as streams of records, in compressed segment files.
+Each record is a length-prefixed pickle, and each artifact is a list of segments of up to segment_records records.
+The manifest lists the segments of every artifact, so an artifact can be read on its own, one record at a time,
+and a new batch is appended as new segments without rewriting the old ones.
+"""
+
+import os
+import gzip
+import glob
+import json
+import struct
+import pickle
+import functools
+
+from .atomic import atomicWrite
+
+_VERSION_ = 1 #Bump when the segment or manifest layout changes
+_LENGTH_ = struct.Struct('<I')
+
+def writeSegment(path,records,limit):
+    #Writes up to limit records from the iterator, through a temporary file so a crash never leaves half a segment behind
+    #Returns the number of records written
+    count = 0
+    with atomicWrite(path,'wb',opener=functools.partial(gzip.open,compresslevel=6)) as fd:
+        for record in records:
+            data = pickle.dumps(record,protocol=pickle.HIGHEST_PROTOCOL)
+            fd.write(_LENGTH_.pack(len(data)))
+            fd.write(data)
+            count += 1
+            if count>=limit:
+                break
+    return count
+
+def readSegment(path):
+    with gzip.open(path,'rb') as fd:
+        while True:
+            prefix = fd.read(_LENGTH_.size)
+            if not prefix:
+                return
+            length, = _LENGTH_.unpack(prefix)
+            yield pickle.loads(fd.read(length))
+
+##==========================================================
+
+class SegmentStore:
+
+    def names(self):
+        return list(self.manifest["artifacts"].keys())
+
+    def count(self,name):
+        #Number of records in the artifact
+        return sum(segment["records"] for segment in self.manifest["artifacts"].get(name,[]))
+
+    def write(self,name,records,append=False,commit=True):
+        #Writes the records as new segments of the artifact
+        #Without append, the artifact's old segments are deleted once the new ones are in the manifest
+        #With commit=False, the manifest is only saved by commit, so several writes show up all at once or not at all
+        old = [] if append else self.manifest["artifacts"].get(name,[])
+        segments = list(self.manifest["artifacts"].get(name,[])) if append else []
+
+        records = iter(records)
+        while True:
+            filename = '%s-%06d.seg' % (name,self.manifest["next"])
+            self.manifest["next"] += 1
+            count = writeSegment(os.path.join(self.path,filename),records,self.segment_records)
+            if not count:
+                os.remove(os.path.join(self.path,filename))
+                break
+            segments.append({"file":filename,"records":count})
+            if count<self.segment_records:
+                break
+
+        self.manifest["artifacts"][name] = segments
+        self.replaced.extend(old)
+
+        if commit:
+            self.commit()
+
+    def commit(self):
+        #Saves the manifest, then deletes the segments that the writes since the last commit replaced
+        #Segments written but never committed are not in the manifest, and are overwritten by the next writes
+        self.saveManifest()
+        for segment in self.replaced:
+            os.remove(os.path.join(self.path,segment["file"]))
+        self.replaced = []
+
+    def records(self,name):
+        #Streams the records of the artifact, one segment at a time, in the order they were written
+        if name not in self.manifest["artifacts"]:
+            raise ValueError('There is no ' + name + ' in ' + self.path)
+        for segment in self.manifest["artifacts"][name]:
+            yield from readSegment(os.path.join(self.path,segment["file"]))
+
+    def saveManifest(self):
+        with atomicWrite(self.manifestfile) as fd:
+            json.dump(self.manifest,fd,indent=2)
+
+    def loadManifest(self):
+        with open(self.manifestfile) as fd:
+            manifest = json.load(fd)
+        if manifest.get("version",0)>_VERSION_:
+            raise ValueError('The segments in ' + self.path + ' were written by a newer version of skipchunk')
+        return manifest
+
+    def clear(self):
+        #Deletes every segment
+        for path in glob.glob(os.path.join(self.path,'*.seg*')):
+            os.remove(path)
+        self.manifest = {"version":_VERSION_,"next":0,"artifacts":{}}
+        self.replaced = []
+        self.saveManifest()
+
+    def __init__(self,path,segment_records=10000):
+        #Path is the directory holding the manifest and segment files
+        self.path = path
+        self.segment_records = segment_records
+        self.manifestfile = os.path.join(self.path,'manifest.json')
+        self.replaced = [] #Old segments to delete once the manifest no longer lists them
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        if os.path.isfile(self.manifestfile):
+            self.manifest = self.loadManifest()
+        else:
+            self.manifest = {"version":_VERSION_,"next":0,"artifacts":{}}
+
+##==========================================================
+## An artifact that is read from its segments each time it is iterated, instead of being loaded
+
+class Records:
+
+    def __iter__(self):
+        if self.transform is None:
+            return self.store.records(self.name)
+        return map(self.transform,self.store.records(self.name))
+
+    def __len__(self):
+        return self.store.count(self.name)
+
+    def __init__(self,store,name,transform=None):
+        #Transform is applied to each record as it is read
+        self.store = store
+        self.name = name
+        self.transform = transform
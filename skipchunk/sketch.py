@@ -0,0 +1,61 @@
+"""
+Count-min sketch of how often each concept (or predicate) key was seen, in bounded memory.
+Used to approximate the key counts, so that keys seen fewer than minlabels times are never collected.
+An estimate is never below the true count, and is above it by at most epsilon times the total count,
+with probability 1-delta.
+"""
+
+import math
+import hashlib
+import numpy
+
+class CountMinSketch:
+
+    def hashes(self,key):
+        #The column of each row by double hashing, from a single 16 byte digest of the key whatever the depth
+        #Same as BloomFilter.positions in database.py
+        digest = hashlib.blake2b(key.encode('utf-8'),digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8],'little')
+        h2 = int.from_bytes(digest[8:],'little') | 1
+        return [(h1 + row*h2) % self.width for row in range(self.depth)]
+
+    def add(self,key,count=1):
+        #Adds the count to the key, and returns its new estimate
+        columns = self.hashes(key)
+        estimate = None
+        for row,column in enumerate(columns):
+            self.table[row,column] += count
+            value = int(self.table[row,column])
+            if estimate is None or value<estimate:
+                estimate = value
+        self.total += count
+        return estimate
+
+    def estimate(self,key):
+        return int(min(self.table[row,column] for row,column in enumerate(self.hashes(key))))
+
+    def error(self):
+        #The most an estimate is expected to be over the true count, with probability 1-delta
+        return self.epsilon * self.total
+
+    def stats(self):
+        return {
+            "epsilon":self.epsilon,
+            "delta":self.delta,
+            "width":self.width,
+            "depth":self.depth,
+            "total":self.total,
+            "error":self.error()
+        }
+
+    def __init__(self,epsilon=0.0001,delta=0.01):
+        #The sketch takes width*depth counters: e/epsilon columns and ln(1/delta) rows
+        if not 0<epsilon<1 or not 0<delta<1:
+            raise ValueError('The sketch epsilon and delta must be between 0 and 1')
+
+        self.epsilon = epsilon
+        self.delta = delta
+        self.width = int(math.ceil(math.e/epsilon))
+        self.depth = int(math.ceil(math.log(1/delta)))
+        self.table = numpy.zeros((self.depth,self.width),dtype=numpy.int64)
+        self.total = 0
@@ -3,20 +3,35 @@
 """Main module."""
 
 import os
-import re
+import time
 import json
 import spacy
+import numpy
 import shutil
 import pickle
+import array
 import datetime
+import itertools
 import collections
+import collections.abc
+import multiprocessing
 from datetime import date as dt
 from enum import Enum
 from tqdm import tqdm
-from nltk.corpus import wordnet as wn
+from spacy.attrs import TAG, DEP, HEAD, IS_ALPHA, LEMMA, NORM, LOWER
 
 from . import html_strip
 from . import database
+from . import parsecache
+from . import parsestore
+from . import spill
+from . import sketch
+from . import segments
+from . import labelstore
+from . import docstore
+from . import derivations
+from .derivations import adj_to_noun
+from .lru import LRUCache
 
 _NNJJ_ = {'JJ','JJR','JJS','NN','NNP','NNS','ADJ','NOUN'} #Nouns and Adjectives
 _VBRB_ = {'RB','RBR','RBS','RP','VB','VBD','VBG','VBN','VBP','VBZ','ADV','VERB'} #Verbs and Adverbs
@@ -28,6 +43,42 @@ _OBJ_DEPS_ = {'dobj'}
 _EXCL_ = {'SP','-RRB-','HYPH'} #Noise to skip
 _EXCL_DEPS_ = {} #dependencies to exclude
 
+_LABEL_FIELDS_ = ['key','idiom','label','length','start','end','docid','sentenceid','objectOf','subjectOf']
+
+#Spacy pipeline tiers, trading Label fields for enrichment throughput
+#  exclude: pipeline components that are not loaded at all
+#  sentencizer: adds the rule-based sentencizer, for when the parser no longer splits sentences
+#  fields: the Label fields the tier can fill
+_TIERS_ = {
+    "full": {
+        "exclude": [],
+        "sentencizer": False,
+        "fields": _LABEL_FIELDS_
+    },
+    "no-ner": {
+        "exclude": ["ner"],
+        "sentencizer": False,
+        "fields": _LABEL_FIELDS_
+    },
+    "tagger-only": {
+        "exclude": ["parser","ner"],
+        "sentencizer": True,
+        "fields": [f for f in _LABEL_FIELDS_ if f not in ('objectOf','subjectOf')]
+    }
+}
+
+#Loads the spacy model with only the components the tier needs
+def loadPipeline(spacy_model,tier="full"):
+    if tier not in _TIERS_:
+        raise ValueError('Unknown spacy tier "' + str(tier) + '", use one of ' + ', '.join(_TIERS_.keys()))
+
+    nlp = spacy.load(spacy_model,exclude=_TIERS_[tier]["exclude"])
+
+    if _TIERS_[tier]["sentencizer"]:
+        nlp.add_pipe("sentencizer",first=True)
+
+    return nlp
+
 
 #Decides whether to lemmatize based on POS tag
 def lemmatize(token):
@@ -38,62 +89,41 @@ def lemmatize(token):
         lemma = token.lemma_
     return lemma
 
-#Uses wordnet to get de-adjectival nouns
-def adj_to_noun(lem):
-    for i in wn.synsets(lem, wn.ADJ):
-        for j in i.lemmas():
-            drf = j.derivationally_related_forms()
-            drf.sort(key = lambda x: len(x.name()))
-            for k in drf:
-                if k.name()[:2] == lem[:2]:
-                    #Found it!
-                    return k.name()
-
-#Uses wordnet to get de-nounal adjective
-def noun_to_adj(lem):
-    for i in wn.synsets(lem, wn.NOUN):
-        for j in i.lemmas():
-            for k in j.derivationally_related_forms():
-                if k.name()[:2] == lem[:2]:
-                    #Found it!
-                    return k.name()
-
 # ------------------------------------------------------
 # Extracts and annotates terms from a spacy document (preferrably a sentence)
 
 ## An annotated term
+## Terms are slotted, and the same Term is used both in the chunk stack and in the original tokens,
+##   so the key form is kept in its own attribute instead of on a copy.
 class Term:
 
+    __slots__ = ('norm','lemma','tag','dep','derived','form','objectOf','subjectOf')
+
     def useDerivedForm(self):
+        #The derived form is only looked up for the terms that end up in a concept
+        if self.derived is None and self.tag == 'JJ':
+            self.derived = adj_to_noun(self.lemma)
+
         if self.derived is not None:
-            self.override = self.derived
+            self.form = self.derived
         else:
-            self.text = self.lemma
+            self.form = self.lemma
 
     def useLemmaForm(self):
-        self.text = self.lemma
-
-    def clone(self):
-        return Term(
-            self.norm,
-            self.lemma,
-            self.tag,
-            self.dep,
-            self.derived,
-            _text=self.text,
-            _override=self.override,
-            _objectOf=self.objectOf,
-            _subjectOf=self.subjectOf
-            )
+        self.form = self.lemma
 
-    def __init__(self,_norm="",_lemma="",_tag="",_dep="",_derived=None,_text=None,_override=None,_objectOf=None,_subjectOf=None):
-        self.text = _norm #Default the label to the original form.  This may become the lemma based on logic
+    @property
+    def text(self):
+        #The label uses the original form
+        return self.norm
+
+    def __init__(self,_norm="",_lemma="",_tag="",_dep="",_derived=None,_form=None,_objectOf=None,_subjectOf=None):
         self.norm = _norm  #The original form of the word
         self.lemma = _lemma #The lemmatized form of the word
         self.tag = _tag #The part of speech tag
         self.dep = _dep #The dependency
         self.derived = _derived #the derived form (typical de-adjectival nouns)
-        self.override = _override #This may become the derived form based on logic
+        self.form = _form #The form used in keys and idioms, the derived form or lemma based on logic
         self.objectOf = _objectOf #If the term is a direct object, this is the normalized ancestor verb
         self.subjectOf = _subjectOf #If the term is a nominal subject, this is the normalized ancestor verb
 
@@ -103,13 +133,8 @@ def tokenToTerm(tok):
 
     if (tok.tag_ not in _EXCL_):
         lemma = lemmatize(tok)
-        drf = None
         objectOf = None
         subjectOf = None
-        
-        #Derive related form:
-        if (tok.tag_ == 'JJ'):
-            drf = adj_to_noun(lemma)
 
         #Parent verb for objects:
         if (tok.dep_ in _OBJ_DEPS_) and (tok.head.tag_ in _VBRB_):
@@ -119,7 +144,7 @@ def tokenToTerm(tok):
         if (tok.dep_ in _SUBJ_DEPS_) and (tok.head.tag_ in _VBRB_):
             subjectOf = tok.head.lemma_
 
-        term = Term(tok.norm_, lemma, tok.tag_, tok.dep_, drf, _objectOf=objectOf, _subjectOf=subjectOf)
+        term = Term(tok.norm_, lemma, tok.tag_, tok.dep_, _objectOf=objectOf, _subjectOf=subjectOf)
                 
     return term
 
@@ -128,6 +153,8 @@ def tokenToTerm(tok):
 
 class Label:
 
+    __slots__ = ('key','idiom','label','length','start','end','docid','sentenceid','objectOf','subjectOf')
+
     @staticmethod
     def makeKey(vals):
         return '_'.join(sorted(vals)).lower()
@@ -152,6 +179,14 @@ class Label:
         self.objectOf = _objectOf
         self.subjectOf = _subjectOf
 
+    def __getstate__(self):
+        return {k:getattr(self,k) for k in Label.__slots__}
+
+    def __setstate__(self,state):
+        #Labels pickled before they were slotted have the same state
+        for k in state:
+            setattr(self,k,state[k])
+
 #Converts the chunk to a Label
 def chunkToLabel(stack,origs,start,docid,sentenceid,type="concept"):
     keys = []
@@ -162,13 +197,10 @@ def chunkToLabel(stack,origs,start,docid,sentenceid,type="concept"):
     subjectOf = None
     
     #Make the key from only nouns, adjectives, verbs, and adverbs
-    #An override can be set to the token (usually a derived related form, such as a deadjectival noun)
+    #The key form of the token can be a derived related form, such as a deadjectival noun
     #Idioms are also made by removing punctuation
     for tok in stack:
-        val = tok.text
-
-        if tok.override is not None:
-            val = tok.override
+        val = tok.form
         
         if tok.tag in _NNJJ_ or tok.tag in _VBRB_:
             keys.append(val)
@@ -192,8 +224,8 @@ def chunkToLabel(stack,origs,start,docid,sentenceid,type="concept"):
 
         j += 1
 
-        #if tok.text not in _PUNC_:
-        labels.append(tok.text)
+        #if tok.norm not in _PUNC_:
+        labels.append(tok.norm)
 
         if tok.tag in _NNJJ_ or tok.tag in _VBRB_:
             i = j
@@ -239,9 +271,8 @@ def skipchunk(sentence,docid,sentenceid,maxslop=4,minlength=2,maxlength=4):
                 start = i
                 ispredicate = False
                 isconcept = True
-                stackItem = term.clone()
-                stackItem.useDerivedForm()
-                stack.append(stackItem)
+                term.useDerivedForm()
+                stack.append(term)
                 origs.append(term)
 
                 if len(stack)>=maxlength:
@@ -261,9 +292,8 @@ def skipchunk(sentence,docid,sentenceid,maxslop=4,minlength=2,maxlength=4):
                 start = i
                 ispredicate = True
                 isconcept = False
-                stackItem = term.clone()
-                stackItem.useLemmaForm()
-                stack.append(stackItem)                
+                term.useLemmaForm()
+                stack.append(term)
                 origs.append(term)
 
             elif (isconcept):
@@ -297,18 +327,459 @@ def skipchunk(sentence,docid,sentenceid,maxslop=4,minlength=2,maxlength=4):
     return concepts,predicates
 
 
+# ------------------------------------------------------
+# Vectorized version of skipchunk(), with exactly the same output.
+# The token attributes are pulled from the document once as integer columns with Doc.to_array,
+#   and tokens are classified with precomputed hash masks instead of per-token string lookups.
+# No Terms are built, and strings are only looked up for the tokens of emitted Labels.
+
+_SKIP_ = -1 #Excluded token
+_SLOP_ = 0 #Token that can only extend the current chunk
+_CONCEPT_ = 1 #Noun or adjective
+_PREDICATE_ = 2 #Verb or adverb
+
+def hashes(strings,vals):
+    return numpy.array([strings[v] for v in vals],dtype=numpy.uint64)
+
+## The classified integer columns of a parsed document
+class TokenArrays:
+
+    def __init__(self,doc):
+        strings = doc.vocab.strings
+        columns = doc.to_array([TAG,DEP,HEAD,IS_ALPHA,LEMMA,NORM])
+
+        tag = columns[:,0]
+        dep = columns[:,1]
+        head = numpy.arange(len(doc),dtype=numpy.int64) + columns[:,2].view(numpy.int64) #HEAD is a relative offset
+        alpha = columns[:,3].astype(bool)
+        lemma = columns[:,4]
+        norm = columns[:,5]
+
+        nnjj = numpy.isin(tag,hashes(strings,_NNJJ_))
+        vbrb = numpy.isin(tag,hashes(strings,_VBRB_))
+        exdep = numpy.isin(dep,hashes(strings,_EXCL_DEPS_))
+
+        kind = numpy.full(len(doc),_SLOP_,dtype=numpy.int8)
+        kind[vbrb & alpha & ~exdep] = _PREDICATE_
+        kind[nnjj & alpha] = _CONCEPT_
+        kind[numpy.isin(tag,hashes(strings,_EXCL_))] = _SKIP_
+
+        #Lemma of the parent verb for objects and subjects, 0 (the empty string) when there is none
+        headverb = vbrb[head]
+        objectOf = numpy.where(numpy.isin(dep,hashes(strings,_OBJ_DEPS_)) & headverb,lemma[head],0)
+        subjectOf = numpy.where(numpy.isin(dep,hashes(strings,_SUBJ_DEPS_)) & headverb,lemma[head],0)
+
+        self.strings = strings
+        self.kind = kind.tolist()
+        self.keyed = (nnjj | vbrb).tolist()
+        self.adjective = (tag == strings['JJ']).tolist()
+        self.punctuation = numpy.isin(norm,hashes(strings,_PUNC_)).tolist()
+        self.exdep = exdep.tolist()
+        self.lemma = lemma.tolist()
+        self.norm = norm.tolist()
+        self.objectOf = objectOf.tolist()
+        self.subjectOf = subjectOf.tolist()
+
+#Converts the chunk (as token indexes) to a Label, the same way as chunkToLabel
+def arraysToLabel(arrays,stack,origs,start,docid,sentenceid):
+    strings = arrays.strings
+    keys = []
+    idioms = []
+
+    objectOf = None
+    subjectOf = None
+
+    for t in stack:
+        val = strings[arrays.lemma[t]]
+
+        if arrays.kind[t] == _CONCEPT_ and arrays.adjective[t]:
+            derived = adj_to_noun(val)
+            if derived is not None:
+                val = derived
+
+        keys.append(val)
+
+        if val not in _PUNC_:
+            idioms.append(val)
+
+        if arrays.objectOf[t]:
+            objectOf = strings[arrays.objectOf[t]]
+
+        if arrays.subjectOf[t]:
+            subjectOf = strings[arrays.subjectOf[t]]
+
+    i = 0
+    j = 0
+    k = 0
+    f = False
+    for t in origs:
+
+        j += 1
+
+        if arrays.keyed[t]:
+            i = j
+            if not f:
+                k = j-1
+            f = True
+
+    labels = [strings[arrays.norm[t]] for t in origs[k:i]]
+
+    return Label(keys,idioms,labels,_start=start+k,_end=start+i,_docid=docid,_sentenceid=sentenceid,_objectOf=objectOf,_subjectOf=subjectOf)
+
+#Chunks the tokens from begin to end (usually a sentence) of the document arrays
+def skipchunkArrays(arrays,begin,end,docid,sentenceid,maxslop=4,minlength=2,maxlength=4):
+
+    kind = arrays.kind
+    punctuation = arrays.punctuation
+    exdep = arrays.exdep
+
+    stack = []
+    origs = []
+
+    isconcept = False
+    concepts = []
+
+    ispredicate = False
+    predicates = []
+
+    start = 0
+    slop = 0
+
+    for t in range(begin,end):
+
+        k = kind[t]
+
+        if k == _SKIP_:
+            continue
+
+        if k == _CONCEPT_:
+            if ispredicate:
+                predicates.append(arraysToLabel(arrays,stack,origs,start,docid,sentenceid))
+                stack=[]
+                origs=[]
+
+            start = t-begin
+            ispredicate = False
+            isconcept = True
+            stack.append(t)
+            origs.append(t)
+
+            if len(stack)>=maxlength:
+                concepts.append(arraysToLabel(arrays,stack,origs,start,docid,sentenceid))
+                stack=[]
+                origs=[]
+
+        elif k == _PREDICATE_:
+            if isconcept:
+                concepts.append(arraysToLabel(arrays,stack,origs,start,docid,sentenceid))
+                stack=[]
+                origs=[]
+
+            start = t-begin
+            ispredicate = True
+            isconcept = False
+            stack.append(t)
+            origs.append(t)
+
+        elif isconcept:
+            slop += 1
+            origs.append(t)
+
+            if (slop>maxslop) or punctuation[t]:
+                concepts.append(arraysToLabel(arrays,stack,origs,start,docid,sentenceid))
+                stack=[]
+                origs=[]
+                isconcept = False
+
+        elif ispredicate:
+            slop += 1
+            origs.append(t)
+
+            if (slop>maxslop) or punctuation[t] or exdep[t]:
+                predicates.append(arraysToLabel(arrays,stack,origs,start,docid,sentenceid))
+                stack=[]
+                origs=[]
+                ispredicate = False
+
+    return concepts,predicates
+
+
+# --------------------------------------------------
+# Chunks whole documents with a fixed set of parameters.
+# Kept separate from Skipchunk so it can be sent to worker processes.
+
+# ------------------------------------------------------
+# Boilerplate sentences (footers, disclaimers, bios) repeat thousands of times in a corpus.
+# The memo keeps the chunker output of the most recent sentences by their tokens, and replays the
+#   Labels of a repeated sentence with its own docid and sentenceid instead of chunking it again.
+# Label starts and ends are relative to the sentence, so they replay as they are.
+
+#The token attributes the chunker reads.  Sentences with the same ones chunk the same, whatever their whitespace,
+#  and the same text tagged differently in another context is chunked again.  HEAD is relative, so it is the same anywhere
+_MEMO_ATTRS_ = [LOWER,NORM,LEMMA,TAG,DEP,HEAD]
+
+#The memo key of every sentence of the doc is a slice of these columns
+def memoColumns(doc):
+    return doc.to_array(_MEMO_ATTRS_)
+
+#Copies a Label into another document and sentence
+def replayLabel(label,docid,sentenceid):
+    replay = Label.__new__(Label)
+    for k in Label.__slots__:
+        setattr(replay,k,getattr(label,k))
+    replay.docid = docid
+    replay.sentenceid = sentenceid
+    return replay
+
+class SentenceMemo(LRUCache):
+
+    def get(self,key,docid,sentenceid):
+        chunked = super().get(key)
+        if chunked is None:
+            return None,None
+
+        cons,preds = chunked
+        return [replayLabel(l,docid,sentenceid) for l in cons],[replayLabel(l,docid,sentenceid) for l in preds]
+
+    def put(self,key,cons,preds):
+        super().put(key,(cons,preds))
+
+    def __getstate__(self):
+        #Only the size travels to pool workers, each worker keeps its own memo (see enrichShard)
+        return {"maxsize":self.maxsize}
+
+    def __setstate__(self,state):
+        self.__init__(state["maxsize"])
+
+    def __init__(self,maxsize=10000):
+        #maxsize is the number of distinct sentences kept
+        super().__init__(maxsize)
+
+# ------------------------------------------------------
+
+class Chunker:
+
+    def chunkSentence(self,sentence,arrays,docid,sentenceid,docconcepts,docpredicates,tokens=None):
+        #Adds the concepts and predicates of one sentence to those of its document
+        #tokens is the memo key of the sentence (see memoColumns), when the chunker has a memo
+        maxslop = self.maxslop
+        minconceptlength = self.minconceptlength
+        maxconceptlength = self.maxconceptlength
+        minpredicatelength = self.minpredicatelength
+
+        #Sentences that were chunked before are replayed from the memo
+        cons = None
+        if self.memo is not None:
+            key = (maxslop,maxconceptlength,tokens)
+            cons,preds = self.memo.get(key,docid,sentenceid)
+
+        #SKIPCHUNK PIPELINE STAGE
+        if cons is None:
+            if self.vectorized:
+                cons,preds = skipchunkArrays(arrays,sentence.start,sentence.end,docid=docid,sentenceid=sentenceid,maxslop=maxslop,maxlength=maxconceptlength)
+            else:
+                cons,preds = skipchunk(sentence,docid=docid,sentenceid=sentenceid,maxslop=maxslop,maxlength=maxconceptlength)
+
+            if self.memo is not None:
+                self.memo.put(key,cons,preds)
+
+        for concept in cons:
+            if concept.length>=minconceptlength:
+                if concept.key not in docconcepts:
+                    docconcepts[concept.key] = []
+                docconcepts[concept.key].append(concept)
+
+        for predicate in preds:
+            if predicate.length>=minpredicatelength:
+                if predicate.key not in docpredicates:
+                    docpredicates[predicate.key] = []
+                docpredicates[predicate.key].append(predicate)
+
+    def chunk(self,doc,docid,fields=None):
+        #Returns the fields of the document, and its concepts and predicates by key
+        #fields is the list of (offset,field) of the FieldTuple the document was parsed from
+        fieldnames,chunked = chunkDocument(doc,docid,[self],fields=fields)
+        docconcepts,docpredicates = chunked[0]
+        return fieldnames,docconcepts,docpredicates
+
+    def __init__(self,maxslop=4,minconceptlength=2,maxconceptlength=4,minpredicatelength=2,maxpredicatelength=4,vectorized=False,memo=None):
+        self.vectorized = vectorized #Use skipchunkArrays instead of skipchunk
+        self.memo = memo #Optional SentenceMemo, that can be shared between chunkers
+        self.maxslop = maxslop
+        self.minconceptlength = minconceptlength
+        self.maxconceptlength = maxconceptlength
+        self.minpredicatelength = minpredicatelength
+        self.maxpredicatelength = maxpredicatelength
+
+#Chunks the document with every chunker, in one pass over its sentences
+#Returns the fields of the document, and the (concepts,predicates) by key of each chunker
+def chunkDocument(doc,docid,chunkers,fields=None):
+    if not fields:
+        fields = []
+
+    chunked = [({},{}) for chunker in chunkers]
+
+    if isinstance(doc,Windows):
+        #Each window carries on the sentenceids of the window before it
+        sentenceid = 0
+        for window,windowfields,stop in doc:
+            sentenceid = chunkSentences(window,docid,chunkers,windowfields,chunked,sentenceid,stop)
+            del window
+    else:
+        chunkSentences(doc,docid,chunkers,fields,chunked,0)
+
+    return [field for offset,field in fields],chunked
+
+#Adds the labels of every sentence (before the stop token) to chunked, and returns the sentenceid after the last sentence
+def chunkSentences(doc,docid,chunkers,fields,chunked,sentenceid,stop=None):
+    arrays = None
+    if any(chunker.vectorized for chunker in chunkers):
+        arrays = TokenArrays(doc)
+
+    columns = None
+    if any(chunker.memo is not None for chunker in chunkers):
+        columns = memoColumns(doc)
+
+    text = doc.text
+
+    for sentence in fieldSentences(doc,[offset for offset,field in fields[1:]]):
+
+        if stop is not None and sentence.start>=stop:
+            break
+
+        if len(text[sentence.start_char:sentence.end_char].strip())>1:
+
+            tokens = columns[sentence.start:sentence.end].tobytes() if columns is not None else None
+
+            for chunker,(docconcepts,docpredicates) in zip(chunkers,chunked):
+                chunker.chunkSentence(sentence,arrays,docid,sentenceid,docconcepts,docpredicates,tokens)
+
+            sentenceid += 1
+
+    return sentenceid
+
+#Adds the labels of one concepts (or predicates) dict to another
+#With groups, the running ConceptGroup of every key is updated with the new labels only, and shares its label list with data
+#When the new labels were already counted into ConceptGroups (such as by a pool worker), they are given as counts and merged
+#With data None, only the groups are updated and the labels are not kept
+def mergeLabels(data,labels,groups=None,counts=None):
+    for key in labels.keys():
+        if data is not None:
+            if key not in data:
+                data[key] = []
+            data[key].extend(labels[key])
+
+        if groups is not None:
+            if key not in groups:
+                groups[key] = ConceptGroup(key,0,None,0)
+                groups[key].addlabels(data[key] if data is not None else [])
+            if counts is not None:
+                groups[key].merge(counts[key])
+            else:
+                groups[key].count(labels[key])
+    return data
+
+## -------------------------------------------
+## The labels of one document, kept as the position of its labels in the shared concepts (or predicates) dict
+##   and their (sentenceid,start,end), instead of as Label objects.  The Labels are only looked up when asked for.
+## Pickles without the shared dict, which is attached again when loading (see Skipchunk.load)
+
+class DocumentLabels(collections.abc.Mapping):
+
+    def __getitem__(self,key):
+        #A missing key is a KeyError even when detached, so get() and in work as for a dict
+        position,count,_ = self.positions[key]
+        if self.data is None:
+            raise ValueError('The document labels are not attached to their concepts or predicates, load them first')
+        return list(self.data[key][position:position+count])
+
+    def __contains__(self,key):
+        return key in self.positions
+
+    def __iter__(self):
+        return iter(self.positions)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def spans(self,key):
+        #The (sentenceid,start,end) of each label of the key, without looking up the Labels
+        _,count,offset = self.positions[key]
+        return [tuple(self.spanarray[i:i+3]) for i in range(3*offset,3*(offset+count),3)]
+
+    def expand(self):
+        #The {key:[Label,...]} dict
+        return {key:self[key] for key in self.positions}
+
+    def attach(self,data):
+        self.data = data
+
+    def __reduce__(self):
+        return (DocumentLabels,(None,self.positions,self.spanarray))
+
+    def __init__(self,data,positions,spanarray):
+        self.data = data
+        self.positions = positions #key:(position in data[key],count,offset in spanarray)
+        self.spanarray = spanarray #sentenceid,start,end of every label end to end
+
+#The DocumentLabels of a document, whose labels are merged into data after the ones counted in lengths
+#lengths is the number of labels of each key in data before this document, and is updated with its labels
+def compactLabels(data,labels,lengths):
+    positions = {}
+    spanarray = array.array('i')
+    for key,keylabels in labels.items():
+        position = lengths.get(key,0)
+        positions[key] = (position,len(keylabels),len(spanarray)//3)
+        lengths[key] = position + len(keylabels)
+        for label in keylabels:
+            spanarray.extend((label.sentenceid,label.start,label.end))
+    return DocumentLabels(data,positions,spanarray)
+
+#The lengths to compact the labels of the next document merged into data
+def labelLengths(data,labels):
+    return {key:len(data[key]) for key in labels.keys() if key in data}
+
 # --------------------------------------------------
 # Merges Labels with the same key into Concept Groups
+# A group is a running aggregate of its key: the total, the count of every label and the preflabel,
+#   so it can be updated with new labels, or merged with the group of another batch or process,
+#   without counting the labels it already has again.
 class ConceptGroup:
 
     def alternate(self,_label,_count):
         if (_label not in self.alternates):
             self.alternates[_label] = 0
+            self.rank[_label] = len(self.rank)
         self.alternates[_label] += _count
 
     def addlabels(self,_labels):
         self.labels = _labels
 
+    def tally(self,_label,_count):
+        #Adds to the count of a label, which becomes the preflabel when it is the most common
+        #Ties go to the label that was seen first, as with Counter.most_common
+        self.alternate(_label,_count)
+        self.total += _count
+
+        count = self.alternates[_label]
+        best = self.best
+        if best is None or count>self.alternates[best] or (count==self.alternates[best] and self.rank[_label]<self.rank[best]):
+            self.best = _label
+
+        #The preflabel may have been overridden from the preflabel database, the counts decide again
+        self.preflabel = self.best
+        self.prefcount = self.alternates[self.best]
+
+    def count(self,_labels):
+        #Counts new labels of the key
+        for label in _labels:
+            self.tally(label.label,1)
+
+    def merge(self,_group):
+        #Adds the counts of another group of the same key, that came after this one
+        for label,count in _group.alternates.items():
+            self.tally(label,count)
+
     def __init__(self,_key,_total,_preflabel,_prefcount):
         self.key = _key
         self.total = _total
@@ -316,51 +787,88 @@ class ConceptGroup:
         self.prefcount = _prefcount
         self.alternates = {}
         self.labels = {}
+        self.best = None #Most common label, before any preflabel override
+        self.rank = {} #Order in which the labels were first seen, to break ties
+
+#The group of all the labels of a key, sharing their list
+def groupLabels(key,labels):
+    group = ConceptGroup(key,0,None,0)
+    group.addlabels(labels)
+    group.count(labels)
+    return group
 
+#Groups every key of a concepts (or predicates) dict from scratch
 def groupConcepts(data,minlabels=1):
-    items = []
+    groups = {}
     for key in data.keys():
         labels = data[key]
         if len(labels)>=minlabels:
+            groups[key] = groupLabels(key,labels)
+    return selectGroups(groups,minlabels=minlabels)
+
+#The groups with at least minlabels labels, largest first
+def selectGroups(groups,minlabels=1):
+    return sorted([group for group in groups.values() if group.total>=minlabels], key=lambda x:x.total, reverse=True)
+
+#The groups of the keys collected while counting in a sketch, largest estimated count first
+#Every collected key already reached minlabels in the sketch, and its estimate is kept alongside the total of its labels
+def sketchGroups(groups,countsketch):
+    for group in groups.values():
+        group.estimate = countsketch.estimate(group.key)
+    return sorted(groups.values(), key=lambda x:x.estimate, reverse=True)
+
+## -------------------------------------------
+## Out of core grouping.  Labels are spilled to disk as records sorted by (key,seq)
+## seq is the order the label came in, so the labels of a key merge back in that order and ties break the same way
+
+def labelRecord(label,seq):
+    return (label.key,seq,label.idiom,label.label,label.length,label.start,label.end,label.docid,label.sentenceid,label.objectOf,label.subjectOf)
+
+def recordLabel(record):
+    label = Label.__new__(Label)
+    label.key,_,label.idiom,label.label,label.length,label.start,label.end,label.docid,label.sentenceid,label.objectOf,label.subjectOf = record
+    return label
+
+#Groups a stream of records sorted by key, holding the labels of only one key at a time
+#The groups come out in key order, not largest first
+def spilledGroups(records,minlabels=1):
+    for key,keyrecords in itertools.groupby(records,key=lambda record:record[0]):
+        labels = [recordLabel(record) for record in keyrecords]
+        if len(labels)>=minlabels:
+            yield groupLabels(key,labels)
 
-            group = None
-            preflabel = None
-
-            # Get the label frequency
-            aggregate = collections.Counter(map(lambda x:x.label,labels))
-            
-            for c in aggregate.most_common():
-                label = c[0]
-                count = c[1]
-                if not preflabel:
-                    preflabel = label
-                    prefcount = count
-                    group = ConceptGroup(key,len(labels),preflabel,prefcount)
 
-                if group:
-                    group.alternate(label,count)
+# --------------------------------------------------
 
-            if group:
-                group.addlabels(labels)
+#Ends the last sentence of a field before the next one starts, so no chunk can run across fields
+_FIELDBREAK_ = '.\n\n'
 
-            items.append(group)
-    return sorted(items, key=lambda x:x.total, reverse=True)
+## A (text,document) tuple that also carries the fields of the text
+## fields is the list of (offset,field) with the character offset where each field starts in the text
+class FieldTuple(tuple):
 
+    def __new__(cls,text,context,fields=None):
+        fieldtuple = super().__new__(cls,(text,context))
+        fieldtuple.fields = fields or []
+        return fieldtuple
 
-# --------------------------------------------------
+    def __reduce__(self):
+        return (FieldTuple,(self[0],self[1],self.fields))
 
-def textFromFields(doc,fields,strip_html=False,spacer='\n'):
+def textFromFields(doc,fields,strip_html=False,spacer='\n',offsets=False):
 
     text = ""
+    starts = []
 
     for field in fields:
 
-        #This is a separator used in the nlp.pipe process to split the fields back up 
-        #  after the spacy pipeline is executed on the larger text body.
-        #  This technique is used to improve performance and lower memory requirements
-        separator = '.\n\n_SKIPCHUNK_FIELDBREAK_' + field + '!\n\n'
+        #The fields are parsed as one text to improve performance and lower memory requirements.
+        #  The offset where each field starts is kept (when offsets=True) to split the fields
+        #  back up after the spacy pipeline is executed on the larger text body.
+        if len(starts):
+            text += _FIELDBREAK_
 
-        text += separator
+        starts.append((len(text),field))
 
         if isinstance(doc[field], str):
             if strip_html:
@@ -384,8 +892,341 @@ def textFromFields(doc,fields,strip_html=False,spacer='\n'):
             except:
                 pass
 
+    if offsets:
+        return text,starts
+
     return text
 
+#Carries the field offsets of each text alongside its context through nlp.pipe
+def fieldTuples(tuples):
+    for item in tuples:
+        text,context = item
+        yield text,(context,getattr(item,'fields',None))
+
+#Yields the sentences of the document, split wherever a field starts inside one
+#Whitespace in front of a field stays with it
+def fieldSentences(doc,offsets):
+    b = 0
+    for sentence in doc.sents:
+        start = sentence.start
+        while b<len(offsets) and offsets[b]<sentence.end_char:
+            t = start
+            space = True
+            while t<sentence.end and doc[t].idx<offsets[b]:
+                space = space and doc[t].is_space
+                t += 1
+            if t<sentence.end and not space:
+                yield doc[start:t]
+                start = t
+            b += 1
+        yield doc[start:sentence.end]
+
+# --------------------------------------------------
+# Very long documents are parsed in windows that end on a sentence boundary, so they can go
+#   beyond nlp.max_length, and the parser only ever holds one window's worth of text.
+# The last sentence of a window may be cut off, so it is dropped and parsed again at the start
+#   of the next window.  That way the windows follow the sentences the model itself finds.
+# The windows are stitched back into one document by the chunker, with running sentenceids.
+# Label starts and ends are relative to the sentence, so they hold across windows.
+
+## The parsed windows of one document, as (doc,fields,stop), where stop is the token where the next window takes over
+## The windows are parsed as they are iterated, so only one window's doc is alive at a time, and can only be iterated once.
+## To store the parses, keep() serializes each window as it goes by, and docs() reads them back afterwards
+class Windows:
+
+    def keep(self):
+        self.kept = parsestore.docBin()
+        self.keptwindows = []
+
+    def docs(self):
+        #The kept windows as (doc,fields,stop)
+        return [(doc,fields,stop) for doc,(fields,stop) in zip(self.kept.get_docs(self.vocab),self.keptwindows)]
+
+    def __iter__(self):
+        for doc,fields,stop in self.windows:
+            if self.kept is not None:
+                self.kept.add(doc)
+                self.keptwindows.append((fields,stop))
+            yield doc,fields,stop
+            del doc
+
+    def __init__(self,windows,vocab=None):
+        self.windows = windows
+        self.vocab = vocab
+        self.kept = None
+        self.keptwindows = None
+
+#Windowed docs must be kept before they are chunked, to be stored afterwards
+def keepParse(doc):
+    if isinstance(doc,Windows):
+        doc.keep()
+    return doc
+
+#The (offset,field) list of a window, with the offsets relative to the window
+#The field the window starts in comes first
+def windowFields(fields,start,end):
+    inside = [(0,field) for offset,field in fields if offset<=start][-1:]
+    inside += [(offset-start,field) for offset,field in fields if start<offset<end]
+    return inside
+
+#Parses the text one window at a time, yielding each window as (doc,fields,stop) before parsing the next
+def parseWindows(nlp,text,fields,size):
+    start = 0
+    while start<len(text):
+        end = len(text)
+        if end-start>size:
+            #Don't cut a word in two if there is any whitespace in the second half of the window
+            end = max(text.rfind(' ',start+size//2,start+size),text.rfind('\n',start+size//2,start+size))
+            if end<=start:
+                end = start+size
+
+        doc = nlp(text[start:end])
+        stop = len(doc)
+
+        if end<len(text):
+            last = None
+            for sentence in doc.sents:
+                if sentence.start>0:
+                    last = sentence
+            if last is not None:
+                stop = last.start
+                end = start+last.start_char
+            last = sentence = None
+
+        yield doc,windowFields(fields,start,end),stop
+        #The window was chunked, so it is freed before the next one is parsed
+        del doc
+        start = end
+
+#Long documents are parsed apart, and an empty text keeps their place in the pipe
+def windowTuples(tuples,size):
+    for text,(context,fields) in fieldTuples(tuples):
+        if len(text)<=size:
+            yield text,(context,fields,None)
+        else:
+            yield '',(context,fields,text)
+
+#Same as nlp.pipe(fieldTuples(tuples),as_tuples=True), except that documents longer than window_chars
+#  (or nlp.max_length) are parsed in windows, in the calling process, and come out as one Windows that parses them lazily
+def pipeTuples(nlp,tuples,window_chars=0,**kwargs):
+    size = min(window_chars or nlp.max_length,nlp.max_length)
+    for doc,(context,fields,text) in nlp.pipe(windowTuples(tuples,size),as_tuples=True,**kwargs):
+        if text is None:
+            yield doc,(context,fields)
+        else:
+            yield Windows(parseWindows(nlp,text,fields or [],size),nlp.vocab),(context,fields)
+
+#The docs of a parse, as (doc,fields,window) to keep in the parse store
+#A Windows must have been kept (see keepParse) and chunked first
+def windowDocs(doc,fields):
+    if isinstance(doc,Windows):
+        windows = doc.docs()
+        return [(window,fields,(i,len(windows),windowfields,stop)) for i,(window,windowfields,stop) in enumerate(windows)]
+    return [(doc,fields,None)]
+
+#Reads the parse store back as (doc,docid,fields), with the windows of a document stitched into a Windows
+def storedParses(store,vocab):
+    windows = None
+    for doc in store.docs(vocab):
+        docid,fields,window = parsestore.storedContext(doc)
+        if window is None:
+            yield doc,docid,fields
+            continue
+
+        index,count,windowfields,stop = window
+        if index==0:
+            windows = []
+        windows.append((doc,windowfields,stop))
+        if index==count-1:
+            yield Windows(windows),docid,fields
+
+# --------------------------------------------------
+# Character budget batching.  A batch of spacy_batch_size documents can put one 200KB post
+#   with dozens of short ones, so the tuples are sorted by length and cut into batches of
+#   about the same number of characters instead.
+
+#Returns the batches as lists of indexes into the tuples, shortest documents first
+#A document longer than the budget is a batch on its own
+def budgetBatches(tuples,budget):
+    batches = []
+    batch = []
+    chars = 0
+    for i in sorted(range(len(tuples)),key=lambda i:len(tuples[i][0])):
+        length = len(tuples[i][0])
+        if len(batch) and chars+length>budget:
+            batches.append(batch)
+            batch = []
+            chars = 0
+        batch.append(i)
+        chars += length
+    if len(batch):
+        batches.append(batch)
+    return batches
+
+#Yields from the iterator, adding the time spent in it to timing["seconds"]
+#The time the consumer takes between items is not counted
+def timedIterator(iterator,timing):
+    iterator = iter(iterator)
+    while True:
+        started = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            timing["seconds"] += time.perf_counter()-started
+        yield item
+
+#Parses the tuples one budget batch at a time, and yields (index,doc,(context,fields)) in parse order
+#The docs, chars and parse seconds of every batch are appended to timings, without the time spent chunking
+#  between docs.  Windowed docs are parsed as they are chunked, and their windows are timed too
+def parseBatches(nlp,tuples,batch_chars,timings,window_chars=0):
+    for batch in budgetBatches(tuples,batch_chars):
+        timing = {"docs":len(batch),"chars":sum(len(tuples[i][0]) for i in batch),"seconds":0.0}
+        for i,(doc,context) in zip(batch,timedIterator(pipeTuples(nlp,[tuples[i] for i in batch],window_chars,batch_size=len(batch)),timing)):
+            if isinstance(doc,Windows):
+                doc.windows = timedIterator(doc.windows,timing)
+            yield i,doc,context
+        timings.append(timing)
+
+#Parses and chunks the tuples in budget batches, and returns (doc,context,offsets,fields,docconcepts,docpredicates) in input order
+#The docs are only kept with keepdocs, otherwise just their chunks wait for the tuples before them
+def chunkBatches(nlp,tuples,chunker,idfield,batch_chars,timings,keepdocs=False,window_chars=0):
+    chunked = [None]*len(tuples)
+    for i,doc,(context,offsets) in parseBatches(nlp,tuples,batch_chars,timings,window_chars):
+        if keepdocs:
+            keepParse(doc)
+        fields,docconcepts,docpredicates = chunker.chunk(doc,context[idfield],fields=offsets)
+        chunked[i] = (doc if keepdocs else None,context,offsets,fields,docconcepts,docpredicates)
+    return chunked
+
+# --------------------------------------------------
+# Worker process side of the process pool enrichment.
+# Each worker loads its own spacy model once, then parses AND chunks whole shards,
+#   so the parent only has to merge the per-shard concepts and predicates.
+
+_worker_nlp = None
+
+def initWorker(spacy_model,spacy_tier="full",derivations_path=None):
+    global _worker_nlp
+    _worker_nlp = loadPipeline(spacy_model,spacy_tier)
+    if derivations_path:
+        derivations.table.load(derivations_path)
+
+_worker_memo = None
+
+def enrichShard(shard,chunker,idfield,batch_size,store=None,batch_chars=0,window_chars=0):
+    #When store is given, the parses of the shard are also written to that parse store shard file
+    #With batch_chars, the shard is parsed in character budget batches (see chunkBatches)
+    #Documents longer than window_chars are parsed in windows (see pipeTuples)
+    #The sentence memo of the worker lasts across shards, and its hits and misses for this shard are returned
+    global _worker_memo
+    memostats = (0,0)
+    if chunker.memo is not None:
+        if _worker_memo is None:
+            _worker_memo = chunker.memo
+        chunker.memo = _worker_memo
+        memostats = (_worker_memo.hits,_worker_memo.misses)
+
+    documents = []
+    concepts = {}
+    predicates = {}
+    conceptgroups = {}
+    predicategroups = {}
+    timings = []
+    docbin = parsestore.docBin() if store else None
+    ids = []
+
+    if batch_chars:
+        chunked = chunkBatches(_worker_nlp,shard,chunker,idfield,batch_chars,timings,keepdocs=docbin is not None,window_chars=window_chars)
+    else:
+        chunked = ((doc,context,offsets)+tuple(chunker.chunk(keepParse(doc) if docbin is not None else doc,context[idfield],fields=offsets)) for doc,(context,offsets) in pipeTuples(_worker_nlp,shard,window_chars,batch_size=batch_size))
+
+    for doc,context,offsets,fields,docconcepts,docpredicates in chunked:
+        mergeLabels(concepts,docconcepts,conceptgroups)
+        mergeLabels(predicates,docpredicates,predicategroups)
+        documents.append((context,fields,docconcepts,docpredicates))
+        if docbin is not None:
+            for part,partfields,window in windowDocs(doc,offsets):
+                parsestore.storeContext(part,context[idfield],partfields,window)
+                docbin.add(part)
+                ids.append(parsestore.parseId(context[idfield],window))
+
+    if docbin is not None:
+        parsestore.saveShard(store,docbin,ids)
+
+    if chunker.memo is not None:
+        memostats = (chunker.memo.hits-memostats[0],chunker.memo.misses-memostats[1])
+
+    stats = {"memo":memostats,"batches":timings}
+
+    #The documents, the concepts and predicates, and their groups share the same Label objects and lists,
+    #  and are pickled together only once
+    return documents,(concepts,conceptgroups),(predicates,predicategroups),stats
+
+## -------------------------------------------
+## Saved artifacts.  Concepts and predicates are saved as (key,labels) records, and a key can have a record per batch
+
+_ARTIFACTS_ = ["enriched","concepts","predicates","conceptgroups","predicategroups"]
+
+def recordLabels(records):
+    data = {}
+    for key,labels in records:
+        if key in data:
+            data[key].extend(labels)
+        else:
+            data[key] = labels
+    return data
+
+#The labels of each key that were added since saved counted them
+def unsavedLabels(data,saved):
+    for key,labels in data.items():
+        count = saved.get(key,0)
+        if len(labels)>count:
+            yield key,labels[count:]
+
+#The same as unsavedLabels, and counts the labels it yields into saved
+def checkpointLabels(data,saved):
+    for key,labels in unsavedLabels(data,saved):
+        saved[key] = saved.get(key,0) + len(labels)
+        yield key,labels
+
+def shardTuples(tuples,size):
+    shard = []
+    for item in tuples:
+        shard.append(item)
+        if len(shard)>=size:
+            yield shard
+            shard = []
+    if len(shard):
+        yield shard
+
+# --------------------------------------------------
+# Chunking sweeps compare configurations on the same parses
+
+_SWEEP_PARAMS_ = ['maxslop','minconceptlength','maxconceptlength','minpredicatelength','maxpredicatelength','minlabels']
+
+def sweepSummary(result):
+    summary = {}
+    for kind in ['concept','predicate']:
+        labels = result[kind + 's']
+        groups = result[kind + 'groups']
+        summary[kind + '_keys'] = len(labels)
+        summary[kind + '_labels'] = sum(len(labels[key]) for key in labels)
+        summary[kind + '_groups'] = len(groups)
+        summary[kind + '_group_size'] = sum(group.total for group in groups)/len(groups) if len(groups) else 0.0
+    return summary
+
+def printSweep(results):
+    print("%-24s %8s %8s %8s %8s | %8s %8s %8s %8s" % ("slop,concept,pred,min","keys","labels","groups","size","keys","labels","groups","size"))
+    for result in results:
+        config = result["config"]
+        summary = result["summary"]
+        name = "%d,%d-%d,%d-%d,%d" % tuple(config[name] for name in _SWEEP_PARAMS_)
+        print("%-24s %8d %8d %8d %8.2f | %8d %8d %8d %8.2f" % (name,
+            summary["concept_keys"],summary["concept_labels"],summary["concept_groups"],summary["concept_group_size"],
+            summary["predicate_keys"],summary["predicate_labels"],summary["predicate_groups"],summary["predicate_group_size"]))
+
 ##==========================================================
 # MAIN API ENTRY POINT!  USE THIS!
 
@@ -408,8 +1249,8 @@ class Skipchunk():
             raise ValueError('Specify at least one field to convert')
 
         for post in data:
-            text = textFromFields(post,fields,strip_html=strip_html)
-            tuples.append((text,post))
+            text,offsets = textFromFields(post,fields,strip_html=strip_html,offsets=True)
+            tuples.append(FieldTuple(text,post,offsets))
 
         return tuples
 
@@ -426,8 +1267,8 @@ class Skipchunk():
             raise ValueError('Specify at least one field to convert')
 
         for post in documents:
-            text = textFromFields(post,fields,strip_html=strip_html)
-            yield (text,post)
+            text,offsets = textFromFields(post,fields,strip_html=strip_html,offsets=True)
+            yield FieldTuple(text,post,offsets)
 
     # --------------------------------------------------
 
@@ -435,120 +1276,673 @@ class Skipchunk():
         if not self.cache_documents:
             return False
 
-        filename = self.document_data + '/' + str(doc[self.idfield]) + '.json'
-        with open(filename,"w") as file:
-            file.write(json.dumps(doc))
+        self.documentstore.add(doc[self.idfield],doc)
+
+    # --------------------------------------------------
+
+    def chunker(self):
+        #Chunker with the current chunking parameters
+        return Chunker(
+            maxslop=self.maxslop,
+            minconceptlength=self.minconceptlength,
+            maxconceptlength=self.maxconceptlength,
+            minpredicatelength=self.minpredicatelength,
+            maxpredicatelength=self.maxpredicatelength,
+            vectorized=self.vectorized,
+            memo=self.sentencememo
+            )
 
     # --------------------------------------------------
 
-    def enrich(self,tuples):
+    def attachLabels(self,context,fields,docconcepts,docpredicates):
+        #Returns the context enriched with the document's own concepts and predicates
+
+        rich = context
+
+        for field in fields:
+            rich[field + '_payloads'] = []
+
+        self.saveDocument(rich)
+
+        rich["skipchunk_concepts"] = docconcepts
+        rich["skipchunk_predicates"] = docpredicates
+
+        return rich
+
+    # --------------------------------------------------
+
+    def enrichDocument(self,doc,context,chunker=None,fields=None):
+        #Chunks one parsed spacy document, adding its labels to the running concepts and predicates
+        if chunker is None:
+            chunker = self.chunker()
+
+        if self.parsestore:
+            keepParse(doc)
+
+        offsets = fields
+        fields,docconcepts,docpredicates = chunker.chunk(doc,context[self.idfield],fields=fields)
+
+        if self.parsestore:
+            self.storeParse(doc,context[self.idfield],offsets)
+
+        docconcepts,docpredicates = self.mergeDocument(docconcepts,docpredicates)
+
+        return self.attachLabels(context,fields,docconcepts,docpredicates)
+
+    # --------------------------------------------------
+
+    def mergeDocument(self,docconcepts,docpredicates):
+        #Adds the labels of a document to the concepts and predicates, and to their running groups
+        #Returns the document's labels to attach, as DocumentLabels when compact_documents is set
+        #Spilled and sketched labels are not all kept in the concepts, so those documents keep their own Labels
+        #Without keeplabels (see enrichStream), only the running groups are updated, and the documents keep their own Labels too
+        if self.conceptspill:
+            self.spillLabels(docconcepts,docpredicates)
+            return docconcepts,docpredicates
+        if self.conceptsketch:
+            self.sketchLabels(self.concepts,docconcepts,self.conceptaggregates,self.conceptsketch)
+            self.sketchLabels(self.predicates,docpredicates,self.predicateaggregates,self.predicatesketch)
+            return docconcepts,docpredicates
+        if not self.keeplabels:
+            mergeLabels(None,docconcepts,self.conceptaggregates)
+            mergeLabels(None,docpredicates,self.predicateaggregates)
+            return docconcepts,docpredicates
+
+        attached = (docconcepts,docpredicates)
+        if self.compact_documents:
+            attached = (compactLabels(self.concepts,docconcepts,labelLengths(self.concepts,docconcepts)),compactLabels(self.predicates,docpredicates,labelLengths(self.predicates,docpredicates)))
+
+        mergeLabels(self.concepts,docconcepts,self.conceptaggregates)
+        mergeLabels(self.predicates,docpredicates,self.predicateaggregates)
+
+        return attached
+
+    def spillLabels(self,concepts,predicates):
+        #Adds the labels to the spilled runs instead of the concepts and predicates, which stay empty
+        for runs,labels in ((self.conceptspill,concepts),(self.predicatespill,predicates)):
+            for key in labels.keys():
+                for label in labels[key]:
+                    runs.add(labelRecord(label,self.spillseq))
+                    self.spillseq += 1
+
+    def sketchLabels(self,data,labels,aggregates,countsketch):
+        #Counts every key in the sketch, but only collects the labels of keys seen at least minlabels times
+        #The labels that came before a key reached minlabels are not collected, the exact pass gets them back
+        for key in labels.keys():
+            estimate = countsketch.add(key,len(labels[key]))
+            if key in data or estimate>=self.minlabels:
+                mergeLabels(data,{key:labels[key]},aggregates)
+
+    def newSketches(self):
+        self.conceptsketch = sketch.CountMinSketch(self.sketch_epsilon,self.sketch_delta)
+        self.predicatesketch = sketch.CountMinSketch(self.sketch_epsilon,self.sketch_delta)
+
+    def exactPass(self,docs):
+        #Chunks the (doc,docid,fields) again, keeping all the labels of the keys collected while sketching
+        #Their groups get exact totals, and the keys that the sketch overestimated fall below minlabels
+        conceptkeys = set(self.concepts.keys())
+        predicatekeys = set(self.predicates.keys())
+
+        self.concepts = dict()
+        self.predicates = dict()
+        self.aggregate()
+
+        chunker = self.chunker()
+        for doc,docid,fields in docs:
+            fields,docconcepts,docpredicates = chunker.chunk(doc,docid,fields=fields)
+            mergeLabels(self.concepts,{key:docconcepts[key] for key in docconcepts.keys() if key in conceptkeys},self.conceptaggregates)
+            mergeLabels(self.predicates,{key:docpredicates[key] for key in docpredicates.keys() if key in predicatekeys},self.predicateaggregates)
+
+        dropped = sum(1 for group in self.conceptaggregates.values() if group.total<self.minlabels)
+        dropped += sum(1 for group in self.predicateaggregates.values() if group.total<self.minlabels)
+        print('Exact pass:',len(conceptkeys)+len(predicatekeys),'keys counted again,',dropped,'below minlabels')
+
+    def clearSpill(self):
+        self.conceptspill.clear()
+        self.predicatespill.clear()
+        self.spillseq = 0
+
+    def aggregate(self):
+        #Counts the running groups again from all the concepts and predicates, such as after they are loaded
+        self.conceptaggregates = {key:groupLabels(key,labels) for key,labels in self.concepts.items()}
+        self.predicateaggregates = {key:groupLabels(key,labels) for key,labels in self.predicates.items()}
+
+    # --------------------------------------------------
+
+    def group(self):
+        #Groups the concepts and predicates collected so far, and resolves their preflabels
 
-        idfield = self.idfield
-        maxslop = self.maxslop
-        minconceptlength = self.minconceptlength
-        maxconceptlength = self.maxconceptlength
-        minpredicatelength = self.minpredicatelength
-        maxpredicatelength = self.maxpredicatelength
         minlabels = self.minlabels
-        concepts = self.concepts
-        predicates = self.predicates
-        
+
+        db = self.preflabelDatabase()
+
+        if self.conceptsketch and not self.exact_pass:
+            #The totals miss the labels that came before each key reached minlabels, so the groups are ranked by their estimates
+            conceptgroups = list(self.resolveGroups(db,sketchGroups(self.conceptaggregates,self.conceptsketch)))
+            predicategroups = list(self.resolveGroups(db,sketchGroups(self.predicateaggregates,self.predicatesketch)))
+        elif self.conceptspill:
+            #The spilled labels are merged back one key at a time, and the groups are written to disk as they are resolved
+            conceptgroups = spill.SpilledGroups(os.path.join(self.spill_data,'conceptgroups.pickle'))
+            conceptgroups.write(self.resolveGroups(db,spilledGroups(self.conceptspill.merge(),minlabels=minlabels)))
+            predicategroups = spill.SpilledGroups(os.path.join(self.spill_data,'predicategroups.pickle'))
+            predicategroups.write(self.resolveGroups(db,spilledGroups(self.predicatespill.merge(),minlabels=minlabels)))
+        else:
+            #The groups are kept up to date as the labels come in, so they only need to be selected
+            conceptgroups = list(self.resolveGroups(db,selectGroups(self.conceptaggregates,minlabels=minlabels)))
+            predicategroups = list(self.resolveGroups(db,selectGroups(self.predicateaggregates,minlabels=minlabels)))
+
+        #Keep the WordNet forms looked up in this batch for next time
+        if self.derivations_path and derivations.table.dirty():
+            derivations.table.save(self.derivations_path)
+
+        self.conceptgroups = conceptgroups
+        self.predicategroups = predicategroups
+
+        return conceptgroups,predicategroups
+
+    def preflabelDatabase(self):
+        #The preflabel database stays open between batches, so its cache of preflabels is warmed only once
+        if self.db is None:
+            self.db = database.Database(self.database,cache_size=self.preflabel_cache_size)
+        return self.db
+
+    def resolveGroups(self,db,groups,batch_size=10000):
+        #If the concept is new, add it to the preflabel database
+        #If the concept existed before this batch, get the existing preflabel
+        #The groups are upserted and committed batch_size at a time, so the write lock is only held while a batch
+        #  is upserted, and not while the groups are read or written (such as from and to the spill files)
+        groups = iter(groups)
+        while True:
+            batch = list(itertools.islice(groups,batch_size))
+            if not len(batch):
+                break
+            for group,preflabel in zip(batch,db.upsert_concepts(batch)):
+                if preflabel != group.preflabel:
+                    group.preflabel = preflabel
+                    #print('Label override!',preflabel)
+            yield from batch
+
+    # --------------------------------------------------
+
+    def saveCheckpoint(self,processed,lastid):
+        #Saves how far the enrichment got, and appends the labels collected since the last checkpoint, see segments.py
+        #The database is only written to when grouping, so these are also its pending writes
+        store = segments.SegmentStore(self.checkpoint_data)
+        state = {
+            "version": 2,
+            "processed": processed,
+            "lastid": lastid,
+            "sketches": (self.conceptsketch,self.predicatesketch),
+            #Without the labels, the running groups are all there is to resume from
+            "aggregates": None if self.keeplabels else (self.conceptaggregates,self.predicateaggregates)
+        }
+
+        store.write("concepts",checkpointLabels(self.concepts,self.checkpointconcepts),append=True,commit=False)
+        store.write("predicates",checkpointLabels(self.predicates,self.checkpointpredicates),append=True,commit=False)
+        store.write("state",[state],commit=False)
+
+        #The new segments are added to the manifest together, so a crash never leaves the labels of a checkpoint without its state
+        store.commit()
+
+        #The parses of the documents before the checkpoint are written out too, so rechunking after resuming still sees them
+        if self.parsestore:
+            self.parsestore.flush()
+
+    def loadCheckpoint(self):
+        store = segments.SegmentStore(self.checkpoint_data)
+        if "state" not in store.names():
+            return None
+
+        checkpoint = next(store.records("state"))
+        checkpoint["concepts"] = recordLabels(store.records("concepts"))
+        checkpoint["predicates"] = recordLabels(store.records("predicates"))
+        return checkpoint
+
+    def clearCheckpoint(self):
+        segments.SegmentStore(self.checkpoint_data).clear()
+        self.checkpointconcepts = dict()
+        self.checkpointpredicates = dict()
+
+    def resumeTuples(self,tuples,checkpoint):
+        #Skips the tuples that were already processed when the checkpoint was saved
+        #The tuples must come in the same order as in the run that saved it
+        tuples = iter(tuples)
+
+        item = None
+        for i in range(checkpoint["processed"]):
+            item = next(tuples,None)
+            if item is None:
+                raise ValueError('Cannot resume, there are fewer tuples than were processed before the checkpoint')
+
+        if item is not None and item[1][self.idfield] != checkpoint["lastid"]:
+            raise ValueError('Cannot resume, the tuples are not in the same order as before the checkpoint')
+
+        return tuples
+
+    # --------------------------------------------------
+
+    def enrichStream(self,tuples,sinks=None,resume=False,keep_labels=False):
+        #Streaming version of enrich.  Each enriched document is handed to every sink (any callable)
+        #  and yielded as soon as it is chunked, and is not kept afterwards.
+        #Only the running groups of the concepts and predicates stay in memory, their Labels go out with
+        #  the documents.  With keep_labels=True, the concepts and predicates keep every Label as with enrich,
+        #  so the groups have their labels (needed to index the graph), and memory grows with the number of labels.
+        #The groups are calculated when the tuples run out, so the generator must be exhausted.
+        #With resume=True, a run that stopped continues from its last checkpoint (see checkpoint_every)
+
         batch_size = self.spacy_batch_size
         n_process = self.spacy_processes
 
-        enriched = []
+        if sinks is None:
+            sinks = []
 
-        for doc,context in self.nlp.pipe(tuples, batch_size=batch_size, n_process=n_process, as_tuples=True):
+        #The exact pass reads the parse store when it has every document, and parses the tuples again otherwise
+        alltuples = tuples
+        exactstore = self.parsestore is not None and self.parsecache is None
+        if self.conceptsketch and self.exact_pass and not exactstore and iter(tuples) is tuples:
+            raise ValueError('The exact pass parses the tuples again, so they must be a list, or call Skipchunk with parse_store=True')
 
-            rich = context
-            docid = context[idfield]
+        self.enriched = None
+        self.enrichedsaved = False
+        self.batchtimings = []
+        self.keeplabels = keep_labels
 
-            sentenceid = 0
+        processed = 0
 
-            docconcepts = {}
-            docpredicates = {}
+        checkpoint = None
+        if resume:
+            checkpoint = self.loadCheckpoint()
+        else:
+            self.clearCheckpoint()
+
+        #The parse store holds the parses of this instance's enrich batches.  The first batch clears the ones left
+        #  by an earlier run, unless it resumes that run.  A document parsed again only keeps its latest parse
+        if self.parsestore and not self.parsestorekept and not checkpoint:
+            self.parsestore.clear()
+        self.parsestorekept = True
+
+        if checkpoint:
+            tuples = self.resumeTuples(tuples,checkpoint)
+            processed = checkpoint["processed"]
+            if (checkpoint.get("aggregates") is None)!=keep_labels:
+                raise ValueError('Cannot resume, the checkpoint was saved with keep_labels=%s' % (checkpoint.get("aggregates") is None))
+            self.concepts = checkpoint["concepts"]
+            self.predicates = checkpoint["predicates"]
+            self.checkpointconcepts = {key:len(labels) for key,labels in self.concepts.items()}
+            self.checkpointpredicates = {key:len(labels) for key,labels in self.predicates.items()}
+            if checkpoint.get("sketches") and self.conceptsketch:
+                self.conceptsketch,self.predicatesketch = checkpoint["sketches"]
+            self.aggregate()
+            if checkpoint.get("aggregates") is not None:
+                self.conceptaggregates,self.predicateaggregates = checkpoint["aggregates"]
+
+        if self.parsecache:
+            stream = self.enrichCached(tuples)
+
+        elif self.pool_processes>1:
+            stream = self.enrichPool(tuples)
+
+        elif self.spacy_batch_chars:
+            stream = self.enrichBatches(tuples)
 
-            field = ''
-            payloadfield = ''
+        else:
+            chunker = self.chunker()
+            stream = (self.enrichDocument(doc,context,chunker=chunker,fields=fields) for doc,(context,fields) in pipeTuples(self.nlp,tuples,self.spacy_window_chars,batch_size=batch_size,n_process=n_process))
 
-            separator = r'_SKIPCHUNK_FIELDBREAK_[a-z]+\!'
+        for rich in stream:
 
-            for sentence in doc.sents:
+            for sink in sinks:
+                sink(rich)
 
-                sentencetext = sentence.text.strip()
+            processed += 1
+            if self.checkpoint_every and processed % self.checkpoint_every == 0:
+                self.saveCheckpoint(processed,rich[self.idfield])
 
-                seps = re.findall(separator,sentencetext)
+            yield rich
 
-                if len(seps)>0:
-                    sep = seps[0]
-                    field = sep[len('_SKIPCHUNK_FIELDBREAK_'):]
-                    field = field[:len(field)-1]
-                    payloadfield = field + '_payloads'
-                    rich[payloadfield] = []
-                    sentencetext = sentencetext.replace(sep,'')
+        if self.parsestore:
+            self.parsestore.flush()
 
-                if len(sentencetext)>1:
+        if self.documentstore:
+            self.documentstore.flush()
 
-                    #SKIPCHUNK PIPELINE STAGE
-                    cons,preds = skipchunk(sentence,docid=docid,sentenceid=sentenceid,maxslop=maxslop,maxlength=maxconceptlength)
+        if self.conceptsketch and self.exact_pass:
+            if exactstore:
+                self.exactPass(self.storedParses())
+            else:
+                self.exactPass((doc,context[self.idfield],fields) for doc,(context,fields) in pipeTuples(self.nlp,alltuples,self.spacy_window_chars,batch_size=batch_size,n_process=n_process))
 
-                    for concept in cons:
-                        if concept.length>=minconceptlength:
-                            if concept.key not in concepts:
-                                concepts[concept.key] = []
-                            concepts[concept.key].append(concept)
+        self.group()
 
-                            if concept.key not in docconcepts:
-                                docconcepts[concept.key] = []
-                            docconcepts[concept.key].append(concept)
+        self.clearCheckpoint()
 
-                    for predicate in preds:
-                        if predicate.length>=minpredicatelength:
-                            if predicate.key not in predicates:
-                                predicates[predicate.key] = []
-                            predicates[predicate.key].append(predicate)
-                            if predicate.key not in docpredicates:
-                                docpredicates[predicate.key] = []
-                            docpredicates[predicate.key].append(predicate)
+        if self.conceptsketch:
+            stats = self.conceptsketch.stats()
+            print('Sketch: counts are over by at most %.1f with probability %.2f,' % (stats["error"],1-stats["delta"]),len(self.concepts),'concept keys and',len(self.predicates),'predicate keys kept')
 
-                    sentenceid += 1
-            
-            self.saveDocument(rich)
+        if self.parsecache:
+            stats = self.parsecache.stats()
+            print('Parse cache:',stats["hits"],'hits,',stats["misses"],'misses')
 
-            rich["skipchunk_concepts"] = docconcepts
-            rich["skipchunk_predicates"] = docpredicates
+        if len(self.batchtimings):
+            seconds = [timing["seconds"] for timing in self.batchtimings]
+            chars = sum(timing["chars"] for timing in self.batchtimings)
+            print('Batches:',len(seconds),'mean %.3fs,' % (sum(seconds)/len(seconds)),'max %.3fs,' % max(seconds),'%.0f chars/sec' % (chars/sum(seconds) if sum(seconds) else 0))
 
-            enriched.append(rich)
+        if self.sentencememo is not None:
+            stats = self.sentencememo.stats()
+            print('Sentence memo:',stats["hits"],'hits,',stats["misses"],'misses,','%.1f%%' % (stats["hit_rate"]*100),'hit rate')
 
-        conceptgroups = groupConcepts(concepts,minlabels=minlabels)
-        predicategroups = groupConcepts(predicates,minlabels=minlabels)
+        if self.db is not None and self.db.cache is not None:
+            stats = self.db.stats()
+            print('Preflabel cache:',stats["hits"],'hits,',stats["negatives"],'new keys,',stats["misses"],'lookups')
 
-        #If the concept is new, add it to the preflabel database
-        #If the concept existed before this batch, get the existing preflabel
-        db = database.Database(self.database)
-        for idx in range(len(conceptgroups)):
-            preflabel = db.upsert_concept(conceptgroups[idx])
-            if preflabel != conceptgroups[idx].preflabel:
-                conceptgroups[idx].preflabel = preflabel
-                #print('Concept label override!',preflabel)
-        for idx in range(len(predicategroups)):
-            preflabel = db.upsert_concept(predicategroups[idx])
-            if preflabel != predicategroups[idx].preflabel:
-                predicategroups[idx].preflabel = preflabel
-                #print('Predicate label override!',preflabel)
-        db.close()
+    # --------------------------------------------------
+
+    def enrichBatches(self,tuples):
+        #Parses and chunks windows of pool_shard_size tuples in character budget batches of spacy_batch_chars
+        #Each window is yielded in input order once all its batches are done
+
+        chunker = self.chunker()
+        keepdocs = self.parsestore is not None
+
+        for window in shardTuples(tuples,self.pool_shard_size):
+            for doc,context,offsets,fields,docconcepts,docpredicates in chunkBatches(self.nlp,window,chunker,self.idfield,self.spacy_batch_chars,self.batchtimings,keepdocs=keepdocs,window_chars=self.spacy_window_chars):
+                if doc is not None:
+                    self.storeParse(doc,context[self.idfield],offsets)
+
+                docconcepts,docpredicates = self.mergeDocument(docconcepts,docpredicates)
+
+                yield self.attachLabels(context,fields,docconcepts,docpredicates)
+
+    # --------------------------------------------------
+
+    def enrichPool(self,tuples):
+        #Parses and chunks shards of pool_shard_size tuples in pool_processes worker processes
+        #The parent merges the per-shard results in input order.
+        #Only a few shards are in flight at once, so the tuples are still read lazily.
+
+        chunker = self.chunker()
+        processes = self.pool_processes
+        inflight = collections.deque()
+
+        with multiprocessing.Pool(processes, initializer=initWorker, initargs=(self.spacy_model,self.spacy_tier,self.derivations_path)) as pool:
+
+            for shard in shardTuples(tuples,self.pool_shard_size):
+                inflight.append(pool.apply_async(enrichShard,(shard,chunker,self.idfield,self.spacy_batch_size,self.storeShard(),self.spacy_batch_chars,self.spacy_window_chars)))
+
+                while len(inflight)>=processes*2:
+                    yield from self.mergeShard(inflight.popleft().get())
+
+            while len(inflight):
+                yield from self.mergeShard(inflight.popleft().get())
+
+    def mergeShard(self,result):
+        documents,(concepts,conceptgroups),(predicates,predicategroups),stats = result
+
+        self.countShard(stats)
+
+        #A checkpoint can be saved after any document, and must only hold the labels of the documents before it,
+        #  so with checkpoints each document is merged on its own, right before it is yielded
+        if self.checkpoint_every:
+            for context,fields,docconcepts,docpredicates in documents:
+                docconcepts,docpredicates = self.mergeDocument(docconcepts,docpredicates)
+                yield self.attachLabels(context,fields,docconcepts,docpredicates)
+            return
+
+        #The worker already counted the labels of the shard, so only its groups are merged
+        #Spilled and sketched labels are not grouped as they come in, so the shard is added like one big document
+        if self.conceptspill or self.conceptsketch:
+            self.mergeDocument(concepts,predicates)
+        elif not self.keeplabels:
+            mergeLabels(None,concepts,self.conceptaggregates,counts=conceptgroups)
+            mergeLabels(None,predicates,self.predicateaggregates,counts=predicategroups)
+        else:
+            if self.compact_documents:
+                #The worker merged the documents in order, so the labels of each one follow those of the documents before it
+                conceptlengths = labelLengths(self.concepts,concepts)
+                predicatelengths = labelLengths(self.predicates,predicates)
+                documents = [(context,fields,compactLabels(self.concepts,docconcepts,conceptlengths),compactLabels(self.predicates,docpredicates,predicatelengths)) for context,fields,docconcepts,docpredicates in documents]
+            mergeLabels(self.concepts,concepts,self.conceptaggregates,counts=conceptgroups)
+            mergeLabels(self.predicates,predicates,self.predicateaggregates,counts=predicategroups)
+
+        for context,fields,docconcepts,docpredicates in documents:
+            yield self.attachLabels(context,fields,docconcepts,docpredicates)
+
+    # --------------------------------------------------
+
+    def parseConfig(self):
+        #Everything besides the text that changes the chunker output of a document
+        meta = self.nlp.meta
+        return '|'.join(str(v) for v in [
+            spacy.__version__,
+            self.spacy_model,
+            meta.get('name'),
+            meta.get('version'),
+            self.spacy_tier,
+            self.spacy_window_chars,
+            self.nlp.max_length,
+            derivations.table.identity(),
+            self.maxslop,
+            self.minconceptlength,
+            self.maxconceptlength,
+            self.minpredicatelength,
+            self.maxpredicatelength
+            ])
+
+    def enrichCached(self,tuples):
+        #Looks up shards of pool_shard_size tuples in the parse cache, and only parses the documents that missed
+        #The documents are still merged and yielded in input order
+
+        self.parsecache.config = self.parseConfig()
+
+        pool = None
+        if self.pool_processes>1:
+            pool = multiprocessing.Pool(self.pool_processes, initializer=initWorker, initargs=(self.spacy_model,self.spacy_tier,self.derivations_path))
+
+        try:
+            for shard in shardTuples(tuples,self.pool_shard_size):
+                keys = [self.parsecache.key(item[0],item[1][self.idfield],getattr(item,'fields',None)) for item in shard]
+                found = self.parsecache.get(keys)
+
+                misses = [item for key,item in zip(keys,shard) if key not in found]
+                chunked = iter(self.chunkMisses(misses,pool))
+
+                #The hits were never parsed, so the parse store can't cover them
+                if self.parsestore:
+                    self.parsestore.miss(len(shard)-len(misses))
+
+                for key,(text,context) in zip(keys,shard):
+                    if key in found:
+                        fields,docconcepts,docpredicates = found[key]
+                    else:
+                        fields,docconcepts,docpredicates = next(chunked)
+                        self.parsecache.put(key,context[self.idfield],(fields,docconcepts,docpredicates))
+
+                    docconcepts,docpredicates = self.mergeDocument(docconcepts,docpredicates)
+
+                    yield self.attachLabels(context,fields,docconcepts,docpredicates)
+
+                self.parsecache.commit()
+
+        finally:
+            if pool:
+                pool.terminate()
+
+    def chunkMisses(self,misses,pool=None):
+        #Parses and chunks the tuples that are not in the parse cache, returns (fields,docconcepts,docpredicates) in order
+
+        if not len(misses):
+            return []
+
+        batch_size = self.spacy_batch_size
+
+        if pool:
+            #Split the misses over the workers, so they are parsed in parallel
+            size = -(-len(misses)//self.pool_processes)
+            results = [pool.apply_async(enrichShard,(shard,self.chunker(),self.idfield,batch_size,self.storeShard(),self.spacy_batch_chars,self.spacy_window_chars)) for shard in shardTuples(misses,size)]
+            chunked = []
+            for result in results:
+                documents,concepts,predicates,stats = result.get()
+                self.countShard(stats)
+                chunked.extend((fields,docconcepts,docpredicates) for context,fields,docconcepts,docpredicates in documents)
+            return chunked
+
+        chunked = []
+        chunker = self.chunker()
+
+        if self.spacy_batch_chars:
+            for doc,context,offsets,fields,docconcepts,docpredicates in chunkBatches(self.nlp,misses,chunker,self.idfield,self.spacy_batch_chars,self.batchtimings,keepdocs=self.parsestore is not None,window_chars=self.spacy_window_chars):
+                if doc is not None:
+                    self.storeParse(doc,context[self.idfield],offsets)
+                chunked.append((fields,docconcepts,docpredicates))
+            return chunked
+
+        #Starting spacy processes is not worth it for a handful of documents
+        n_process = self.spacy_processes if len(misses)>=batch_size*self.spacy_processes else 1
+
+        for doc,(context,fields) in pipeTuples(self.nlp,misses,self.spacy_window_chars,batch_size=batch_size,n_process=n_process):
+            if self.parsestore:
+                keepParse(doc)
+            chunked.append(chunker.chunk(doc,context[self.idfield],fields=fields))
+            if self.parsestore:
+                self.storeParse(doc,context[self.idfield],fields)
+
+        return chunked
+
+    # --------------------------------------------------
+
+    def countShard(self,stats):
+        #Adds the sentence memo hits and misses, and the batch timings, of a pool worker to ours
+        if self.sentencememo is not None:
+            self.sentencememo.hits += stats["memo"][0]
+            self.sentencememo.misses += stats["memo"][1]
+        self.batchtimings.extend(stats["batches"])
+
+    def storeParse(self,doc,docid,fields):
+        #Keeps the parse in the parse store, one window at a time for a windowed document
+        for part,partfields,window in windowDocs(doc,fields):
+            self.parsestore.add(part,docid,partfields,window)
+
+    def storeShard(self):
+        #The parse store shard file a pool worker writes its parses to, if the parses are stored
+        if self.parsestore:
+            self.parsestore.flush()
+            return self.parsestore.nextShard()
+        return None
+
+    def storedParses(self):
+        #The stored parses as (doc,docid,fields), when they cover every enriched document
+        if self.parsestore.missing:
+            raise ValueError('The parse store is missing the %d documents that came from the parse cache, enrich again with parse_cache=False to store them' % self.parsestore.missing)
+        return storedParses(self.parsestore,self.nlp.vocab)
+
+    def rechunk(self,maxslop=None,minconceptlength=None,maxconceptlength=None,minpredicatelength=None,maxpredicatelength=None):
+        #Chunks the stored parses again with new chunking parameters, without running the spacy model
+        #The parameters that are not given keep their current value
+
+        if not self.parsestore:
+            raise ValueError('Rechunking needs the parses, call Skipchunk with parse_store=True before enriching')
+        docs = self.storedParses()
+
+        params = {
+            "maxslop": maxslop,
+            "minconceptlength": minconceptlength,
+            "maxconceptlength": maxconceptlength,
+            "minpredicatelength": minpredicatelength,
+            "maxpredicatelength": maxpredicatelength
+        }
+        for name,value in params.items():
+            if value is not None:
+                setattr(self,name,value)
+
+        self.enriched = None
+        self.keeplabels = True
+        self.concepts = dict()
+        self.predicates = dict()
+        self.aggregate()
+        if self.conceptspill:
+            self.clearSpill()
+        if self.conceptsketch:
+            self.newSketches()
+
+        chunker = self.chunker()
+        for doc,docid,fields in docs:
+            fields,docconcepts,docpredicates = chunker.chunk(doc,docid,fields=fields)
+            self.mergeDocument(docconcepts,docpredicates)
+
+        if self.conceptsketch and self.exact_pass:
+            self.exactPass(self.storedParses())
+
+        self.group()
+
+        return self.concepts,self.predicates,self.conceptgroups,self.predicategroups
+
+    def sweep(self,configs,tuples=None):
+        #Chunks every document with several configurations, in the same pass over its parsed sentences
+        #Each config is a dict with any of _SWEEP_PARAMS_, the ones that are missing keep their current value
+        #The tuples are parsed once, or the parse store is read when there are no tuples
+        #Nothing is written to the preflabel database, so the configurations can be compared freely
+
+        results = []
+        chunkers = {}
+        for config in configs:
+            unknown = [name for name in config.keys() if name not in _SWEEP_PARAMS_]
+            if len(unknown):
+                raise ValueError('Cannot sweep ' + ', '.join(unknown) + ', use any of ' + ', '.join(_SWEEP_PARAMS_))
+
+            params = {name:config.get(name,getattr(self,name)) for name in _SWEEP_PARAMS_}
+
+            #minlabels only changes the grouping, so configurations that differ only by it share a chunker
+            chunking = tuple(params[name] for name in _SWEEP_PARAMS_ if name!='minlabels')
+            if chunking not in chunkers:
+                chunkers[chunking] = {"chunker":Chunker(*chunking,vectorized=self.vectorized,memo=self.sentencememo),"concepts":{},"predicates":{}}
+
+            results.append({"config":params,"chunking":chunking})
+
+        if tuples is None:
+            if not self.parsestore:
+                raise ValueError('Give the tuples to sweep, or call Skipchunk with parse_store=True before enriching')
+            docs = self.storedParses()
+        else:
+            docs = ((doc,context[self.idfield],fields) for doc,(context,fields) in pipeTuples(self.nlp,tuples,self.spacy_window_chars,batch_size=self.spacy_batch_size,n_process=self.spacy_processes))
+
+        sweeps = list(chunkers.values())
+        for doc,docid,fields in docs:
+            fieldnames,chunked = chunkDocument(doc,docid,[sweep["chunker"] for sweep in sweeps],fields=fields)
+            for sweep,(docconcepts,docpredicates) in zip(sweeps,chunked):
+                mergeLabels(sweep["concepts"],docconcepts)
+                mergeLabels(sweep["predicates"],docpredicates)
+
+        for result in results:
+            sweep = chunkers[result.pop("chunking")]
+            minlabels = result["config"]["minlabels"]
+            result["concepts"] = sweep["concepts"]
+            result["predicates"] = sweep["predicates"]
+            result["conceptgroups"] = groupConcepts(sweep["concepts"],minlabels=minlabels)
+            result["predicategroups"] = groupConcepts(sweep["predicates"],minlabels=minlabels)
+            result["summary"] = sweepSummary(result)
+
+        printSweep(results)
+
+        return results
+
+    # --------------------------------------------------
+
+    def enrich(self,tuples,resume=False):
+        #When resuming, only the documents enriched after the checkpoint are returned
+
+        enriched = list(self.enrichStream(tuples,resume=resume,keep_labels=True))
 
         self.enriched = enriched
-        self.concepts = concepts
-        self.predicates = predicates
-        self.conceptgroups = conceptgroups
-        self.predicategroups = predicategroups
 
-        return enriched,concepts,predicates,conceptgroups,predicategroups
+        return enriched,self.concepts,self.predicates,self.conceptgroups,self.predicategroups
 
     # --------------------------------------------------
 
-    def load(self,path=None):
+    def load(self,path=None,artifacts=None,lazy=False):
+        #Loads the artifacts (all of _ARTIFACTS_ when None) saved in path, each one on its own
+        #With lazy=True, the enriched documents and the groups are read from disk each time they are iterated, instead of loaded
 
         if not self.cache_pickle:
             print("Pickle load cancelled, you must explicitly set cache_pickle=True when initializing Skipchunk")
@@ -557,6 +1951,51 @@ class Skipchunk():
         if not path:
             path = self.pickle_data
 
+        if not os.path.isfile(os.path.join(path,'manifest.json')):
+            return self.loadPickles(path)
+
+        store = segments.SegmentStore(path)
+        if artifacts is None:
+            artifacts = _ARTIFACTS_
+
+        if "enriched" in artifacts:
+            self.enriched = segments.Records(store,"enriched",transform=self.attachDocument) if lazy else list(store.records("enriched"))
+            self.enrichedsaved = True
+
+        if "concepts" in artifacts:
+            self.concepts = recordLabels(store.records("concepts"))
+            self.savedconcepts = {key:len(labels) for key,labels in self.concepts.items()}
+
+        if "predicates" in artifacts:
+            self.predicates = recordLabels(store.records("predicates"))
+            self.savedpredicates = {key:len(labels) for key,labels in self.predicates.items()}
+
+        if "conceptgroups" in artifacts:
+            self.conceptgroups = segments.Records(store,"conceptgroups") if lazy else list(store.records("conceptgroups"))
+
+        if "predicategroups" in artifacts:
+            self.predicategroups = segments.Records(store,"predicategroups") if lazy else list(store.records("predicategroups"))
+
+        if "concepts" in artifacts or "predicates" in artifacts:
+            self.aggregate()
+
+        if isinstance(self.enriched,list):
+            for rich in self.enriched:
+                self.attachDocument(rich)
+
+        return True
+
+    def attachDocument(self,rich):
+        #Points the compact labels of an enriched document at the current concepts and predicates
+        for field,data in (("skipchunk_concepts",self.concepts),("skipchunk_predicates",self.predicates)):
+            labels = rich.get(field)
+            if isinstance(labels,DocumentLabels):
+                labels.attach(data)
+        return rich
+
+    def loadPickles(self,path):
+        #Loads the whole object pickles saved by older versions
+
         if os.path.isdir(path):
             with open(os.path.join(path,'enriched_posts.pickle'),'rb') as fd:
                 self.enriched = pickle.load(fd)
@@ -573,9 +2012,23 @@ class Skipchunk():
             with open(os.path.join(path,'predicategroups_posts.pickle'),'rb') as fd:
                 self.predicategroups = pickle.load(fd)
 
+            self.aggregate()
+            for rich in self.enriched:
+                self.attachDocument(rich)
+            self.savedconcepts = {key:len(labels) for key,labels in self.concepts.items()}
+            self.savedpredicates = {key:len(labels) for key,labels in self.predicates.items()}
+            self.enrichedsaved = True
+
+            return True
+
+        return False
+
     # --------------------------------------------------
 
-    def save(self,path=None):
+    def save(self,path=None,append=False):
+        #Saves every artifact as records in compressed segments, see segments.py
+        #With append=True, only the documents and labels enriched since the last save or load are added as new segments
+        #The groups are counted again from all the labels on every batch, so they are always written whole
 
         if not self.cache_pickle:
             print("Pickling cancelled, you must explicitly set cache_pickle=True when initializing Skipchunk")
@@ -584,21 +2037,62 @@ class Skipchunk():
         if not path:
             path = self.pickle_data
 
-        if os.path.isdir(path):
-            with open(os.path.join(path,'enriched_posts.pickle'),'wb') as fd:
-                pickle.dump(self.enriched,fd,protocol=pickle.HIGHEST_PROTOCOL)
+        store = segments.SegmentStore(path)
+
+        if append:
+            if not self.enrichedsaved:
+                store.write("enriched",self.enriched or [],append=True)
+            store.write("concepts",unsavedLabels(self.concepts,self.savedconcepts),append=True)
+            store.write("predicates",unsavedLabels(self.predicates,self.savedpredicates),append=True)
+        else:
+            store.write("enriched",self.enriched or [])
+            store.write("concepts",self.concepts.items())
+            store.write("predicates",self.predicates.items())
+
+        store.write("conceptgroups",self.conceptgroups or [])
+        store.write("predicategroups",self.predicategroups or [])
+
+        self.enrichedsaved = True
+        self.savedconcepts = {key:len(labels) for key,labels in self.concepts.items()}
+        self.savedpredicates = {key:len(labels) for key,labels in self.predicates.items()}
+
+        return True
+
+    # --------------------------------------------------
+
+    def saveLabels(self,path=None):
+        #Writes the labels of the concepts and predicates as columns, see labelstore.py
+        if not path:
+            path = self.label_data
+        labelstore.writeLabels(path,{"concepts":self.concepts,"predicates":self.predicates})
+
+    def loadLabels(self,path=None):
+        #Memory-maps the labels saved with saveLabels, instead of keeping a Label object for every label
+        #The concepts and predicates become {key:LabelView}, and the groups share the same views
+        #Labels enriched afterwards are added to the views, and are written as columns the next time they are saved
+        if not path:
+            path = self.label_data
 
-            with open(os.path.join(path,'concepts_posts.pickle'),'wb') as fd:
-                pickle.dump(self.concepts,fd,protocol=pickle.HIGHEST_PROTOCOL)
+        store = labelstore.LabelStore(path,Label)
+        self.concepts = store.labels("concepts")
+        self.predicates = store.labels("predicates")
 
-            with open(os.path.join(path,'predicates_posts.pickle'),'wb') as fd:
-                pickle.dump(self.predicates,fd,protocol=pickle.HIGHEST_PROTOCOL)
+        for data,aggregates,groups in ((self.concepts,self.conceptaggregates,self.conceptgroups),(self.predicates,self.predicateaggregates,self.predicategroups)):
+            if aggregates.keys()==data.keys():
+                #The running groups already have the counts, they only need to point at the views
+                for key,group in aggregates.items():
+                    group.addlabels(data[key])
+            if isinstance(groups,list):
+                for group in groups:
+                    if group.key in data:
+                        group.addlabels(data[group.key])
 
-            with open(os.path.join(path,'conceptgroups_posts.pickle'),'wb') as fd:
-                pickle.dump(self.conceptgroups,fd,protocol=pickle.HIGHEST_PROTOCOL)
+        if self.conceptaggregates.keys()!=self.concepts.keys() or self.predicateaggregates.keys()!=self.predicates.keys():
+            self.aggregate()
 
-            with open(os.path.join(path,'predicategroups_posts.pickle'),'wb') as fd:
-                pickle.dump(self.predicategroups,fd,protocol=pickle.HIGHEST_PROTOCOL)
+        if isinstance(self.enriched,list):
+            for rich in self.enriched:
+                self.attachDocument(rich)
 
     def __init__(self,
             config,
@@ -620,7 +2114,26 @@ class Skipchunk():
             cache_documents = False,
             cache_pickle = False,
             spacy_batch_size = 40,
-            spacy_processes = 4
+            spacy_processes = 4,
+            pool_processes = 0,
+            pool_shard_size = 1000,
+            vectorized = False,
+            derivations_path = None,
+            spacy_tier = "full",
+            checkpoint_every = 0,
+            parse_cache = False,
+            parse_cache_size = 1000000,
+            parse_store = False,
+            sentence_memo_size = 0,
+            spacy_batch_chars = 0,
+            spacy_window_chars = 0,
+            spill_labels = 0,
+            approximate_counts = False,
+            sketch_epsilon = 0.0001,
+            sketch_delta = 0.01,
+            exact_pass = False,
+            preflabel_cache_size = 100000,
+            compact_documents = False
         ):
 
         #Config:
@@ -635,13 +2148,64 @@ class Skipchunk():
         self.minpredicatelength = minpredicatelength
         self.maxpredicatelength = maxpredicatelength
         self.minlabels = minlabels
+        self.vectorized = vectorized
         
         self.spacy_batch_size = spacy_batch_size
         self.spacy_processes = spacy_processes
 
+        #When greater than 0, documents are sorted by length and batched by this many characters instead of spacy_batch_size
+        self.spacy_batch_chars = spacy_batch_chars
+        self.batchtimings = []
+
+        #Documents longer than this many characters (or than nlp.max_length, when 0) are parsed in sentence aligned windows
+        self.spacy_window_chars = spacy_window_chars
+
+        #The enriched documents keep the positions of their labels in the concepts and predicates, instead of the Labels
+        #This only makes saved documents smaller, in memory they still share the same Labels either way
+        self.compact_documents = compact_documents
+
+        #When pool_processes>1, each worker process parses AND chunks whole shards of pool_shard_size tuples
+        #Otherwise only the spacy parse is spread over spacy_processes, and chunking happens here
+        self.pool_processes = pool_processes
+        self.pool_shard_size = pool_shard_size
+
+        #spacy can only spread batches of a fixed number of documents over its processes, so budget batches are parsed
+        #  in the calling process, or in the pool workers
+        if self.spacy_batch_chars and self.spacy_processes>1 and self.pool_processes<=1:
+            print('Budget batches are parsed in one process, spacy_processes is only used when spacy_batch_chars=0.  Use pool_processes to parse them in parallel')
+
+        #Replays the chunker output of repeated sentences, for the most recent sentence_memo_size distinct sentences
+        self.sentencememo = None
+        if sentence_memo_size>0:
+            self.sentencememo = SentenceMemo(sentence_memo_size)
+
+        #Saves a checkpoint every this many documents, so enrich(...,resume=True) can continue a run that stopped
+        self.checkpoint_every = checkpoint_every
+
+        #When greater than 0, labels are spilled to disk in sorted runs of this many, and grouped out of core
+        self.spill_labels = spill_labels
+        if self.spill_labels and self.checkpoint_every:
+            raise ValueError('Checkpoints do not cover the spilled labels, use either checkpoint_every or spill_labels')
+
+        #When approximate_counts=True, keys are counted in a count-min sketch and their labels are only collected once
+        #  the key was seen minlabels times, so the many keys seen once are never kept.  With exact_pass=True,
+        #  the documents are chunked again after enriching, to count the collected keys exactly
+        self.sketch_epsilon = sketch_epsilon
+        self.sketch_delta = sketch_delta
+        self.exact_pass = exact_pass
+        self.conceptsketch = None
+        self.predicatesketch = None
+        if approximate_counts:
+            if self.spill_labels:
+                raise ValueError('Approximate counts are not spilled, use either approximate_counts or spill_labels')
+            self.newSketches()
+
         #Initialize NLP pipeline
+        #The tier decides which spacy components are loaded, and so which Label fields can be filled
         self.spacy_model=spacy_model
-        self.nlp = spacy.load(self.spacy_model)
+        self.spacy_tier=spacy_tier
+        self.nlp = loadPipeline(self.spacy_model,self.spacy_tier)
+        self.label_fields = _TIERS_[self.spacy_tier]["fields"]
 
         #These don't do anything yet but they will be used later to untangle the global constants
         self.concept_tags = concept_tags
@@ -668,8 +2232,14 @@ class Skipchunk():
 
         #Stateful data that will change when Skipchunk.enrich is run:
         self.enriched = None
+        self.enrichedsaved = False #Whether save already wrote the enriched documents
+        self.savedconcepts = dict() #Number of labels of each key written by save, to append only the new ones
+        self.savedpredicates = dict()
         self.concepts = dict()
         self.predicates = dict()
+        self.conceptaggregates = dict() #Running ConceptGroup of every concept key
+        self.predicateaggregates = dict()
+        self.keeplabels = True #Whether the concepts and predicates keep the Labels, see enrichStream
         self.conceptgroups = None
         self.predicategroups = None
 
@@ -694,6 +2264,8 @@ class Skipchunk():
 
         self.sqlite_data = os.path.join(self.root, 'sqlite')
         self.database = os.path.join(self.sqlite_data, 'skipchunk.db')
+        self.preflabel_cache_size = preflabel_cache_size
+        self.db = None
         print(self.database)
         if not os.path.isdir(self.sqlite_data):
             os.makedirs(self.sqlite_data)
@@ -701,3 +2273,44 @@ class Skipchunk():
         self.document_data = os.path.join(self.root, 'documents')
         if not os.path.isdir(self.document_data):
             os.makedirs(self.document_data)
+
+        #The cached documents are appended to segment files, see docstore.py
+        self.documentstore = None
+        if self.cache_documents:
+            self.documentstore = docstore.DocumentStore(self.document_data)
+
+        self.label_data = os.path.join(self.root, 'labels')
+
+        self.checkpoint_data = os.path.join(self.root, 'checkpoint')
+        self.checkpointconcepts = dict() #Number of labels of each key in the checkpoint, to append only the new ones
+        self.checkpointpredicates = dict()
+        if not os.path.isdir(self.checkpoint_data):
+            os.makedirs(self.checkpoint_data)
+
+        #Sorted runs of the labels, when grouping out of core.  Like the concepts they start out empty
+        self.conceptspill = None
+        self.predicatespill = None
+        self.spillseq = 0
+        if self.spill_labels:
+            self.spill_data = os.path.join(self.root, 'spill')
+            self.conceptspill = spill.SpillRuns(os.path.join(self.spill_data,'concepts'),self.spill_labels)
+            self.predicatespill = spill.SpillRuns(os.path.join(self.spill_data,'predicates'),self.spill_labels)
+
+        #The WordNet derivation table is not specific to a graph, so it is shared by all of them
+        #Build the full table once with:  python -m skipchunk.derivations <derivations_path>
+        self.derivations_path = derivations_path
+        if not self.derivations_path:
+            self.derivations_path = os.path.join(self.skipchunk_data, 'derivations.json')
+        derivations.table.load(self.derivations_path)
+
+        #Chunker output of the documents enriched before, so unchanged documents are not parsed again
+        self.parsecache = None
+        if parse_cache:
+            self.parsecache = parsecache.ParseCache(os.path.join(self.sqlite_data, 'parsecache.db'),self.parseConfig(),max_entries=parse_cache_size)
+
+        #Parses of the documents enriched before, so they can be chunked again with other parameters
+        self.parsestore = None
+        self.parsestorekept = False
+        if parse_store:
+            self.parsestore = parsestore.ParseStore(os.path.join(self.root, 'parses'),shard_size=self.pool_shard_size)
+
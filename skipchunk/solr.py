@@ -175,8 +175,9 @@ class Solr(SearchEngineInterface):
 
     ## -------------------------------------------
     ## Content Update
-    def index(self, documents, timeout=10000) -> bool:
+    def index(self, documents, timeout=10000, commit=True) -> bool:
         #Accepts documents to index the required data
+        #With commit=False the documents are not searchable until commit is called
         isCore = self.indexExists(self.name)
         if not isCore:
             isCore = self.indexCreate()
@@ -185,12 +186,18 @@ class Solr(SearchEngineInterface):
             indexer = pysolr.Solr(self.solr_uri, timeout=timeout)
 
             #documents is a generator so we convert it to a list first
-            indexer.add(list(documents),commit=True)
+            indexer.add(list(documents),commit=commit)
 
             return True
 
         return False
 
+    def commit(self, timeout=10000) -> bool:
+        #Makes the documents indexed with commit=False searchable
+        indexer = pysolr.Solr(self.solr_uri, timeout=timeout)
+        indexer.commit()
+        return True
+
     ## -------------------------------------------
     ## Querying
 
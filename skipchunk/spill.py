@@ -0,0 +1,135 @@
+"""
+Groups labels out of core, for corpora with more labels than fit in memory.
+Label records are buffered, and spilled to disk as sorted runs whenever the buffer is full.
+The runs are merged back with a streaming k-way merge, so the records come out sorted
+while only a block of each run is in memory.
+"""
+
+import os
+import glob
+import heapq
+import pickle
+
+from .atomic import atomicWrite
+
+_BLOCK_ = 10000 #Records (or groups) pickled together in a run file
+
+def writeBlocks(path,items):
+    #Writes the items in pickled blocks, through a temporary file so a crash never leaves half a run behind
+    #Returns the number of items written
+    count = 0
+    with atomicWrite(path,'wb') as fd:
+        block = []
+        for item in items:
+            block.append(item)
+            if len(block)>=_BLOCK_:
+                pickle.dump(block,fd,protocol=pickle.HIGHEST_PROTOCOL)
+                count += len(block)
+                block = []
+        if len(block):
+            pickle.dump(block,fd,protocol=pickle.HIGHEST_PROTOCOL)
+            count += len(block)
+    return count
+
+def readBlocks(path):
+    with open(path,'rb') as fd:
+        while True:
+            try:
+                block = pickle.load(fd)
+            except EOFError:
+                return
+            yield from block
+
+##==========================================================
+## Sorted runs of records.  Records are tuples, and are sorted by their natural order
+
+class SpillRuns:
+
+    def add(self,record):
+        self.buffer.append(record)
+        if len(self.buffer)>=self.budget:
+            self.spill()
+
+    def spill(self):
+        #Sorts the buffer and writes it out as a new run
+        if not len(self.buffer):
+            return
+        self.buffer.sort()
+        path = self.nextRun()
+        writeBlocks(path,self.buffer)
+        self.runs.append(path)
+        self.buffer = []
+
+    def nextRun(self):
+        path = os.path.join(self.path,'run-%06d.pickle' % self.count)
+        self.count += 1
+        return path
+
+    def merge(self):
+        #Streams every record in order, with a k-way merge of the runs
+        #The merged records are written to a single run as they go, which replaces the others once the merge is done,
+        #  so the runs don't pile up over many batches
+        self.spill()
+        runs = list(self.runs)
+        if len(runs)<=1:
+            for path in runs:
+                yield from readBlocks(path)
+            return
+
+        path = self.nextRun()
+        merged = heapq.merge(*[readBlocks(run) for run in runs])
+
+        with atomicWrite(path,'wb') as fd:
+            block = []
+            for record in merged:
+                block.append(record)
+                if len(block)>=_BLOCK_:
+                    pickle.dump(block,fd,protocol=pickle.HIGHEST_PROTOCOL)
+                    block = []
+                yield record
+            if len(block):
+                pickle.dump(block,fd,protocol=pickle.HIGHEST_PROTOCOL)
+
+        for run in runs:
+            os.remove(run)
+        self.runs = [path]
+
+    def clear(self):
+        #Deletes every run
+        self.buffer = []
+        for path in glob.glob(os.path.join(self.path,'run-*.pickle*')):
+            os.remove(path)
+        self.runs = []
+        self.count = 0
+
+    def __init__(self,path,budget=1000000):
+        #Path is the directory holding the run files
+        #Budget is the number of records kept in memory before they are spilled
+        self.path = path
+        self.budget = budget
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        self.buffer = []
+        self.runs = []
+        self.count = 0
+        self.clear()
+
+##==========================================================
+## Groups written to disk as they are streamed, and read back whenever they are iterated
+
+class SpilledGroups:
+
+    def write(self,groups):
+        self.count = writeBlocks(self.path,groups)
+
+    def __iter__(self):
+        return readBlocks(self.path)
+
+    def __len__(self):
+        return self.count
+
+    def __init__(self,path):
+        self.path = path
+        self.count = 0
@@ -0,0 +1,55 @@
+"""
+A small rule-based spacy pipeline for the tests, so they don't need a trained model.
+Tags come from word lists and suffixes, lemmas from a lookup table, and sentences from the sentencizer.
+It is built from spacy's own components only, so worker processes can load it from disk.
+"""
+
+import os
+import json
+import spacy
+from spacy.lookups import Lookups
+
+_WORDS_ = {
+    "JJ": ["quick","brown","lazy","tasty","open","relevant","fast","big","new","good","great","simple","free"],
+    "VBD": ["jumped","ate","drank","indexed","was","were","used","made"],
+    "VB": ["search","index","run","build","is","are","be","use","make","have","has","do","can","will","get","want","need"],
+    "DT": ["the","a","an","some","that","they","i","so","this","we","you","it","he","she","our","your","its","their","there","here"],
+    "CC": ["and","or","but"],
+    "IN": ["over","in","of","for","with","on","then","to","as","at","by","from","if"],
+    "RB": ["very","now","yesterday","not","no","also","just","more"],
+    "NNS": ["posts","engines","dogs","queries","documents","results"]
+}
+
+_LEMMAS_ = {"jumped":"jump","ate":"eat","drank":"drink","indexed":"index","was":"be","were":"be","is":"be","are":"be","used":"use","made":"make",
+    "posts":"post","engines":"engine","dogs":"dog","queries":"query","documents":"document","results":"result"}
+
+def buildModel(path):
+    #Writes the pipeline to path, and returns path
+    if os.path.isdir(path):
+        return path
+
+    nlp = spacy.blank("en")
+    nlp.add_pipe("sentencizer")
+
+    ruler = nlp.add_pipe("attribute_ruler")
+    ruler.add([[{"IS_ALPHA":True}]],{"TAG":"NN","POS":"NOUN"})
+    ruler.add([[{"LOWER":{"REGEX":"^[a-z]+(ing|ed)$"}}]],{"TAG":"VBG","POS":"VERB"})
+    ruler.add([[{"LOWER":{"REGEX":"^[a-z]+ly$"}}]],{"TAG":"RB","POS":"ADV"})
+    ruler.add([[{"LOWER":{"REGEX":"^[a-z]+(al|ive|ful|ous)$"}}]],{"TAG":"JJ","POS":"ADJ"})
+    for tag,words in _WORDS_.items():
+        ruler.add([[{"LOWER":{"IN":words}}]],{"TAG":tag})
+    ruler.add([[{"IS_PUNCT":True}]],{"TAG":".","POS":"PUNCT"})
+    ruler.add([[{"IS_SPACE":True}]],{"TAG":"SP","POS":"SPACE"})
+
+    lookups = Lookups()
+    lookups.add_table("lemma_lookup",_LEMMAS_)
+    lemmatizer = nlp.add_pipe("lemmatizer",config={"mode":"lookup"})
+    lemmatizer.initialize(lookups=lookups)
+
+    nlp.to_disk(path)
+    return path
+
+def blogPosts(count):
+    #The first count posts of the test blog corpus
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)),'blog-posts.json')) as fd:
+        return json.load(fd)[:count]
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the atomic file and directory writes."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from skipchunk import atomic
+
+class TestAtomic(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.file = os.path.join(self.path,'file.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_write(self):
+        with atomic.atomicWrite(self.file) as fd:
+            fd.write('old')
+
+        #A write that fails keeps the old file, and leaves no temporary file behind
+        with self.assertRaises(RuntimeError):
+            with atomic.atomicWrite(self.file) as fd:
+                fd.write('new')
+                raise RuntimeError('crash')
+        with open(self.file) as fd:
+            self.assertEqual(fd.read(),'old')
+        self.assertEqual(os.listdir(self.path),['file.txt'])
+
+    def test_generator(self):
+        #A generator that is closed halfway through writing does not replace the file
+        def write():
+            with atomic.atomicWrite(self.file) as fd:
+                for i in range(10):
+                    fd.write(str(i))
+                    yield i
+        self.assertEqual(list(write()),list(range(10)))
+
+        written = write()
+        next(written)
+        written.close()
+        with open(self.file) as fd:
+            self.assertEqual(fd.read(),'0123456789')
+        self.assertEqual(os.listdir(self.path),['file.txt'])
+
+    def test_directory(self):
+        directory = os.path.join(self.path,'columns')
+        for name in ('a','b'):
+            with atomic.atomicDirectory(directory) as temp:
+                open(os.path.join(temp,name),'w').close()
+        self.assertEqual(os.listdir(directory),['b'])
+
+        with self.assertRaises(RuntimeError):
+            with atomic.atomicDirectory(directory) as temp:
+                raise RuntimeError('crash')
+        self.assertEqual(sorted(os.listdir(self.path)),['columns'])
+        self.assertEqual(os.listdir(directory),['b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for character budget batching."""
+
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+import spacy
+
+from skipchunk import skipchunk
+from skipchunk import derivations
+
+from . import models
+
+class TestBatches(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.path = tempfile.mkdtemp()
+        cls.nlp = spacy.load(models.buildModel(os.path.join(cls.path,'model')))
+        cls.posts = models.blogPosts(20)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+
+    def setUp(self):
+        #WordNet is not needed for these tests
+        self.adjectives = derivations.table.adjectives
+        derivations.table.adjectives = derivations.Derivations(lambda lem: None)
+
+    def tearDown(self):
+        derivations.table.adjectives = self.adjectives
+
+    def tuples(self):
+        s = skipchunk.Skipchunk({"name":"batches","path":self.path},spacy_model=os.path.join(self.path,'model'),spacy_processes=1)
+        return list(s.bulk(self.posts,fields=["title","content"]))
+
+    def test_budget(self):
+        tuples = [(text,{"id":i}) for i,text in enumerate(["a"*5,"b"*50,"c"*20,"d"*200,"e"*10,"f"*30])]
+        batches = skipchunk.budgetBatches(tuples,60)
+        #Shortest first, and a document longer than the budget is a batch on its own
+        self.assertEqual(batches,[[0,4,2],[5],[1],[3]])
+        for batch in batches:
+            self.assertTrue(len(batch)==1 or sum(len(tuples[i][0]) for i in batch)<=60)
+        self.assertEqual(skipchunk.budgetBatches([],60),[])
+
+    def test_parse(self):
+        tuples = self.tuples()
+        timings = []
+        parsed = {}
+        for i,doc,(context,fields) in skipchunk.parseBatches(self.nlp,tuples,3000,timings):
+            self.assertEqual(doc.text,tuples[i][0])
+            parsed[i] = context
+            #Time spent by the consumer is not parse time
+            time.sleep(0.05)
+
+        self.assertEqual(sorted(parsed.keys()),list(range(len(tuples))))
+        self.assertEqual(sum(timing["docs"] for timing in timings),len(tuples))
+        self.assertEqual(sum(timing["chars"] for timing in timings),sum(len(text) for text,context in tuples))
+        self.assertLess(sum(timing["seconds"] for timing in timings),0.05*len(tuples))
+
+    def test_processes(self):
+        #Budget batches are parsed in one process, whatever spacy_processes is
+        enriched = []
+        for name,processes in (("one",1),("four",4)):
+            s = skipchunk.Skipchunk({"name":name,"path":self.path},spacy_model=os.path.join(self.path,'model'),spacy_processes=processes,spacy_batch_chars=3000,minlabels=1)
+            enriched.append(s.enrich(self.tuples()))
+        self.assertEqual([group.key for group in enriched[0][3]],[group.key for group in enriched[1][3]])
+        self.assertEqual([rich["id"] for rich in enriched[0][0]],[rich["id"] for rich in enriched[1][0]])
+
+    def test_chunk(self):
+        #The chunks come back in input order, the same as parsing one document at a time
+        tuples = self.tuples()
+        chunker = skipchunk.Chunker()
+        timings = []
+        for window_chars in (0,500):
+            chunked = skipchunk.chunkBatches(self.nlp,tuples,chunker,"id",3000,timings,window_chars=window_chars)
+            for (doc,context,offsets,fields,docconcepts,docpredicates),(text,tcontext) in zip(chunked,tuples):
+                self.assertIsNone(doc)
+                self.assertIs(context,tcontext)
+                doc,(pcontext,poffsets) = next(skipchunk.pipeTuples(self.nlp,[(text,tcontext)],window_chars))
+                plain = chunker.chunk(doc,context["id"],fields=poffsets)
+                self.assertEqual({key:len(labels) for key,labels in docconcepts.items()},{key:len(labels) for key,labels in plain[1].items()})
+
+
+if __name__ == '__main__':
+    unittest.main()
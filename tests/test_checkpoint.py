@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for checkpointed enrichment runs that stop and resume."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from skipchunk import skipchunk
+from skipchunk import segments
+from skipchunk import derivations
+
+from . import models
+
+def labelFields(data):
+    return {key:[[getattr(label,k) for k in skipchunk.Label.__slots__] for label in labels] for key,labels in data.items()}
+
+def groupFields(groups):
+    return [(group.key,group.total,group.preflabel,group.prefcount) for group in groups]
+
+class TestCheckpoint(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.path = tempfile.mkdtemp()
+        cls.model = models.buildModel(os.path.join(cls.path,'model'))
+        cls.posts = models.blogPosts(40)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+
+    def setUp(self):
+        #WordNet is not needed for these tests
+        self.adjectives = derivations.table.adjectives
+        derivations.table.adjectives = derivations.Derivations(lambda lem: None)
+
+    def tearDown(self):
+        derivations.table.adjectives = self.adjectives
+
+    def skipchunk(self,name,**kwargs):
+        return skipchunk.Skipchunk({"name":name,"path":self.path},spacy_model=self.model,spacy_processes=1,minlabels=1,**kwargs)
+
+    def tuples(self,s):
+        return list(s.bulk(self.posts,fields=["title","content"]))
+
+    def interrupt(self,s,count):
+        #Enriches until count documents came out, as if the run was stopped there
+        stream = s.enrichStream(self.tuples(s),keep_labels=True)
+        for i,rich in enumerate(stream):
+            if i+1==count:
+                break
+        stream.close()
+
+    def test_pool_resume(self):
+        plain = self.skipchunk("plain")
+        enriched,concepts,predicates,conceptgroups,predicategroups = plain.enrich(self.tuples(plain))
+
+        kwargs = {"pool_processes":2,"pool_shard_size":8,"checkpoint_every":5}
+        self.interrupt(self.skipchunk("pooled",**kwargs),23)
+
+        resumed = self.skipchunk("pooled",**kwargs)
+        self.assertEqual(resumed.loadCheckpoint()["processed"],20)
+        renriched,rconcepts,rpredicates,rconceptgroups,rpredicategroups = resumed.enrich(self.tuples(resumed),resume=True)
+
+        self.assertEqual([rich["id"] for rich in renriched],[rich["id"] for rich in enriched[20:]])
+        self.assertEqual(labelFields(rconcepts),labelFields(concepts))
+        self.assertEqual(labelFields(rpredicates),labelFields(predicates))
+        self.assertEqual(groupFields(rconceptgroups),groupFields(conceptgroups))
+        self.assertEqual(groupFields(rpredicategroups),groupFields(predicategroups))
+        self.assertIsNone(resumed.loadCheckpoint())
+
+    def test_incremental(self):
+        #Each checkpoint only appends the labels that came after the one before
+        s = self.skipchunk("incremental",checkpoint_every=4)
+        self.interrupt(s,18)
+
+        store = segments.SegmentStore(s.checkpoint_data)
+        self.assertEqual(store.count("state"),1)
+        saved = sum(len(labels) for key,labels in store.records("concepts"))
+        self.assertEqual(saved,sum(s.checkpointconcepts.values()))
+        self.assertEqual(labelFields(s.loadCheckpoint()["concepts"]),labelFields({key:labels[:s.checkpointconcepts[key]] for key,labels in s.concepts.items() if key in s.checkpointconcepts}))
+
+    def test_order(self):
+        s = self.skipchunk("order",checkpoint_every=4)
+        self.interrupt(s,10)
+        tuples = self.tuples(s)
+        tuples[7],tuples[8] = tuples[8],tuples[7]
+        with self.assertRaises(ValueError):
+            list(s.enrichStream(tuples,resume=True,keep_labels=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the skipchunk and skipchunkArrays chunkers, on documents annotated by hand."""
+
+
+import unittest
+
+import spacy
+from spacy.tokens import Doc
+
+from skipchunk import skipchunk
+from skipchunk import derivations
+
+#(word,tag,dep,head,lemma) per token, the head is the absolute index of the token in the document
+#Each list is a sentence
+SENTENCES = [
+    [
+        ("The","DT","det",2,"the"),
+        ("quick","JJ","amod",2,"quick"),
+        ("fox","NN","nsubj",3,"fox"),
+        ("jumped","VBD","ROOT",3,"jump"),
+        ("over","IN","prep",3,"over"),
+        ("the","DT","det",7,"the"),
+        ("lazy","JJ","amod",7,"lazy"),
+        ("dog","NN","pobj",4,"dog"),
+        (".",".","punct",3,".")
+    ],
+    [
+        ("Solr","NNP","nsubj",10,"Solr"),
+        ("indexed","VBD","ROOT",10,"index"),
+        ("the","DT","det",14,"the"),
+        ("blog","NN","compound",14,"blog"),
+        ("search","NN","compound",14,"search"),
+        ("posts","NNS","dobj",10,"post"),
+        ("very","RB","advmod",16,"very"),
+        ("quickly","RB","advmod",10,"quickly"),
+        (",",",","punct",10,","),
+        ("and","CC","cc",10,"and"),
+        ("tasty","JJ","amod",21,"tasty"),
+        ("open","JJ","amod",21,"open"),
+        ("source","NN","compound",22,"source"),
+        ("search","NN","compound",23,"search"),
+        ("engines","NNS","conj",10,"engine"),
+        ("run","VBP","conj",10,"run"),
+        ("  ","SP","dep",23,"  "),
+        ("fast","RB","advmod",23,"fast"),
+        ("!",".","punct",10,"!")
+    ],
+    [
+        ("I","PRP","nsubj",29,"I"),
+        ("ate","VBD","ROOT",29,"eat"),
+        ("some","DT","det",33,"some"),
+        ("really","RB","advmod",32,"really"),
+        ("good","JJ","amod",33,"good"),
+        ("sandwiches","NNS","dobj",29,"sandwich"),
+        ("with","IN","prep",33,"with"),
+        ("a","DT","det",38,"a"),
+        ("big","JJ","amod",38,"big"),
+        ("cup","NN","compound",38,"cup"),
+        ("tea","NN","pobj",34,"tea"),
+        ("then","RB","advmod",40,"then"),
+        ("drank","VBD","conj",29,"drink"),
+        ("it","PRP","dobj",40,"it")
+    ]
+]
+
+DERIVED = {"quick":"quickness","lazy":"laziness","open":"openness"}
+
+def annotatedDoc(vocab,sentences):
+    tokens = [token for sentence in sentences for token in sentence]
+    sent_starts = [i==0 for sentence in sentences for i in range(len(sentence))]
+    return Doc(
+        vocab,
+        words=[t[0] for t in tokens],
+        tags=[t[1] for t in tokens],
+        deps=[t[2] for t in tokens],
+        heads=[t[3] for t in tokens],
+        lemmas=[t[4] for t in tokens],
+        sent_starts=sent_starts
+        )
+
+def labelFields(labels):
+    return [[getattr(label,k) for k in skipchunk.Label.__slots__] for label in labels]
+
+class TestChunker(unittest.TestCase):
+    """skipchunkArrays must give exactly the same Labels as skipchunk"""
+
+    def setUp(self):
+        #WordNet is replaced by a fixed table, so the tests don't need the nltk data
+        self.adjectives = derivations.table.adjectives
+        derivations.table.adjectives = derivations.Derivations(lambda lem: DERIVED.get(lem))
+        self.nlp = spacy.blank("en")
+        self.doc = annotatedDoc(self.nlp.vocab,SENTENCES)
+
+    def tearDown(self):
+        derivations.table.adjectives = self.adjectives
+
+    def test_sentences(self):
+        arrays = skipchunk.TokenArrays(self.doc)
+        for sentenceid,sentence in enumerate(self.doc.sents):
+            for maxslop in (1,2,4):
+                for maxlength in (2,3,4):
+                    concepts,predicates = skipchunk.skipchunk(sentence,docid=7,sentenceid=sentenceid,maxslop=maxslop,maxlength=maxlength)
+                    vconcepts,vpredicates = skipchunk.skipchunkArrays(arrays,sentence.start,sentence.end,docid=7,sentenceid=sentenceid,maxslop=maxslop,maxlength=maxlength)
+                    self.assertEqual(labelFields(concepts),labelFields(vconcepts))
+                    self.assertEqual(labelFields(predicates),labelFields(vpredicates))
+
+    def test_labels(self):
+        #Spot checks of what both chunkers find
+        concepts,predicates = skipchunk.skipchunk(list(self.doc.sents)[0],docid=1,sentenceid=0)
+        keys = [label.key for label in concepts]
+        self.assertIn(skipchunk.Label.makeKey(["quickness","fox"]),keys)
+        self.assertIn(skipchunk.Label.makeKey(["laziness","dog"]),keys)
+        self.assertEqual([label.label for label in concepts if label.key=="fox_quickness"],["quick fox"])
+
+        fox = [label for label in concepts if label.key=="fox_quickness"][0]
+        self.assertEqual(fox.subjectOf,"jump")
+
+        concepts,predicates = skipchunk.skipchunk(list(self.doc.sents)[1],docid=1,sentenceid=1)
+        posts = [label for label in concepts if label.key=="blog_post_search"][0]
+        self.assertEqual(posts.label,"blog search posts")
+        self.assertEqual(posts.objectOf,"index")
+        self.assertEqual([label.label for label in predicates],["indexed","very quickly","run fast"])
+
+    def test_chunkers(self):
+        #Whole documents, through the Chunker that enrichment uses
+        fields = [(0,"title"),(len(self.doc[:9].text_with_ws),"content")]
+        for maxslop in (2,4):
+            chunker = skipchunk.Chunker(maxslop=maxslop,minconceptlength=1,minpredicatelength=1)
+            vchunker = skipchunk.Chunker(maxslop=maxslop,minconceptlength=1,minpredicatelength=1,vectorized=True)
+
+            fieldnames,concepts,predicates = chunker.chunk(self.doc,"doc",fields=fields)
+            vfieldnames,vconcepts,vpredicates = vchunker.chunk(self.doc,"doc",fields=fields)
+
+            self.assertEqual(fieldnames,["title","content"])
+            self.assertEqual(fieldnames,vfieldnames)
+            self.assertEqual(list(concepts.keys()),list(vconcepts.keys()))
+            self.assertEqual(list(predicates.keys()),list(vpredicates.keys()))
+            for key in concepts:
+                self.assertEqual(labelFields(concepts[key]),labelFields(vconcepts[key]))
+            for key in predicates:
+                self.assertEqual(labelFields(predicates[key]),labelFields(vpredicates[key]))
+
+    def test_memo(self):
+        #Replayed sentences get their own docid and sentenceid, and nothing else changes
+        memo = skipchunk.SentenceMemo(10)
+        chunker = skipchunk.Chunker(minconceptlength=1,minpredicatelength=1)
+        memoized = skipchunk.Chunker(minconceptlength=1,minpredicatelength=1,memo=memo)
+
+        for docid in ("a","b"):
+            fieldnames,concepts,predicates = chunker.chunk(self.doc,docid)
+            mfieldnames,mconcepts,mpredicates = memoized.chunk(self.doc,docid)
+            for key in concepts:
+                self.assertEqual(labelFields(concepts[key]),labelFields(mconcepts[key]))
+            for key in predicates:
+                self.assertEqual(labelFields(predicates[key]),labelFields(mpredicates[key]))
+
+        self.assertEqual(memo.stats()["hits"],3)
+        self.assertEqual(memo.stats()["misses"],3)
+
+    def test_memo_key(self):
+        #Sentences are memoized by the tokens the chunker reads, not by their text
+        memo = skipchunk.SentenceMemo(10)
+        chunker = skipchunk.Chunker(minconceptlength=1,minpredicatelength=1)
+        memoized = skipchunk.Chunker(minconceptlength=1,minpredicatelength=1,memo=memo)
+
+        sentence = SENTENCES[0]
+        retagged = [("quick","NN","compound",2,"quick") if token[0]=="quick" else token for token in sentence]
+        docs = [
+            annotatedDoc(self.nlp.vocab,[sentence]),
+            annotatedDoc(self.nlp.vocab,[retagged]),
+            Doc(self.nlp.vocab,words=[t[0] for t in sentence],spaces=[True]*(len(sentence)-2)+[False,False],tags=[t[1] for t in sentence],deps=[t[2] for t in sentence],heads=[t[3] for t in sentence],lemmas=[t[4] for t in sentence],sent_starts=[i==0 for i in range(len(sentence))])
+        ]
+        self.assertEqual(docs[0].text,docs[1].text)
+        self.assertNotEqual(docs[0].text,docs[2].text)
+
+        for doc in docs:
+            fieldnames,concepts,predicates = chunker.chunk(doc,"a")
+            mfieldnames,mconcepts,mpredicates = memoized.chunk(doc,"a")
+            self.assertEqual({key:labelFields(labels) for key,labels in mconcepts.items()},{key:labelFields(labels) for key,labels in concepts.items()})
+            self.assertEqual({key:labelFields(labels) for key,labels in mpredicates.items()},{key:labelFields(labels) for key,labels in predicates.items()})
+
+        #The retagged sentence is chunked again, the one with other whitespace is replayed
+        self.assertEqual((memo.stats()["hits"],memo.stats()["misses"]),(1,2))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the preflabel database."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+import collections
+
+from skipchunk import database
+
+Concept = collections.namedtuple('Concept',['key','preflabel','total'])
+
+def totals(db):
+    db.c.execute('''SELECT key,preflabel,total FROM concepts ORDER BY key''')
+    return db.c.fetchall()
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = database.BloomFilter(1000,0.01)
+        keys = ['key%d' % i for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(key in bloom for key in keys))
+        self.assertFalse(bloom.full())
+
+        #About error_rate of the keys that were never added come back as maybe there
+        false = sum(1 for i in range(10000) if 'other%d' % i in bloom)
+        self.assertLess(false,300)
+
+class TestDatabase(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.file = os.path.join(self.path,'skipchunk.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_upsert(self):
+        for cache_size in (0,10):
+            db = database.Database(self.file,delete=True,cache_size=cache_size)
+            preflabels = db.upsert_concepts([Concept('a_b','a b',2),Concept('c','c',1)])
+            self.assertEqual(preflabels,['a b','c'])
+
+            #The preflabel of a key never changes, only its total
+            preflabels = db.upsert_concepts([Concept('c','cc',3),Concept('a_b','b a',1),Concept('d','d',1)])
+            self.assertEqual(preflabels,['c','a b','d'])
+            self.assertEqual(totals(db),[('a_b','a b',3),('c','c',4),('d','d',1)])
+
+            self.assertEqual(db.get_concept('a_b'),'a b')
+            self.assertIsNone(db.get_concept('missing'))
+            self.assertEqual(db.upsert_concept(Concept('missing','m',1)),'m')
+            self.assertEqual(db.upsert_concept(Concept('missing','x',1)),'m')
+            db.close()
+
+    def test_batches(self):
+        #More concepts than fit in one statement
+        db = database.Database(self.file,cache_size=100)
+        concepts = [Concept('k%d' % i,'l%d' % i,1) for i in range(1000)]
+        self.assertEqual(db.upsert_concepts(concepts),[c.preflabel for c in concepts])
+        self.assertEqual(db.upsert_concepts(reversed(concepts)),[c.preflabel for c in reversed(concepts)])
+        db.c.execute('''SELECT count(*),sum(total) FROM concepts''')
+        self.assertEqual(db.c.fetchone(),(1000,2000))
+        db.close()
+
+        #The cache is warmed from the table when the database is opened again
+        db = database.Database(self.file,cache_size=100)
+        self.assertEqual(len(db.cache),100)
+        self.assertEqual(db.get_concept('k10'),'l10')
+        db.close()
+
+    def test_writers(self):
+        #The first writer to add a key decides its preflabel
+        first = database.Database(self.file)
+        second = database.Database(self.file)
+        first.upsert_concepts([Concept('a','first',1)])
+        self.assertEqual(second.upsert_concepts([Concept('a','second',1),Concept('b','second',1)]),['first','second'])
+        self.assertEqual(first.upsert_concept(Concept('b','first',1)),'second')
+        self.assertEqual(totals(first),[('a','first',2),('b','second',2)])
+        first.close()
+        second.close()
+
+    def test_cached_writers(self):
+        #Keys another writer inserted after the Bloom filter was filled are still found
+        first = database.Database(self.file,cache_size=10)
+        second = database.Database(self.file,cache_size=10)
+        self.assertIsNone(first.get_concept('a'))
+        second.upsert_concepts([Concept('a','second',1)])
+        self.assertEqual(first.get_concept('a'),'second')
+
+        second.upsert_concepts([Concept('b','second',1)])
+        self.assertEqual(first.upsert_concepts([Concept('b','first',1),Concept('c','first',1)]),['second','first'])
+        self.assertEqual(second.get_concept('c'),'first')
+        self.assertEqual(totals(first),[('a','second',1),('b','second',2),('c','first',1)])
+        first.close()
+        second.close()
+
+    def test_stats(self):
+        #New keys skip the lookup, and cached keys skip the table
+        db = database.Database(self.file,delete=True,cache_size=10)
+        db.upsert_concepts([Concept('a','a',1),Concept('b','b',1),Concept('a','a',2)])
+        db.upsert_concepts([Concept('a','a',1),Concept('c','c',1)])
+        stats = db.stats()
+        self.assertEqual((stats["hits"],stats["negatives"],stats["misses"]),(1,3,0))
+        self.assertEqual(totals(db),[('a','a',4),('b','b',1),('c','c',1)])
+        db.close()
+
+    def test_merge(self):
+        shards = []
+        for i,concepts in enumerate([
+                [Concept('a','a1',1),Concept('b','b1',5)],
+                [Concept('a','a2',3),Concept('c','c2',1)],
+                [Concept('b','b3',7),Concept('c','c3',2)]
+            ]):
+            shard = os.path.join(self.path,'shard%d.db' % i)
+            db = database.Database(shard)
+            db.upsert_concepts(concepts)
+            #The same date for every row, so the largest total decides
+            db.c.execute('''UPDATE concepts SET date='2020-01-01 00:00:00' ''')
+            db.commit()
+            db.close()
+            shards.append(shard)
+
+        merged = []
+        for order in (shards,list(reversed(shards))):
+            db = database.Database(self.file,delete=True)
+            db.upsert_concepts([Concept('a','a0',1)])
+            db.merge(order)
+            merged.append(totals(db))
+            db.close()
+
+        self.assertEqual(merged[0],merged[1])
+        self.assertEqual(merged[0],[('a','a0',5),('b','b3',12),('c','c3',3)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the memoized WordNet derivation table."""
+
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from skipchunk import derivations
+
+class TestDerivations(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.asked = []
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def derive(self,lem):
+        #Stands in for WordNet, and remembers what it was asked
+        self.asked.append(lem)
+        return {"quick":"quickness"}.get(lem)
+
+    def test_memo(self):
+        forms = derivations.Derivations(self.derive,maxsize=2)
+        self.assertEqual(forms.get("quick"),"quickness")
+        self.assertIsNone(forms.get("blue"))
+        self.assertEqual(forms.get("quick"),"quickness")
+        self.assertIsNone(forms.get("blue"))
+        self.assertEqual(self.asked,["quick","blue"])
+        self.assertEqual((forms.hits,forms.misses),(2,2))
+
+        #The runtime cache is bounded, the oldest word is asked again
+        forms.get("red")
+        forms.get("quick")
+        self.assertEqual(self.asked,["quick","blue","red","quick"])
+
+    def test_table(self):
+        table = derivations.DerivationTable()
+        table.adjectives.derive = self.derive
+        table.nouns.derive = lambda lem: None
+        self.assertEqual(table.adj_to_noun("quick"),"quickness")
+        self.assertIsNone(table.noun_to_adj("quickness"))
+        self.assertTrue(table.dirty())
+
+        path = os.path.join(self.path,'derivations.json')
+        table.save(path)
+        self.assertFalse(table.dirty())
+
+        #The forms that were looked up are in the saved table, and are never asked again
+        loaded = derivations.DerivationTable()
+        loaded.adjectives.derive = self.derive
+        self.assertTrue(loaded.load(path))
+        self.assertEqual(loaded.adj_to_noun("quick"),"quickness")
+        self.assertEqual(self.asked,["quick"])
+
+        #A missing or outdated file leaves an empty table, not the one loaded before
+        self.assertFalse(loaded.load(os.path.join(self.path,'missing.json')))
+        self.assertEqual(loaded.adj_to_noun("quick"),"quickness")
+        self.assertEqual(self.asked,["quick","quick"])
+
+        loaded.load(path)
+        outdated = os.path.join(self.path,'outdated.json')
+        with open(outdated,'w') as fd:
+            json.dump({"version":0,"adj_to_noun":{"blue":"blueness"},"noun_to_adj":{}},fd)
+        self.assertFalse(loaded.load(outdated))
+        self.assertEqual(loaded.adjectives.items(),{})
+        self.assertIsNone(loaded.id)
+
+
+if __name__ == '__main__':
+    unittest.main()
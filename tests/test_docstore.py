@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the segment file document cache."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from skipchunk import docstore
+
+class TestDocumentStore(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_add_get(self):
+        for compress in (True,False):
+            store = docstore.DocumentStore(os.path.join(self.path,str(compress)),segment_bytes=200,compress=compress)
+            for i in range(20):
+                store.add(i,{"id":i,"title":"post %d" % i})
+            #Saving a document again replaces it
+            store.add(3,{"id":3,"title":"changed"})
+
+            self.assertEqual(len(store),20)
+            self.assertIn(3,store)
+            self.assertNotIn(20,store)
+            self.assertEqual(store.get(3),{"id":3,"title":"changed"})
+            self.assertEqual(store.get(7)["title"],"post 7")
+            self.assertIsNone(store.get(20))
+            self.assertGreater(len(store.tasks()),1)
+
+            docs = list(store.docs())
+            self.assertEqual(len(docs),20)
+            self.assertEqual(docs[-1],{"id":3,"title":"changed"})
+            self.assertEqual(docs,list(store.docs(processes=2)))
+            store.close()
+
+    def test_reopen(self):
+        store = docstore.DocumentStore(self.path,segment_bytes=300)
+        for i in range(10):
+            store.add(i,{"id":i})
+        store.close()
+
+        self.assertTrue(docstore.exists(self.path))
+        store = docstore.DocumentStore(self.path,segment_bytes=300)
+        self.assertEqual(len(store),10)
+        store.add(10,{"id":10})
+        self.assertEqual([doc["id"] for doc in store.docs()],list(range(11)))
+        store.close()
+
+    def test_crash(self):
+        #A record cut short in the active segment is dropped when the store is opened again
+        store = docstore.DocumentStore(self.path,compress=False)
+        store.add("a",{"id":"a"})
+        store.add("b",{"id":"b"})
+        store.close()
+
+        active = store.segmentPath(store.active,sealed=False)
+        with open(active,'r+b') as fd:
+            fd.truncate(os.path.getsize(active)-3)
+
+        #A readonly store reads around it, and leaves the file alone
+        reader = docstore.DocumentStore(self.path,readonly=True)
+        self.assertEqual(list(reader.docs()),[{"id":"a"}])
+        self.assertLess(reader.offset,os.path.getsize(active))
+
+        store = docstore.DocumentStore(self.path,compress=False)
+        self.assertEqual(os.path.getsize(active),store.offset)
+        store.add("c",{"id":"c"})
+        self.assertEqual(list(store.docs()),[{"id":"a"},{"id":"c"}])
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
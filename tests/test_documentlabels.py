@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the compact DocumentLabels of enriched documents."""
+
+
+import pickle
+import unittest
+
+from skipchunk import skipchunk
+from skipchunk.skipchunk import Label
+
+def makeLabel(key,label,docid,sentenceid=0):
+    return Label(key.split('_'),label.split(' '),label.split(' '),_start=1,_end=1+len(label.split(' ')),_docid=docid,_sentenceid=sentenceid)
+
+class TestDocumentLabels(unittest.TestCase):
+
+    def setUp(self):
+        self.concepts = {}
+        self.documents = []
+        for docid,labels in enumerate([{"dog":["dog"]},{"dog":["dog","dogs"],"fox_quick":["quick fox"]}]):
+            docconcepts = {key:[makeLabel(key,label,docid,i) for i,label in enumerate(keylabels)] for key,keylabels in labels.items()}
+            self.documents.append((docconcepts,skipchunk.compactLabels(self.concepts,docconcepts,skipchunk.labelLengths(self.concepts,docconcepts))))
+            skipchunk.mergeLabels(self.concepts,docconcepts)
+
+    def test_labels(self):
+        for docconcepts,compact in self.documents:
+            self.assertEqual(list(compact.keys()),list(docconcepts.keys()))
+            for key in docconcepts:
+                self.assertEqual(compact[key],docconcepts[key])
+                self.assertEqual(compact.spans(key),[(label.sentenceid,label.start,label.end) for label in docconcepts[key]])
+            self.assertEqual(compact.expand(),docconcepts)
+
+    def test_detached(self):
+        #Unpickled labels need to be attached before their Labels are read, but missing keys behave as for a dict
+        docconcepts,compact = self.documents[1]
+        detached = pickle.loads(pickle.dumps(compact))
+        self.assertIn("dog",detached)
+        self.assertNotIn("cat",detached)
+        self.assertIsNone(detached.get("cat"))
+        with self.assertRaises(KeyError):
+            detached["cat"]
+        with self.assertRaises(ValueError):
+            detached["dog"]
+
+        detached.attach(self.concepts)
+        self.assertEqual(detached["dog"],docconcepts["dog"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the memory-mapped columnar label store."""
+
+
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+from skipchunk import labelstore
+from skipchunk.skipchunk import Label
+
+def makeLabel(key,label,docid,sentenceid=0,objectOf=None):
+    return Label(key.split('_'),label.split(' '),label.split(' '),_start=1,_end=1+len(label.split(' ')),_docid=docid,_sentenceid=sentenceid,_objectOf=objectOf)
+
+def labelFields(labels):
+    return [[getattr(label,k) for k in Label.__slots__] for label in labels]
+
+class TestLabelStore(unittest.TestCase):
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(),'labels')
+        self.concepts = {
+            "fox_quick":[makeLabel("fox_quick","quick fox",1),makeLabel("fox_quick","quick fox",2,objectOf="see")],
+            "dog":[makeLabel("dog","dog",1,3)],
+            "café":[makeLabel("café","café",2)]
+        }
+        self.predicates = {"jump":[makeLabel("jump","jumped",1)]}
+
+    def tearDown(self):
+        shutil.rmtree(os.path.dirname(self.path))
+
+    def test_roundtrip(self):
+        labelstore.writeLabels(self.path,{"concepts":self.concepts,"predicates":self.predicates})
+        store = labelstore.LabelStore(self.path,Label)
+
+        for name,data in (("concepts",self.concepts),("predicates",self.predicates)):
+            views = store.labels(name)
+            self.assertEqual(list(views.keys()),list(data.keys()))
+            for key in data:
+                self.assertEqual(len(views[key]),len(data[key]))
+                self.assertEqual(labelFields(views[key]),labelFields(data[key]))
+                self.assertEqual(labelFields([views[key][-1]]),labelFields([data[key][-1]]))
+                self.assertEqual(labelFields(views[key][0:1]),labelFields(data[key][0:1]))
+
+        #Docids keep their type
+        self.assertEqual(store.labels("concepts")["dog"][0].docid,1)
+
+    def test_views(self):
+        labelstore.writeLabels(self.path,{"concepts":self.concepts})
+        views = labelstore.LabelStore(self.path,Label).labels("concepts")
+
+        added = makeLabel("dog","dog",4)
+        views["dog"].append(added)
+        self.assertEqual(len(views["dog"]),2)
+        self.assertIs(views["dog"][1],added)
+        with self.assertRaises(IndexError):
+            views["dog"][2]
+
+        #A view pickles as the list of Labels it stands for
+        copy = pickle.loads(pickle.dumps(views["dog"]))
+        self.assertIsInstance(copy,list)
+        self.assertEqual(labelFields(copy),labelFields(views["dog"]))
+
+        #Writing again replaces the store, with the added labels
+        labelstore.writeLabels(self.path,{"concepts":views})
+        self.assertEqual(len(labelstore.LabelStore(self.path,Label).labels("concepts")["dog"]),2)
+        self.assertFalse(os.path.isdir(self.path + '.tmp'))
+
+    def test_string_ids(self):
+        labels = {"a":[makeLabel("a","a","x"),makeLabel("a","a","y")]}
+        labelstore.writeLabels(self.path,{"concepts":labels,"predicates":{}})
+        store = labelstore.LabelStore(self.path,Label)
+        self.assertEqual([label.docid for label in store.labels("concepts")["a"]],["x","y"])
+        self.assertEqual(store.labels("predicates"),{})
+
+    def test_strings(self):
+        #Only the most recently decoded strings are kept
+        labelstore.writeLabels(self.path,{"concepts":self.concepts})
+        mapped = labelstore.MappedStrings(self.path,cache_size=2)
+        strings = [mapped.get(id) for id in range(len(mapped.offsets)-1)]
+        self.assertIn("café",strings)
+        self.assertEqual(len(mapped.cache),2)
+        self.assertEqual([mapped.get(id) for id in range(len(mapped.offsets)-1)],strings)
+        self.assertIsNone(mapped.get(-1))
+
+
+if __name__ == '__main__':
+    unittest.main()
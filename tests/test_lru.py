@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the shared LRU cache."""
+
+
+import unittest
+
+from skipchunk import lru
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_evict(self):
+        cache = lru.LRUCache(2)
+        cache.put('a',1)
+        cache.put('b',2)
+        self.assertEqual(cache.get('a'),1)
+        cache.put('c',3)
+
+        #b was the least recently used
+        self.assertNotIn('b',cache)
+        self.assertEqual(cache.get('b','missing'),'missing')
+        self.assertEqual(len(cache),2)
+        self.assertEqual(cache.stats(),{"hits":1,"misses":1,"hit_rate":0.5,"size":2})
+
+
+if __name__ == '__main__':
+    unittest.main()
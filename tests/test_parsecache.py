@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the content-hash parse cache."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from skipchunk import parsecache
+from skipchunk import skipchunk
+from skipchunk import derivations
+
+from . import models
+
+class TestParseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.file = os.path.join(self.path,'parsecache.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_keys(self):
+        cache = parsecache.ParseCache(self.file,"config")
+        key = cache.key("text",1,[(0,"title")])
+        self.assertEqual(key,cache.key("text",1,[(0,"title")]))
+        self.assertNotEqual(key,cache.key("text!",1,[(0,"title")]))
+        self.assertNotEqual(key,cache.key("text",2,[(0,"title")]))
+        self.assertNotEqual(key,cache.key("text",1,[(0,"content")]))
+        self.assertNotEqual(key,parsecache.ParseCache(self.file,"other").key("text",1,[(0,"title")]))
+        cache.close()
+
+    def test_get_put(self):
+        cache = parsecache.ParseCache(self.file,"config")
+        chunks = (["title"],{"fox":[]},{})
+        cache.put("a",1,chunks)
+        cache.commit()
+        self.assertEqual(cache.get(["a","b"]),{"a":chunks})
+        self.assertEqual(cache.stats()["hits"],1)
+        self.assertEqual(cache.stats()["misses"],1)
+        cache.close()
+
+    def test_evict(self):
+        cache = parsecache.ParseCache(self.file,"config")
+        cache.put("a",1,"old")
+        cache.put("b",2,"old")
+        cache.close()
+
+        #Only the documents seen in the latest generation are kept
+        cache = parsecache.ParseCache(self.file,"config")
+        self.assertEqual(cache.get(["a"]),{"a":"old"})
+        cache.put("c",3,"new")
+        self.assertEqual(cache.evict(),1)
+        self.assertEqual(sorted(cache.get(["a","b","c"]).keys()),["a","c"])
+        cache.close()
+
+    def test_cap(self):
+        for generation in range(3):
+            cache = parsecache.ParseCache(self.file,"config",max_entries=5)
+            for i in range(3):
+                cache.put("%d-%d" % (generation,i),i,generation)
+            cache.commit()
+            cache.close()
+
+        #The oldest generation went first
+        cache = parsecache.ParseCache(self.file,"config")
+        self.assertEqual(sorted(cache.get(["%d-%d" % (g,i) for g in range(3) for i in range(3)]).keys()),["1-1","1-2","2-0","2-1","2-2"])
+        cache.close()
+
+    def test_config(self):
+        #The window size and the derivation table change the chunker output, so they are part of the key
+        model = models.buildModel(os.path.join(self.path,'model'))
+        table = os.path.join(self.path,'other-derivations.json')
+        configs = set()
+        for window_chars,derivations_path in ((0,None),(5000,None),(0,table)):
+            s = skipchunk.Skipchunk({"name":"t","path":self.path},spacy_model=model,spacy_processes=1,spacy_window_chars=window_chars,derivations_path=derivations_path)
+            configs.add(s.parseConfig())
+        self.assertEqual(len(configs),3)
+
+        #A built table has an id of its own, which is kept when the table is saved
+        derivations.table.id = "built"
+        derivations.table.save(table)
+        derivations.table.id = None
+        s = skipchunk.Skipchunk({"name":"t","path":self.path},spacy_model=model,spacy_processes=1,derivations_path=table)
+        self.assertIn("|built|",s.parseConfig())
+        derivations.table.load(os.path.join(self.path,'missing.json'))
+
+
+if __name__ == '__main__':
+    unittest.main()
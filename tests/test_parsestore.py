@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the parse store, and rechunking from it."""
+
+
+import os
+import inspect
+import shutil
+import tempfile
+import unittest
+
+import spacy
+
+from skipchunk import skipchunk
+from skipchunk import parsestore
+from skipchunk import derivations
+
+from . import models
+
+def labelCount(data):
+    return sum(len(labels) for labels in data.values())
+
+def labelFields(data):
+    return {key:[[getattr(label,k) for k in skipchunk.Label.__slots__] for label in labels] for key,labels in data.items()}
+
+class TestParseStore(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.nlp = spacy.blank("en")
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_latest(self):
+        #A document parsed again is only read back from its latest shard
+        store = parsestore.ParseStore(self.path,shard_size=2)
+        for docid,text in [(1,"one"),(2,"two"),(1,"one again"),(3,"three")]:
+            store.add(self.nlp(text),docid,[])
+
+        reopened = parsestore.ParseStore(self.path)
+        docs = [(doc.text,parsestore.storedContext(doc)[0]) for doc in reopened.docs(self.nlp.vocab)]
+        self.assertEqual(docs,[("two",2),("one again",1),("three",3)])
+
+    def test_latest_windows(self):
+        #The latest parse of a docid replaces all the windows of the ones before it
+        store = parsestore.ParseStore(self.path,shard_size=2)
+        for text,window in [("a0",(0,3,[],1)),("a1",(1,3,[],1)),("a2",(2,3,[],1))]:
+            store.add(self.nlp(text),"a",[],window)
+        store.add(self.nlp("whole"),"a",[])
+        self.assertEqual([doc.text for doc in store.docs(self.nlp.vocab)],["whole"])
+
+        for text,window in [("b0",(0,2,[],1)),("b1",(1,2,[],1))]:
+            store.add(self.nlp(text),"a",[],window)
+        self.assertEqual([doc.text for doc in store.docs(self.nlp.vocab)],["b0","b1"])
+
+    def test_clear(self):
+        store = parsestore.ParseStore(self.path,shard_size=1)
+        store.add(self.nlp("one"),1,[])
+        store.miss(3)
+        self.assertEqual(parsestore.ParseStore(self.path).missing,3)
+        store.clear()
+        reopened = parsestore.ParseStore(self.path)
+        self.assertEqual(reopened.missing,0)
+        self.assertEqual(list(reopened.docs(self.nlp.vocab)),[])
+
+class TestRechunk(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.models = tempfile.mkdtemp()
+        cls.model = models.buildModel(os.path.join(cls.models,'model'))
+        cls.posts = models.blogPosts(20)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.models)
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        #WordNet is not needed for these tests
+        self.adjectives = derivations.table.adjectives
+        derivations.table.adjectives = derivations.Derivations(lambda lem: None)
+
+    def tearDown(self):
+        derivations.table.adjectives = self.adjectives
+        shutil.rmtree(self.path)
+
+    def skipchunk(self,**kwargs):
+        return skipchunk.Skipchunk({"name":"rechunk","path":self.path},spacy_model=self.model,spacy_processes=1,minlabels=1,parse_store=True,**kwargs)
+
+    def tuples(self,s):
+        return list(s.bulk(self.posts,fields=["title","content"]))
+
+    def test_two_instances(self):
+        #A second run on the same path replaces the parses of the first instead of adding to them
+        first = self.skipchunk()
+        enriched,concepts,predicates,conceptgroups,predicategroups = first.enrich(self.tuples(first))
+
+        second = self.skipchunk()
+        second.enrich(self.tuples(second))
+        rconcepts,rpredicates,rconceptgroups,rpredicategroups = second.rechunk()
+        self.assertEqual(labelCount(rconcepts),labelCount(concepts))
+        self.assertEqual(labelFields(rconcepts),labelFields(concepts))
+        self.assertEqual(labelFields(rpredicates),labelFields(predicates))
+
+        #Another instance only rechunks what is stored
+        rconcepts,rpredicates,rconceptgroups,rpredicategroups = self.skipchunk().rechunk()
+        self.assertEqual(labelFields(rconcepts),labelFields(concepts))
+
+    def test_batches(self):
+        #Later enrich batches of the same instance add to the stored parses
+        s = self.skipchunk()
+        tuples = self.tuples(s)
+        s.enrich(tuples[:10])
+        enriched,concepts,predicates,conceptgroups,predicategroups = s.enrich(tuples[10:])
+        rconcepts,rpredicates,rconceptgroups,rpredicategroups = s.rechunk()
+        self.assertEqual(labelFields(rconcepts),labelFields(concepts))
+
+    def test_resume(self):
+        plain = self.skipchunk()
+        enriched,concepts,predicates,conceptgroups,predicategroups = plain.enrich(self.tuples(plain))
+
+        s = self.skipchunk(checkpoint_every=4,pool_shard_size=3)
+        stream = s.enrichStream(self.tuples(s),keep_labels=True)
+        for i,rich in enumerate(stream):
+            if i+1==10:
+                break
+        stream.close()
+
+        resumed = self.skipchunk(checkpoint_every=4,pool_shard_size=3)
+        resumed.enrich(self.tuples(resumed),resume=True)
+        rconcepts,rpredicates,rconceptgroups,rpredicategroups = resumed.rechunk()
+        self.assertEqual(labelFields(rconcepts),labelFields(concepts))
+
+    def test_windows(self):
+        #Long documents are parsed one window at a time while they are chunked, and stored a window per doc
+        s = self.skipchunk(spacy_window_chars=500)
+        tuples = self.tuples(s)
+        windows = [doc for doc,context in skipchunk.pipeTuples(s.nlp,tuples,500) if isinstance(doc,skipchunk.Windows)]
+        self.assertGreater(len(windows),0)
+        self.assertTrue(inspect.isgenerator(windows[0].windows))
+
+        enriched,concepts,predicates,conceptgroups,predicategroups = s.enrich(tuples)
+        rconcepts,rpredicates,rconceptgroups,rpredicategroups = s.rechunk()
+        self.assertEqual(labelFields(rconcepts),labelFields(concepts))
+        self.assertEqual(labelFields(rpredicates),labelFields(predicates))
+
+    def test_windows_again(self):
+        #A document stored in windows and then whole (or the other way around) is only rechunked from its latest parse
+        for first,second in ((500,0),(0,500)):
+            shutil.rmtree(self.path)
+            s = self.skipchunk(spacy_window_chars=first)
+            tuples = self.tuples(s)[:5]
+            s.enrich(tuples)
+            s.spacy_window_chars = second
+            enriched,concepts,predicates,conceptgroups,predicategroups = s.enrich(tuples)
+
+            plain = self.skipchunk(spacy_window_chars=second)
+            enriched,concepts,predicates,conceptgroups,predicategroups = plain.enrich(tuples)
+
+            rconcepts,rpredicates,rconceptgroups,rpredicategroups = s.rechunk()
+            self.assertEqual(labelFields(rconcepts),labelFields(concepts))
+            self.assertEqual(labelFields(rpredicates),labelFields(predicates))
+
+    def test_cache_hits(self):
+        #Documents from the parse cache were never parsed, so they can't be rechunked
+        first = self.skipchunk(parse_cache=True)
+        first.enrich(self.tuples(first))
+        first.rechunk()
+
+        second = self.skipchunk(parse_cache=True)
+        second.enrich(self.tuples(second))
+        with self.assertRaises(ValueError):
+            second.rechunk()
+        with self.assertRaises(ValueError):
+            second.sweep([{"maxslop":2}])
+
+        #Enriching without the cache stores them again
+        third = self.skipchunk()
+        third.enrich(self.tuples(third))
+        third.rechunk()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the ingest pipeline, with engines that record what they are sent."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from skipchunk import skipchunk
+from skipchunk import derivations
+from skipchunk.pipeline import IngestPipeline
+
+from . import models
+
+class Index:
+
+    def indexGenerator(self,batch,timeout=None,commit=True):
+        self.batches.append(batch)
+        self.commits.append(commit)
+        return self.ok
+
+    def commit(self,timeout=None):
+        self.commits.append(True)
+
+    def __init__(self,ok=True):
+        self.ok = ok
+        self.batches = []
+        self.commits = [] #The commit flag of every batch, and True for every separate commit
+
+class Graph:
+
+    def index(self,skipchunk,timeout=None):
+        self.labels = sum(len(group.labels) for group in skipchunk.conceptgroups)
+        return True
+
+class TestPipeline(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.path = tempfile.mkdtemp()
+        cls.model = models.buildModel(os.path.join(cls.path,'model'))
+        cls.posts = models.blogPosts(25)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+
+    def setUp(self):
+        #WordNet is not needed for these tests
+        self.adjectives = derivations.table.adjectives
+        derivations.table.adjectives = derivations.Derivations(lambda lem: None)
+
+    def tearDown(self):
+        derivations.table.adjectives = self.adjectives
+
+    def skipchunk(self):
+        return skipchunk.Skipchunk({"name":"pipeline","path":self.path},spacy_model=self.model,spacy_processes=1,minlabels=1)
+
+    def tuples(self,s):
+        return list(s.bulk(self.posts,fields=["title","content"]))
+
+    def test_run(self):
+        s = self.skipchunk()
+        enriched,concepts,predicates,conceptgroups,predicategroups = s.enrich(self.tuples(s))
+
+        for commit_batches,commits in ((0,[False,False,False,True]),(2,[False,False,True,False,True])):
+            index = Index()
+            graph = Graph()
+            s = self.skipchunk()
+            pipeline = IngestPipeline(s,indexquery=index,graphquery=graph,batch_size=10,queue_size=1,commit_batches=commit_batches)
+            self.assertTrue(pipeline.run(self.tuples(s)))
+
+            #The documents are sent in order and without their labels, which go to the graph
+            documents = [doc for batch in index.batches for doc in batch]
+            self.assertEqual([doc["id"] for doc in documents],[rich["id"] for rich in enriched])
+            self.assertFalse(any('skipchunk_concepts' in doc for doc in documents))
+            self.assertEqual([len(batch) for batch in index.batches],[10,10,5])
+            self.assertEqual(index.commits,commits)
+            self.assertEqual(graph.labels,sum(len(labels) for labels in concepts.values()))
+
+    def test_error(self):
+        #A batch the engine refuses stops the run instead of leaving it waiting on a full queue
+        s = self.skipchunk()
+        pipeline = IngestPipeline(s,indexquery=Index(ok=False),batch_size=2,queue_size=1)
+        with self.assertRaises(ValueError):
+            pipeline.run(self.tuples(s))
+
+
+if __name__ == '__main__':
+    unittest.main()
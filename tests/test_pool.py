@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for enrichment with the chunker running in a pool of worker processes."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from skipchunk import skipchunk
+from skipchunk import derivations
+
+from . import models
+
+def labelFields(data):
+    return {key:[[getattr(label,k) for k in skipchunk.Label.__slots__] for label in labels] for key,labels in data.items()}
+
+def groupFields(groups):
+    return [(group.key,group.total,group.preflabel,group.prefcount,group.alternates) for group in groups]
+
+class TestPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.path = tempfile.mkdtemp()
+        cls.model = models.buildModel(os.path.join(cls.path,'model'))
+        cls.posts = models.blogPosts(30)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+
+    def setUp(self):
+        #WordNet is not needed for these tests
+        self.adjectives = derivations.table.adjectives
+        derivations.table.adjectives = derivations.Derivations(lambda lem: None)
+
+    def tearDown(self):
+        derivations.table.adjectives = self.adjectives
+
+    def skipchunk(self,name,**kwargs):
+        return skipchunk.Skipchunk({"name":name,"path":self.path},spacy_model=self.model,spacy_processes=1,minlabels=1,**kwargs)
+
+    def tuples(self,s):
+        return list(s.bulk(self.posts,fields=["title","content"]))
+
+    def test_pool(self):
+        #The shards are chunked in the workers and merged in input order, with the same labels and groups as in one process
+        plain = self.skipchunk("plain")
+        enriched,concepts,predicates,conceptgroups,predicategroups = plain.enrich(self.tuples(plain))
+
+        for kwargs in ({},{"compact_documents":True},{"spacy_batch_chars":2000}):
+            s = self.skipchunk("pool",pool_processes=2,pool_shard_size=7,**kwargs)
+            penriched,pconcepts,ppredicates,pconceptgroups,ppredicategroups = s.enrich(self.tuples(s))
+
+            self.assertEqual([rich["id"] for rich in penriched],[rich["id"] for rich in enriched])
+            self.assertEqual(labelFields(pconcepts),labelFields(concepts))
+            self.assertEqual(labelFields(ppredicates),labelFields(predicates))
+            self.assertEqual(groupFields(pconceptgroups),groupFields(conceptgroups))
+            self.assertEqual(groupFields(ppredicategroups),groupFields(predicategroups))
+
+            #Each document still gets its own labels
+            for rich,prich in zip(enriched,penriched):
+                self.assertEqual(labelFields(dict(prich["skipchunk_concepts"])),labelFields(rich["skipchunk_concepts"]))
+
+            #The group labels are the concepts, so both can be indexed
+            for group in pconceptgroups:
+                self.assertIs(group.labels,pconcepts[group.key])
+
+    def test_batches(self):
+        #A second batch adds to the groups of the first
+        plain = self.skipchunk("plain")
+        enriched,concepts,predicates,conceptgroups,predicategroups = plain.enrich(self.tuples(plain))
+
+        s = self.skipchunk("pool",pool_processes=2,pool_shard_size=4)
+        tuples = self.tuples(s)
+        s.enrich(tuples[:12])
+        penriched,pconcepts,ppredicates,pconceptgroups,ppredicategroups = s.enrich(tuples[12:])
+        self.assertEqual(labelFields(pconcepts),labelFields(concepts))
+        self.assertEqual(groupFields(pconceptgroups),groupFields(conceptgroups))
+
+
+if __name__ == '__main__':
+    unittest.main()
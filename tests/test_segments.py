@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the streamed record segments that artifacts are saved in."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from skipchunk import segments
+
+class TestSegmentStore(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_write_read(self):
+        store = segments.SegmentStore(self.path,segment_records=4)
+        store.write("numbers",range(10))
+        store.write("empty",[])
+        self.assertEqual(store.count("numbers"),10)
+        self.assertEqual(len(store.manifest["artifacts"]["numbers"]),3)
+        self.assertEqual(list(store.records("numbers")),list(range(10)))
+        self.assertEqual(list(store.records("empty")),[])
+        self.assertEqual(sorted(store.names()),["empty","numbers"])
+        with self.assertRaises(ValueError):
+            list(store.records("missing"))
+
+        #The manifest is read back by a new store
+        store = segments.SegmentStore(self.path,segment_records=4)
+        self.assertEqual(list(store.records("numbers")),list(range(10)))
+
+    def test_append_replace(self):
+        store = segments.SegmentStore(self.path,segment_records=4)
+        store.write("numbers",range(5))
+        old = [segment["file"] for segment in store.manifest["artifacts"]["numbers"]]
+
+        store.write("numbers",range(5,7),append=True)
+        self.assertEqual(list(store.records("numbers")),list(range(7)))
+        self.assertTrue(all(os.path.isfile(os.path.join(self.path,f)) for f in old))
+
+        #Writing without append replaces the old segments
+        store.write("numbers",["a"])
+        self.assertEqual(list(store.records("numbers")),["a"])
+        self.assertFalse(any(os.path.isfile(os.path.join(self.path,f)) for f in old))
+
+        store.clear()
+        self.assertEqual(store.names(),[])
+
+    def test_records(self):
+        store = segments.SegmentStore(self.path)
+        store.write("numbers",range(3))
+        records = segments.Records(store,"numbers",transform=lambda x:x*2)
+        self.assertEqual(len(records),3)
+        self.assertEqual(list(records),[0,2,4])
+        self.assertEqual(list(records),[0,2,4])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the count-min sketch of the key counts."""
+
+
+import random
+import unittest
+import collections
+
+from skipchunk import sketch
+
+class TestCountMinSketch(unittest.TestCase):
+
+    def test_bounds(self):
+        countsketch = sketch.CountMinSketch(epsilon=0.001,delta=0.01)
+        counts = collections.Counter()
+        rng = random.Random(5)
+        for i in range(20000):
+            key = 'key%d' % int(rng.paretovariate(1.0))
+            counts[key] += 1
+            countsketch.add(key)
+
+        self.assertEqual(countsketch.total,20000)
+        error = countsketch.error()
+        over = 0
+        for key,count in counts.items():
+            estimate = countsketch.estimate(key)
+            #Never under the true count
+            self.assertGreaterEqual(estimate,count)
+            if estimate-count>error:
+                over += 1
+        self.assertLessEqual(over,len(counts)*countsketch.delta)
+
+    def test_add(self):
+        countsketch = sketch.CountMinSketch()
+        self.assertEqual(countsketch.add('a',3),3)
+        self.assertEqual(countsketch.add('a'),4)
+        self.assertEqual(countsketch.estimate('a'),4)
+        self.assertEqual(countsketch.estimate('b'),0)
+        self.assertEqual(countsketch.stats()["total"],4)
+
+    def test_depth(self):
+        #Tight deltas take more rows than a single digest has 64 bit hashes
+        countsketch = sketch.CountMinSketch(epsilon=0.01,delta=0.00001)
+        self.assertGreater(countsketch.depth,8)
+        for i in range(100):
+            countsketch.add('key%d' % (i%10))
+        self.assertEqual(len(set(countsketch.hashes('key1'))),countsketch.depth)
+        self.assertGreaterEqual(countsketch.estimate('key1'),10)
+        self.assertEqual(countsketch.total,100)
+
+    def test_parameters(self):
+        with self.assertRaises(ValueError):
+            sketch.CountMinSketch(epsilon=0)
+        with self.assertRaises(ValueError):
+            sketch.CountMinSketch(delta=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
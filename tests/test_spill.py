@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the sorted runs that labels are spilled to."""
+
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from skipchunk import spill
+from skipchunk import database
+from skipchunk import skipchunk
+
+from . import models
+
+class TestSpill(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_blocks(self):
+        path = os.path.join(self.path,'blocks.pickle')
+        self.assertEqual(spill.writeBlocks(path,range(spill._BLOCK_+5)),spill._BLOCK_+5)
+        self.assertEqual(list(spill.readBlocks(path)),list(range(spill._BLOCK_+5)))
+
+    def test_merge(self):
+        records = [(random.choice('abcdefg'),i) for i in range(1000)]
+        runs = spill.SpillRuns(self.path,budget=64)
+        for record in records:
+            runs.add(record)
+        self.assertGreater(len(runs.runs),1)
+
+        self.assertEqual(list(runs.merge()),sorted(records))
+        #The merged runs were compacted into one
+        self.assertEqual(len(runs.runs),1)
+        self.assertEqual(list(runs.merge()),sorted(records))
+
+        runs.add(('a',-1))
+        self.assertEqual(list(runs.merge()),sorted(records+[('a',-1)]))
+
+        runs.clear()
+        self.assertEqual(list(runs.merge()),[])
+
+    def test_groups(self):
+        groups = spill.SpilledGroups(os.path.join(self.path,'groups.pickle'))
+        groups.write(iter(['x','y']))
+        self.assertEqual(len(groups),2)
+        self.assertEqual(list(groups),['x','y'])
+        self.assertEqual(list(groups),['x','y'])
+
+class TestResolve(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def test_lock(self):
+        #The write lock is let go after every batch, so other writers get in while the groups are read and written
+        s = skipchunk.Skipchunk({"name":"resolve","path":self.path},spacy_model=models.buildModel(os.path.join(self.path,'model')),spacy_processes=1,preflabel_cache_size=10)
+        groups = [skipchunk.ConceptGroup(key,1,key,1) for key in 'abcde']
+        resolved = s.resolveGroups(s.preflabelDatabase(),groups,batch_size=2)
+
+        other = database.Database(s.database,timeout=0.1)
+        for i,group in enumerate(resolved):
+            other.upsert_concept(skipchunk.ConceptGroup('other%d' % i,1,'other',1))
+        other.close()
+
+        db = s.preflabelDatabase()
+        db.c.execute('''SELECT count(*),sum(total) FROM concepts''')
+        self.assertEqual(db.c.fetchone(),(10,10))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for streaming enrichment, which only keeps the running groups."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from skipchunk import skipchunk
+from skipchunk import derivations
+
+from . import models
+
+def labelCount(data):
+    return sum(len(labels) for labels in data.values())
+
+def groupFields(groups):
+    return [(group.key,group.total,group.preflabel,group.prefcount) for group in groups]
+
+class TestStream(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.path = tempfile.mkdtemp()
+        cls.model = models.buildModel(os.path.join(cls.path,'model'))
+        cls.posts = models.blogPosts(30)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+
+    def setUp(self):
+        #WordNet is not needed for these tests
+        self.adjectives = derivations.table.adjectives
+        derivations.table.adjectives = derivations.Derivations(lambda lem: None)
+
+    def tearDown(self):
+        derivations.table.adjectives = self.adjectives
+
+    def skipchunk(self,name,**kwargs):
+        return skipchunk.Skipchunk({"name":name,"path":self.path},spacy_model=self.model,spacy_processes=1,minlabels=1,**kwargs)
+
+    def tuples(self,s):
+        return list(s.bulk(self.posts,fields=["title","content"]))
+
+    def test_resident(self):
+        #The labels go out with the documents, and only the groups stay behind
+        for kwargs in ({},{"pool_processes":2,"pool_shard_size":8}):
+            plain = self.skipchunk("plain")
+            enriched,concepts,predicates,conceptgroups,predicategroups = plain.enrich(self.tuples(plain))
+
+            s = self.skipchunk("stream",**kwargs)
+            streamed = 0
+            sunk = []
+            for rich in s.enrichStream(self.tuples(s),sinks=[sunk.append]):
+                streamed += labelCount(rich["skipchunk_concepts"])
+                self.assertEqual(labelCount(s.concepts),0)
+                self.assertEqual(labelCount(s.predicates),0)
+
+            self.assertEqual(len(sunk),len(enriched))
+            self.assertEqual(streamed,labelCount(concepts))
+            self.assertEqual(groupFields(s.conceptgroups),groupFields(conceptgroups))
+            self.assertEqual(groupFields(s.predicategroups),groupFields(predicategroups))
+
+    def test_resume(self):
+        plain = self.skipchunk("plain")
+        enriched,concepts,predicates,conceptgroups,predicategroups = plain.enrich(self.tuples(plain))
+
+        s = self.skipchunk("resume",checkpoint_every=4)
+        stream = s.enrichStream(self.tuples(s))
+        for i,rich in enumerate(stream):
+            if i+1==10:
+                break
+        stream.close()
+
+        #The checkpoint has the groups but not the labels, so enrich can't carry on from it
+        resumed = self.skipchunk("resume",checkpoint_every=4)
+        with self.assertRaises(ValueError):
+            resumed.enrich(self.tuples(resumed),resume=True)
+
+        renriched = list(resumed.enrichStream(self.tuples(resumed),resume=True))
+        self.assertEqual(len(renriched),len(enriched)-8)
+        self.assertEqual(groupFields(resumed.conceptgroups),groupFields(conceptgroups))
+        self.assertEqual(groupFields(resumed.predicategroups),groupFields(predicategroups))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for sweeping several chunking configurations in one pass."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from skipchunk import skipchunk
+from skipchunk import derivations
+
+from . import models
+
+def labelFields(data):
+    return {key:[[getattr(label,k) for k in skipchunk.Label.__slots__] for label in labels] for key,labels in data.items()}
+
+def groupFields(groups):
+    return sorted((group.key,group.total,group.alternates) for group in groups)
+
+class TestSweep(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.models = tempfile.mkdtemp()
+        cls.model = models.buildModel(os.path.join(cls.models,'model'))
+        cls.posts = models.blogPosts(20)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.models)
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        #WordNet is not needed for these tests
+        self.adjectives = derivations.table.adjectives
+        derivations.table.adjectives = derivations.Derivations(lambda lem: None)
+
+    def tearDown(self):
+        derivations.table.adjectives = self.adjectives
+        shutil.rmtree(self.path)
+
+    def skipchunk(self,name,**kwargs):
+        return skipchunk.Skipchunk({"name":name,"path":self.path},spacy_model=self.model,spacy_processes=1,**kwargs)
+
+    def tuples(self,s):
+        return list(s.bulk(self.posts,fields=["title","content"]))
+
+    def test_sweep(self):
+        #Every configuration gets what enriching with it on its own gets
+        configs = [{},{"maxslop":2},{"maxslop":2,"minlabels":3},{"maxconceptlength":2,"minpredicatelength":2}]
+        s = self.skipchunk("sweep",minlabels=1)
+        results = s.sweep(configs,tuples=self.tuples(s))
+        self.assertEqual(len(results),len(configs))
+
+        for config,result in zip(configs,results):
+            params = {"minlabels":1}
+            params.update(config)
+            single = self.skipchunk("single",**params)
+            enriched,concepts,predicates,conceptgroups,predicategroups = single.enrich(self.tuples(single))
+
+            self.assertEqual(result["config"]["maxslop"],single.maxslop)
+            self.assertEqual(labelFields(result["concepts"]),labelFields(concepts))
+            self.assertEqual(labelFields(result["predicates"]),labelFields(predicates))
+            self.assertEqual(groupFields(result["conceptgroups"]),groupFields(conceptgroups))
+            self.assertEqual(groupFields(result["predicategroups"]),groupFields(predicategroups))
+            self.assertEqual(result["summary"]["concept_groups"],len(conceptgroups))
+            self.assertEqual(result["summary"]["concept_labels"],sum(len(labels) for labels in concepts.values()))
+
+        #Nothing was enriched or grouped by the sweep itself
+        self.assertEqual(s.concepts,{})
+        self.assertIsNone(s.conceptgroups)
+
+    def test_stored(self):
+        #Without tuples, the stored parses are swept
+        s = self.skipchunk("stored",minlabels=1,parse_store=True)
+        tuples = self.tuples(s)
+        s.enrich(tuples)
+        configs = [{"maxslop":2},{"minpredicatelength":2}]
+        stored = s.sweep(configs)
+        parsed = s.sweep(configs,tuples=tuples)
+        for a,b in zip(stored,parsed):
+            self.assertEqual(labelFields(a["concepts"]),labelFields(b["concepts"]))
+            self.assertEqual(a["summary"],b["summary"])
+
+    def test_errors(self):
+        s = self.skipchunk("errors")
+        with self.assertRaises(ValueError):
+            s.sweep([{"maxslop":2,"spacy_tier":"full"}],tuples=self.tuples(s))
+        with self.assertRaises(ValueError):
+            s.sweep([{"maxslop":2}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""Tests for the spacy pipeline tiers."""
+
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import spacy
+
+from skipchunk import skipchunk
+from skipchunk import derivations
+
+from . import models
+
+def labelFields(data,fields):
+    return {key:[[getattr(label,k) for k in fields] for label in labels] for key,labels in data.items()}
+
+def buildTierModel(path):
+    #The test pipeline with stand-ins for the components the tiers leave out:
+    #  a sentencizer named parser, so sentences still come out the same without it, and an entity ruler named ner
+    nlp = spacy.load(models.buildModel(os.path.join(path,'model')))
+    nlp.remove_pipe("sentencizer")
+    nlp.add_pipe("sentencizer",name="parser")
+    nlp.add_pipe("entity_ruler",name="ner").add_patterns([{"label":"ORG","pattern":"Solr"}])
+    nlp.to_disk(os.path.join(path,'tiers'))
+    return os.path.join(path,'tiers')
+
+class TestTiers(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.path = tempfile.mkdtemp()
+        cls.model = buildTierModel(cls.path)
+        cls.posts = models.blogPosts(15)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.path)
+
+    def setUp(self):
+        #WordNet is not needed for these tests
+        self.adjectives = derivations.table.adjectives
+        derivations.table.adjectives = derivations.Derivations(lambda lem: None)
+
+    def tearDown(self):
+        derivations.table.adjectives = self.adjectives
+
+    def test_load(self):
+        self.assertEqual(skipchunk.loadPipeline(self.model,"full").pipe_names,["attribute_ruler","lemmatizer","parser","ner"])
+        self.assertEqual(skipchunk.loadPipeline(self.model,"no-ner").pipe_names,["attribute_ruler","lemmatizer","parser"])
+        self.assertEqual(skipchunk.loadPipeline(self.model,"tagger-only").pipe_names,["sentencizer","attribute_ruler","lemmatizer"])
+        with self.assertRaises(ValueError):
+            skipchunk.loadPipeline(self.model,"fastest")
+
+    def test_enrich(self):
+        #The tiers only differ in the fields they fill
+        results = {}
+        for tier in ("full","no-ner","tagger-only"):
+            s = skipchunk.Skipchunk({"name":tier,"path":self.path},spacy_model=self.model,spacy_tier=tier,spacy_processes=1,minlabels=1)
+            enriched,concepts,predicates,conceptgroups,predicategroups = s.enrich(list(s.bulk(self.posts,fields=["title","content"])))
+            results[tier] = (s.label_fields,concepts)
+
+        fields = results["tagger-only"][0]
+        self.assertEqual(results["full"][0],skipchunk._LABEL_FIELDS_)
+        self.assertNotIn("objectOf",fields)
+        self.assertNotIn("subjectOf",fields)
+        for tier,(tierfields,concepts) in results.items():
+            self.assertEqual(labelFields(concepts,fields),labelFields(results["full"][1],fields))
+
+
+if __name__ == '__main__':
+    unittest.main()